@@ -0,0 +1,81 @@
+"""
+Events/sec of streamed content chunks: per-token dict + json.dumps (the
+encoding stream_response used before StreamingChunkEncoder) against the
+pre-rendered templates, with and without orjson.
+
+    python -m benchmarks.sse_encoding [--events 200000]
+"""
+import argparse
+import json
+import time
+
+from core.handlers import sse
+from core.handlers.sse import StreamingChunkEncoder
+
+DELTAS = ["Hello", " world", ", ", 'she said "hi"', " naïve café", " 日本語", "\n", " {braces}", " \\path"]
+MESSAGE_ID = "chatcmpl-0123456789abcdef"
+MODEL = "qwen3:latest"
+CREATED = 1700000000
+
+
+def dict_chunk(content: str) -> dict:
+    """A content chunk built the way stream_response did per token."""
+    return {
+        "id": MESSAGE_ID,
+        "object": "chat.completion.chunk",
+        "created": CREATED,
+        "model": MODEL,
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]
+    }
+
+
+def bench_json_dumps(events: int) -> float:
+    started = time.perf_counter()
+    for i in range(events):
+        (f"data: {json.dumps(dict_chunk(DELTAS[i % len(DELTAS)]))}\n\n").encode("utf-8")
+    return events / (time.perf_counter() - started)
+
+
+def bench_encoder(events: int) -> float:
+    encoder = StreamingChunkEncoder(MESSAGE_ID, MODEL, CREATED)
+    started = time.perf_counter()
+    for i in range(events):
+        encoder.content(DELTAS[i % len(DELTAS)])
+    return events / (time.perf_counter() - started)
+
+
+def check_equivalent():
+    """The encoder must emit the same JSON the dict path did."""
+    encoder = StreamingChunkEncoder(MESSAGE_ID, MODEL, CREATED)
+    for delta in DELTAS:
+        event = encoder.content(delta)
+        assert event.startswith(b"data: ") and event.endswith(b"\n\n")
+        assert json.loads(event[6:]) == dict_chunk(delta), delta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SSE content chunk encoding")
+    parser.add_argument("--events", type=int, default=200000, help="content events per run")
+    args = parser.parse_args()
+
+    orjson = sse.orjson
+    results = [("json.dumps(dict)", bench_json_dumps(args.events))]
+    sse.orjson = None
+    try:
+        check_equivalent()
+        results.append(("encoder, stdlib json", bench_encoder(args.events)))
+    finally:
+        sse.orjson = orjson
+    if orjson is not None:
+        check_equivalent()
+        results.append(("encoder, orjson", bench_encoder(args.events)))
+    else:
+        print("orjson not installed, skipping the orjson run (pip install .[speedups])")
+
+    baseline = results[0][1]
+    for name, rate in results:
+        print(f"{name:<24}{rate:>12,.0f} events/s {rate / baseline:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,9 @@
 __version__ = "0.1.0"
 
-from .api import create_api
\ No newline at end of file
+
+def __getattr__(name):
+    # Imported on first access so lightweight modules (like core.lazy) can load before the web stack
+    if name == "create_api":
+        from .api import create_api
+        return create_api
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,327 @@
+import logging
+import asyncio
+import heapq
+import itertools
+import math
+import time
+import weakref
+from typing import Dict, Any, Optional, AsyncGenerator, List
+
+logger = logging.getLogger(__name__)
+
+# Defaults applied to every provider unless overridden in config.json
+DEFAULT_ADMISSION_SETTINGS = {
+    "max_concurrency": 16,
+    "max_queue": 64,
+    "max_queue_time": 60.0
+}
+
+# Provider specific defaults: local servers run one or two generations at a time
+PROVIDER_ADMISSION_DEFAULTS = {
+    "ollama": {"max_concurrency": 2, "max_queue": 32},
+    "llamacpp": {"max_concurrency": 4, "max_queue": 32},
+    "openrouter": {"max_concurrency": 64, "max_queue": 256, "max_queue_time": 30.0}
+}
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted to a provider."""
+
+    def __init__(self, message: str, status_code: int = 429, retry_after: int = 1):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def to_error(self) -> Dict[str, Any]:
+        return {
+            "message": self.message,
+            "code": self.status_code,
+            "type": "rate_limit_exceeded" if self.status_code == 429 else "service_unavailable"
+        }
+
+
+class ConcurrencyLimiter:
+    """
+    Concurrency limit with a bounded wait queue.
+
+    Up to `max_concurrency` holders run at once. Further callers wait, at most
+    `max_queue` of them and for at most `max_queue_time` seconds. Waiters are
+    served in arrival order unless they pass a priority (lower goes first),
+    which is how the fair scheduler's virtual finish times are applied.
+    A full queue is rejected immediately with 429; a wait that is predicted
+    to exceed, or actually exceeds, the queue time limit is rejected with
+    503. Both carry a Retry-After estimate derived from observed service
+    times.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_queue_time: float):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_queue_time = max_queue_time
+        self.active = 0
+        # Heap of (priority, arrival sequence, future)
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_wait = 0.0
+        self.max_wait = 0.0
+        self.avg_service_time = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimate_wait(self, position: Optional[int] = None) -> float:
+        """Expected seconds until a caller at `position` in the queue is admitted."""
+        if position is None:
+            position = len(self._waiters)
+        if not self.avg_service_time:
+            return 0.0
+        return (position + 1) * self.avg_service_time / self.max_concurrency
+
+    def _retry_after(self) -> int:
+        estimate = self.estimate_wait() or 1.0
+        return max(1, math.ceil(min(estimate, self.max_queue_time)))
+
+    def _reject(self, message: str, status_code: int):
+        self.rejected += 1
+        raise AdmissionRejected(f"{self.name}: {message}", status_code, self._retry_after())
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now, without queueing."""
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        return False
+
+    async def acquire(self, priority: Optional[float] = None):
+        """Take a slot, waiting in the queue if necessary."""
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject("too many queued requests", 429)
+        if self.estimate_wait() > self.max_queue_time:
+            self._reject("expected queue time exceeds limit", 503)
+
+        waiter = asyncio.get_running_loop().create_future()
+        sequence = next(self._sequence)
+        heapq.heappush(self._waiters, (priority if priority is not None else 0.0, sequence, waiter))
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_queue_time)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the timer fired
+                self._record_wait(time.monotonic() - queued_at)
+                self.admitted += 1
+                return
+            self._discard(waiter)
+            self.timed_out += 1
+            self._reject("timed out waiting in queue", 503)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+        self._record_wait(time.monotonic() - queued_at)
+        self.admitted += 1
+
+    def release(self, service_time: Optional[float] = None):
+        """Return a slot, handing it straight to the next waiter if there is one."""
+        if service_time is not None:
+            self.avg_service_time = (service_time if not self.avg_service_time
+                                     else EWMA_ALPHA * service_time + (1 - EWMA_ALPHA) * self.avg_service_time)
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)[2]
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active = max(0, self.active - 1)
+
+    def _discard(self, waiter):
+        waiter.cancel()
+        remaining = [entry for entry in self._waiters if entry[2] is not waiter]
+        if len(remaining) != len(self._waiters):
+            heapq.heapify(remaining)
+            self._waiters = remaining
+
+    def _record_wait(self, waited: float):
+        self.avg_wait = EWMA_ALPHA * waited + (1 - EWMA_ALPHA) * self.avg_wait
+        self.max_wait = max(self.max_wait, waited)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_queue_time": self.max_queue_time,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait": round(self.avg_wait, 3),
+            "max_wait": round(self.max_wait, 3),
+            "avg_service_time": round(self.avg_service_time, 3)
+        }
+
+
+class AdmissionPermit:
+    """Slots held by one admitted request; releasing is idempotent."""
+
+    def __init__(self, limiters: List[ConcurrencyLimiter]):
+        self._limiters = limiters
+        self._acquired_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        service_time = time.monotonic() - self._acquired_at
+        for limiter in reversed(self._limiters):
+            limiter.release(service_time)
+
+
+class AdmissionController:
+    """
+    Per-provider and per-model admission control for the router.
+
+    Limits come from the "admission" section of config.json:
+    "providers" maps a provider to its limits, and "models" maps a provider
+    to {model: limits} for models that need a tighter bound of their own.
+    A request holds its model slot (if configured) and its provider slot
+    until the response, including a streamed one, has finished.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.enabled = config.get("enabled", True)
+        self.provider_config = config.get("providers", {})
+        self.model_config = config.get("models", {})
+        self._providers: Dict[str, ConcurrencyLimiter] = {}
+        self._models: Dict[str, ConcurrencyLimiter] = {}
+
+    def get_settings(self, provider: str) -> Dict[str, Any]:
+        """Return the effective limits for a provider."""
+        settings = dict(DEFAULT_ADMISSION_SETTINGS)
+        settings.update(PROVIDER_ADMISSION_DEFAULTS.get(provider, {}))
+        settings.update(self.provider_config.get(provider, {}))
+        return settings
+
+    def _get_provider_limiter(self, provider: str) -> ConcurrencyLimiter:
+        limiter = self._providers.get(provider)
+        if limiter is None:
+            settings = self.get_settings(provider)
+            limiter = ConcurrencyLimiter(provider, settings["max_concurrency"],
+                                         settings["max_queue"], settings["max_queue_time"])
+            self._providers[provider] = limiter
+        return limiter
+
+    def _get_model_limiter(self, provider: str, model: str) -> Optional[ConcurrencyLimiter]:
+        overrides = self.model_config.get(provider, {}).get(model)
+        if not overrides:
+            return None
+        key = f"{provider}/{model}"
+        limiter = self._models.get(key)
+        if limiter is None:
+            settings = self.get_settings(provider)
+            settings.update(overrides)
+            limiter = ConcurrencyLimiter(key, settings["max_concurrency"],
+                                         settings["max_queue"], settings["max_queue_time"])
+            self._models[key] = limiter
+        return limiter
+
+    async def acquire(self, provider: str, model: str, priority: Optional[float] = None) -> AdmissionPermit:
+        """
+        Admit a request to a provider and model.
+
+        Waiters with a lower `priority` are admitted first; without one the
+        queue is FIFO. Raises AdmissionRejected (429 or 503 with Retry-After)
+        when saturated.
+        """
+        if not self.enabled:
+            return AdmissionPermit([])
+
+        limiters = []
+        model_limiter = self._get_model_limiter(provider, model)
+        if model_limiter is not None:
+            limiters.append(model_limiter)
+        limiters.append(self._get_provider_limiter(provider))
+
+        acquired = []
+        try:
+            for limiter in limiters:
+                await limiter.acquire(priority)
+                acquired.append(limiter)
+        except BaseException:
+            for limiter in reversed(acquired):
+                limiter.release()
+            raise
+        return AdmissionPermit(acquired)
+
+    def try_acquire(self, provider: str, model: str) -> Optional[AdmissionPermit]:
+        """Admit a request only if its provider and model have a free slot right now, else None."""
+        if not self.enabled:
+            return AdmissionPermit([])
+
+        limiters = []
+        model_limiter = self._get_model_limiter(provider, model)
+        if model_limiter is not None:
+            limiters.append(model_limiter)
+        limiters.append(self._get_provider_limiter(provider))
+
+        acquired = []
+        for limiter in limiters:
+            if not limiter.try_acquire():
+                for held in reversed(acquired):
+                    held.release()
+                return None
+            acquired.append(limiter)
+        return AdmissionPermit(acquired)
+
+    async def hold(self, permit: AdmissionPermit, generator: AsyncGenerator) -> AsyncGenerator:
+        """Yield from a stream generator, releasing the permit once it finishes."""
+        try:
+            async for chunk in generator:
+                yield chunk
+        finally:
+            permit.release()
+            await generator.aclose()
+
+    def attach(self, permit: AdmissionPermit, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Tie a permit to a routed result: streams keep it until they end,
+        anything else releases it right away.
+        """
+        generator = result.get("stream_generator") if isinstance(result, dict) else None
+        if generator is None:
+            permit.release()
+            return result
+        held = self.hold(permit, generator)
+        # A stream that is never iterated (client gone before the body started) still frees its slot
+        weakref.finalize(held, permit.release)
+        result["stream_generator"] = held
+        return result
+
+    def get_stats(self, provider: str) -> Dict[str, Any]:
+        """Return limiter state for a provider and its model-level limits."""
+        limiter = self._providers.get(provider)
+        stats = limiter.get_stats() if limiter else dict(self.get_settings(provider), active=0, queued=0)
+        prefix = f"{provider}/"
+        models = {key[len(prefix):]: model_limiter.get_stats()
+                  for key, model_limiter in self._models.items() if key.startswith(prefix)}
+        if models:
+            stats["models"] = models
+        return stats
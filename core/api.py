@@ -1,9 +1,11 @@
 import logging
+import asyncio
 import uuid
 import time
 import json
 import sys
 import argparse
+from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import StreamingResponse, JSONResponse
@@ -15,12 +17,15 @@ DEFAULT_VERIFICATION_COMPLETION_TOKENS = 8
 CURSOR_VERIFICATION_KEYWORDS = ["test", "hello", "hi", "ping", "verify", "check", "connection"]
 MAX_VERIFICATION_MESSAGE_LENGTH = 20
 from .router import Router
+from .admission import AdmissionRejected
+from .scheduler import FairScheduler
+from .response_cache import parse_cache_mode
+from .sampling import extract_sampling
+from .disconnect import DisconnectAwareStreamingResponse
+from .lazy import startup_profiler, warm_up
+from .tokens import token_counter
+from .tracking import RequestEventQueue, RequestTrackingMiddleware
 from .util import load_config, start_localhost_run_tunnel
-from .handlers import (
-    OllamaRequestHandler, OllamaResponseHandler,
-    OpenRouterRequestHandler, OpenRouterResponseHandler,
-    LlamaCppRequestHandler, LlamaCppResponseHandler
-)
 import uvicorn
 
 logger = logging.getLogger(__name__)
@@ -32,54 +37,63 @@ tunnel_port = None
 def create_api(
     ollama_endpoint=None,
     api_key=None,
-    request_callback=None
+    request_callback=None,
+    router=None,
+    on_ready=None
 ):
-    """Create a new FastAPI instance with all routes configured"""
-    app = FastAPI(title="OllamaLink")
-
-    # Initialize components with proper error handling
-    router = None
-    ollama_request_handler = None
-    ollama_response_handler = None
-    openrouter_request_handler = None
-    openrouter_response_handler = None
-    llamacpp_request_handler = None
-    llamacpp_response_handler = None
+    """
+    Create a new FastAPI instance with all routes configured.
     
+    An existing `router` can be passed in to share it with the caller.
+    `on_ready(router)` is awaited in the background once the server has
+    started and heavy resources have been warmed up.
+    """
     try:
-        router = Router(ollama_endpoint=ollama_endpoint, config_path=Path("config.json"))
+        if router is None:
+            with startup_profiler.phase("router init"):
+                router = Router(ollama_endpoint=ollama_endpoint, config_path=Path("config.json"))
         logger.info("Router initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize router: {str(e)}")
         logger.error("Server will start with limited functionality")
     
-    try:
-        config = load_config(Path("config.json"))
-        
-        ollama_endpoint_url = ollama_endpoint or config.get("ollama", {}).get("endpoint", "http://localhost:11434")
-        ollama_request_handler = OllamaRequestHandler(endpoint=ollama_endpoint_url)
-        ollama_response_handler = OllamaResponseHandler()
-        
-        openrouter_config = config.get("openrouter", {})
-        openrouter_api_key = openrouter_config.get("api_key", "")
-        if openrouter_api_key:
-            openrouter_request_handler = OpenRouterRequestHandler(
-                endpoint=openrouter_config.get("endpoint", "https://openrouter.ai/api/v1"),
-                api_key=openrouter_api_key
-            )
-        else:
-            openrouter_request_handler = None
-        openrouter_response_handler = OpenRouterResponseHandler()
-        
-        llamacpp_config = config.get("llamacpp", {})
-        llamacpp_request_handler = LlamaCppRequestHandler(
-            endpoint=llamacpp_config.get("endpoint", "http://localhost:8080")
-        )
-        llamacpp_response_handler = LlamaCppResponseHandler()
-        logger.info("All handlers initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize handlers: {str(e)}")
-        logger.error("Server will start with limited functionality")
+    request_events = RequestEventQueue(request_callback) if request_callback else None
+
+    async def warm_up_and_notify():
+        with startup_profiler.phase("background warm-up"):
+            await warm_up()
+        if router:
+            with startup_profiler.phase("tokenizer warm-up"):
+                await token_counter.warm_up(router.mapped_models())
+            with startup_profiler.phase("initial model fetch"):
+                await router.wait_for_models()
+        if on_ready is not None:
+            try:
+                await on_ready(router)
+            except Exception as e:
+                logger.error(f"Startup callback failed: {str(e)}")
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        """Open shared provider resources on startup and release them on shutdown"""
+        with startup_profiler.phase("lifespan startup"):
+            if router:
+                await router.startup()
+            if request_events:
+                request_events.start()
+        # Tokenizers and the like load in the background rather than delaying the port bind
+        warm_up_task = asyncio.get_running_loop().create_task(warm_up_and_notify())
+        try:
+            yield
+        finally:
+            if not warm_up_task.done():
+                warm_up_task.cancel()
+            if router:
+                await router.aclose()
+            if request_events:
+                request_events.close()
+
+    app = FastAPI(title="OllamaLink", lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -120,170 +134,8 @@ def create_api(
                 
             return await call_next(request)
 
-    if request_callback:
-        @app.middleware("http")
-        async def request_tracking_middleware(request: Request, call_next):
-            if not request.url.path.startswith("/v1/chat/completions"):
-                return await call_next(request)
-                
-            body = await request.body()
-            request_data = None
-            
-            if body:
-                try:
-                    request_data = json.loads(body)
-                    request_callback({
-                        "type": "request",
-                        "request": request_data
-                    })
-                except (json.JSONDecodeError, ValueError):
-                    pass
-                    
-            class ResponseInterceptor(StreamingResponse):
-                
-                def __init__(self, content, **kwargs):
-                    self.is_streaming = kwargs.pop("is_streaming", False)
-                    self.original_content = content
-                    self.chunk_count = 0
-                    self.start_time = time.time()
-                    
-                    if self.is_streaming:
-                        async def wrapped_content():
-                            if request_callback and request_data:
-                                request_callback({
-                                    "type": "stream_start",
-                                    "request": request_data
-                                })
-                                
-                            try:
-                                async for chunk in self.original_content:
-                                    self.chunk_count += 1
-                                    
-                                    if self.chunk_count % 10 == 0:
-                                        request_callback({
-                                            "type": "stream_chunk",
-                                            "request": request_data,
-                                            "chunk_count": self.chunk_count,
-                                            "elapsed": time.time() - self.start_time
-                                        })
-                                        
-                                    yield chunk
-                                    
-                                if request_callback and request_data:
-                                    request_callback({
-                                        "type": "stream_end",
-                                        "request": request_data,
-                                        "chunk_count": self.chunk_count,
-                                        "elapsed": time.time() - self.start_time
-                                    })
-                                    
-                            except Exception as e:
-                                logger.error(f"Error in stream processing: {str(e)}")
-                                if request_callback and request_data:
-                                    request_callback({
-                                        "type": "error",
-                                        "request": request_data,
-                                        "error": str(e)
-                                    })
-                                    
-                        content = wrapped_content()
-                        
-                    super().__init__(content, **kwargs)
-                    
-            async def _intercept_response(response_body):
-                if request_callback and request_data:
-                    try:
-                        if response_body.strip().startswith("data:"):
-                            request_callback({
-                                "type": "response",
-                                "request": request_data,
-                                "response": {"message": "SSE streaming response"}
-                            })
-                        else:
-                            response_body = response_body.strip()
-                            if response_body:
-                                response_data = json.loads(response_body)
-                                request_callback({
-                                    "type": "response",
-                                    "request": request_data,
-                                    "response": response_data
-                                })
-                            else:
-                                request_callback({
-                                    "type": "error",
-                                    "request": request_data,
-                                    "error": "Empty response received"
-                                })
-                    except json.JSONDecodeError as json_error:
-                        logger.error(f"Error parsing JSON response: {json_error} - Response body: '{response_body[:100]}...'")
-                        request_callback({
-                            "type": "error",
-                            "request": request_data,
-                            "error": f"Invalid JSON in response: {str(json_error)}"
-                        })
-                    except Exception as e:
-                        logger.error(f"Error tracking response: {str(e)}")
-                        
-                return response_body
-                
-            modified_request = Request(
-                scope=request.scope,
-                receive=request._receive
-            )
-            
-            async def modified_receive():
-                data = await request._receive()
-                if data["type"] == "http.request":
-                    data["body"] = body
-                return data
-                
-            modified_request._receive = modified_receive
-            
-            try:
-                response = await call_next(modified_request)
-                
-                if isinstance(response, StreamingResponse):
-                    is_streaming = True
-                    
-                    interceptor = ResponseInterceptor(
-                        response.body_iterator,
-                        status_code=response.status_code,
-                        headers=dict(response.headers),
-                        media_type=response.media_type,
-                        background=response.background,
-                        is_streaming=is_streaming
-                    )
-                    
-                    return interceptor
-                    
-                else:
-                    body = b""
-                    async for chunk in response.body_iterator:
-                        body += chunk
-                        
-                    try:
-                        body_str = body.decode('utf-8')
-                        processed_body = await _intercept_response(body_str)
-                        body = processed_body.encode('utf-8')
-                    except Exception as e:
-                        logger.error(f"Error processing response: {str(e)}")
-                        
-                    return Response(
-                        content=body,
-                        status_code=response.status_code,
-                        headers=dict(response.headers),
-                        media_type=response.media_type,
-                        background=response.background
-                    )
-            except Exception as e:
-                logger.error(f"Error in request processing: {str(e)}")
-                if request_callback and request_data:
-                    request_callback({
-                        "type": "error",
-                        "request": request_data,
-                        "error": str(e)
-                    })
-                raise
+    if request_events:
+        app.add_middleware(RequestTrackingMiddleware, events=request_events)
 
     @app.get("/v1")
     async def api_info():
@@ -303,8 +155,8 @@ def create_api(
                     status_code=503,
                     content={"error": {"message": "Router not initialized", "code": "service_unavailable"}}
                 )
-            models = await router.get_available_models()
-            return {"data": models, "object": "list"}
+            body = await router.get_models_body()
+            return Response(content=body, media_type="application/json")
         except Exception as e:
             logger.error(f"Error listing models: {str(e)}")
             return JSONResponse(
@@ -322,6 +174,7 @@ def create_api(
                     content={"error": {"message": "Router not initialized", "code": "service_unavailable"}}
                 )
             status = router.get_provider_status()
+            status["client_disconnects"] = DisconnectAwareStreamingResponse.get_stats()["disconnects"]
             return status
         except Exception as e:
             logger.error(f"Error getting provider status: {str(e)}")
@@ -352,6 +205,9 @@ def create_api(
                         "models": status["ollama"]["models"],
                         "endpoint": status["ollama"]["endpoint"],
                         "status": "connected" if status["ollama"]["healthy"] else "disconnected",
+                        "queue_depth": status["ollama"]["admission"]["queued"],
+                        "active_requests": status["ollama"]["admission"]["active"],
+                        "avg_queue_wait": status["ollama"]["admission"].get("avg_wait", 0.0),
                         "error": None if status["ollama"]["healthy"] else "Connection failed"
                     },
                     "openrouter": {
@@ -361,6 +217,9 @@ def create_api(
                         "models": status["openrouter"]["models"],
                         "endpoint": status["openrouter"]["endpoint"],
                         "status": "connected" if status["openrouter"]["healthy"] else "disconnected",
+                        "queue_depth": status["openrouter"]["admission"]["queued"],
+                        "active_requests": status["openrouter"]["admission"]["active"],
+                        "avg_queue_wait": status["openrouter"]["admission"].get("avg_wait", 0.0),
                         "error": None if status["openrouter"]["healthy"] else "API key or connection issue"
                     },
                     "llamacpp": {
@@ -370,10 +229,14 @@ def create_api(
                         "models": status["llamacpp"]["models"],
                         "endpoint": status["llamacpp"]["endpoint"],
                         "status": "connected" if status["llamacpp"]["healthy"] else "disconnected",
+                        "queue_depth": status["llamacpp"]["admission"]["queued"],
+                        "active_requests": status["llamacpp"]["admission"]["active"],
+                        "avg_queue_wait": status["llamacpp"]["admission"].get("avg_wait", 0.0),
                         "error": None if status["llamacpp"]["healthy"] else "Server not available"
                     }
                 },
                 "routing": status["routing"],
+                "models_version": status["models_version"],
                 "timestamp": int(time.time())
             }
             
@@ -390,7 +253,10 @@ def create_api(
     async def chat_completions(request: Request):
         """Handle chat completions"""
         try:
-            body = await request.json()
+            # Parsed once by the tracking middleware when it is installed
+            body = getattr(request.state, "request_data", None)
+            if body is None:
+                body = await request.json()
             
             user_agent = request.headers.get("User-Agent", "")
             is_cursor = "Cursor" in user_agent
@@ -416,6 +282,15 @@ def create_api(
             temperature = body.get("temperature", 0.7)
             provider = body.get("provider", None) 
             
+            # Requests are scheduled fairly across API keys / clients
+            tenant = FairScheduler.tenant_from_headers(request.headers)
+            
+            # Per-client streaming mode ("passthrough" or "smooth"), falls back to config
+            stream_mode = request.headers.get("X-Stream-Mode") or body.get("stream_mode")
+            
+            # X-Response-Cache: "force" caches non-deterministic requests, "bypass" skips the cache
+            cache_mode = parse_cache_mode(request.headers.get("X-Response-Cache"))
+            
             max_tokens = body.get("max_tokens", None)
             if max_tokens is None:
                 max_tokens = body.get("max_new_tokens", None)
@@ -425,6 +300,9 @@ def create_api(
             if max_tokens is not None:
                 max_tokens = int(max_tokens)
             
+            # top_p, stop, seed, ... are forwarded to the provider as-is
+            sampling = extract_sampling(body)
+            
             # Handle Cursor verification requests with direct response
             if is_cursor_verification:
                 logger.info("Responding to Cursor verification with direct response")
@@ -486,7 +364,11 @@ def create_api(
                     messages=messages,
                     temperature=temperature,
                     max_tokens=max_tokens,
-                    stream=stream
+                    stream=stream,
+                    stream_mode=stream_mode,
+                    tenant=tenant,
+                    cache_mode=cache_mode,
+                    sampling=sampling
                 )
             else:
                 route_result = await router.make_request(
@@ -494,7 +376,11 @@ def create_api(
                     messages=messages,
                     temperature=temperature,
                     max_tokens=max_tokens,
-                    stream=stream
+                    stream=stream,
+                    stream_mode=stream_mode,
+                    tenant=tenant,
+                    cache_mode=cache_mode,
+                    sampling=sampling
                 )
             
             # Check if router returned an error that should be passed through
@@ -512,8 +398,8 @@ def create_api(
             
             # Use router's result directly instead of separate handlers
             if route_result.get("stream"):
-                # Router returned streaming result
-                return StreamingResponse(
+                # Router returned streaming result; a client disconnect cancels the upstream generation
+                return DisconnectAwareStreamingResponse(
                     route_result["stream_generator"],
                     media_type="text/event-stream",
                     headers={
@@ -541,6 +427,13 @@ def create_api(
                 content={"error": {"message": "Internal routing error", "code": "routing_error"}}
             )
                 
+        except AdmissionRejected as e:
+            logger.warning(f"Rejected chat completion request: {e.message}")
+            return JSONResponse(
+                status_code=e.status_code,
+                content={"error": e.to_error()},
+                headers={"Retry-After": str(e.retry_after)}
+            )
         except Exception as e:
             logger.error(f"Error processing chat completion request: {str(e)}")
             return JSONResponse(
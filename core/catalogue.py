@@ -0,0 +1,215 @@
+import logging
+import asyncio
+import json
+import time
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Mapping, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before retrying a provider whose last refresh failed
+DEFAULT_ERROR_BACKOFF = 10.0
+
+
+class CatalogueEntry:
+    """Cached model list of a single provider."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.models: List[Dict[str, Any]] = []
+        self.fingerprint: Optional[tuple] = None
+        self.fetched_at = 0.0
+        self.failed_at = 0.0
+        self.last_error: Optional[str] = None
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    def is_loaded(self) -> bool:
+        return self.fetched_at > 0
+
+    def is_fresh(self) -> bool:
+        return self.is_loaded() and time.time() - self.fetched_at < self.ttl
+
+
+class ModelCatalogue:
+    """
+    Stale-while-revalidate cache of provider model catalogues.
+
+    Each provider registers a loader coroutine and a TTL. Readers get the
+    cached list immediately; an expired entry is still served while a single
+    background refresh runs, and concurrent refreshes of the same provider
+    share one in-flight task. Only a provider that has never loaded makes
+    callers wait. `version` increases whenever any catalogue's contents
+    change, so derived data (like the serialized /v1/models body) can be
+    rebuilt only when needed.
+    """
+
+    def __init__(self, error_backoff: float = DEFAULT_ERROR_BACKOFF):
+        self.error_backoff = error_backoff
+        self.version = 0
+        self._entries: Dict[str, CatalogueEntry] = {}
+        self._loaders: Dict[str, Callable[[], Awaitable[List[Dict[str, Any]]]]] = {}
+
+    def register(self, provider: str, loader: Callable[[], Awaitable[List[Dict[str, Any]]]], ttl: float):
+        """Register a provider, the coroutine used to load its models and its TTL."""
+        self._loaders[provider] = loader
+        self._entries[provider] = CatalogueEntry(ttl)
+
+    def providers(self) -> List[str]:
+        return list(self._entries)
+
+    def get_models(self, provider: str) -> List[Dict[str, Any]]:
+        """Return the cached models of a provider without triggering any I/O."""
+        entry = self._entries.get(provider)
+        return entry.models if entry is not None else []
+
+    async def get(self, provider: str) -> List[Dict[str, Any]]:
+        """
+        Return the models of a provider.
+
+        Fresh entries are returned as-is, stale entries are returned while a
+        background refresh runs, and only an entry that was never loaded waits
+        for the fetch.
+        """
+        entry = self._entries.get(provider)
+        if entry is None:
+            return []
+        if entry.is_fresh():
+            return entry.models
+        if entry.is_loaded():
+            self._schedule_refresh(provider)
+            return entry.models
+        if entry.failed_at and time.time() - entry.failed_at < self.error_backoff:
+            return entry.models
+        return await self.refresh(provider)
+
+    def revalidate(self):
+        """Start background refreshes for expired entries without waiting for them."""
+        for provider, entry in self._entries.items():
+            if entry.is_loaded() and not entry.is_fresh():
+                self._schedule_refresh(provider)
+
+    async def get_all(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return the models of every provider, loading missing ones concurrently."""
+        providers = self.providers()
+        results = await asyncio.gather(*(self.get(provider) for provider in providers))
+        return dict(zip(providers, results))
+
+    async def refresh(self, provider: str) -> List[Dict[str, Any]]:
+        """Refresh a provider now, joining an in-flight refresh if there is one."""
+        entry = self._entries.get(provider)
+        if entry is None:
+            return []
+        task = self._start_refresh(provider, entry)
+        # Shield so a cancelled caller doesn't abort the refresh other callers share
+        return await asyncio.shield(task)
+
+    async def refresh_all(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Refresh every provider concurrently."""
+        providers = self.providers()
+        results = await asyncio.gather(*(self.refresh(provider) for provider in providers))
+        return dict(zip(providers, results))
+
+    def _schedule_refresh(self, provider: str):
+        entry = self._entries[provider]
+        if entry.failed_at and time.time() - entry.failed_at < self.error_backoff:
+            return
+        self._start_refresh(provider, entry)
+
+    def _start_refresh(self, provider: str, entry: CatalogueEntry) -> asyncio.Task:
+        if entry.refresh_task is None or entry.refresh_task.done():
+            entry.refresh_task = asyncio.get_running_loop().create_task(self._load(provider, entry))
+        return entry.refresh_task
+
+    async def _load(self, provider: str, entry: CatalogueEntry) -> List[Dict[str, Any]]:
+        try:
+            models = await self._loaders[provider]()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            entry.failed_at = time.time()
+            entry.last_error = str(e)
+            if entry.is_loaded():
+                logger.warning(f"Refreshing {provider} models failed, serving stale catalogue: {str(e)}")
+            else:
+                logger.error(f"Loading {provider} models failed: {str(e)}")
+            return entry.models
+
+        fingerprint = self._fingerprint(models)
+        if fingerprint != entry.fingerprint:
+            entry.models = models
+            entry.fingerprint = fingerprint
+            self.version += 1
+            logger.info(f"{provider} catalogue updated ({len(models)} models, version {self.version})")
+        entry.fetched_at = time.time()
+        entry.failed_at = 0.0
+        entry.last_error = None
+        return entry.models
+
+    @staticmethod
+    def _fingerprint(models: List[Dict[str, Any]]) -> tuple:
+        # "created" is stamped at fetch time by some clients and says nothing about the catalogue
+        return tuple(
+            tuple(sorted((key, repr(value)) for key, value in model.items() if key != "created"))
+            for model in models
+        )
+
+    async def aclose(self):
+        """Cancel any in-flight refreshes."""
+        for entry in self._entries.values():
+            task = entry.refresh_task
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            entry.refresh_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache state for status endpoints."""
+        now = time.time()
+        return {
+            provider: {
+                "models": len(entry.models),
+                "ttl": entry.ttl,
+                "age_seconds": round(now - entry.fetched_at, 1) if entry.is_loaded() else None,
+                "fresh": entry.is_fresh(),
+                "refreshing": entry.refresh_task is not None and not entry.refresh_task.done(),
+                "last_error": entry.last_error
+            }
+            for provider, entry in self._entries.items()
+        }
+
+
+class ModelSnapshot:
+    """
+    Immutable, versioned view of the merged model list.
+
+    A snapshot is built once per change of the provider catalogues, the model
+    mappings or provider health, and then shared by every reader: the model
+    entries are read-only mappings and the /v1/models body is serialized once
+    at build time.
+    """
+
+    __slots__ = ("version", "state", "models", "counts", "body", "created")
+
+    def __init__(self, version: int, state: Any, models: List[Dict[str, Any]], counts: Dict[str, int]):
+        created = int(time.time())
+        self.version = version
+        self.state = state
+        self.created = created
+        self.models: Tuple[Mapping[str, Any], ...] = tuple(MappingProxyType(model) for model in models)
+        self.counts: Mapping[str, int] = MappingProxyType(dict(counts))
+        self.body = json.dumps({"data": models, "object": "list"}).encode("utf-8")
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError(f"ModelSnapshot is immutable, cannot set {name}")
+        object.__setattr__(self, name, value)
+
+    def __len__(self) -> int:
+        return len(self.models)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Return a mutable copy of the merged model list."""
+        return [dict(model) for model in self.models]
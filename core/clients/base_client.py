@@ -2,6 +2,10 @@ import logging
 import time
 from abc import ABC, abstractmethod
 from typing import Dict, List, Any, Optional, AsyncGenerator
+import httpx
+from ..pool import ConnectionPoolRegistry
+from ..health import HealthMonitor
+from ..resolver import ModelIndex
 
 logger = logging.getLogger(__name__)
 
@@ -11,9 +15,13 @@ class BaseClient(ABC):
     Defines the common interface and shared functionality.
     """
     
-    def __init__(self, endpoint: str, name: str):
+    def __init__(self, endpoint: str, name: str, pools: Optional[ConnectionPoolRegistry] = None,
+                 health: Optional[HealthMonitor] = None):
         self.endpoint = endpoint.rstrip('/')
         self.name = name
+        self.provider_key = name.lower()
+        self.pools = pools if pools is not None else ConnectionPoolRegistry()
+        self.health = health
         self.available_models = []
         self.connection_error = None
         self.model_cache_time = 0
@@ -21,8 +29,45 @@ class BaseClient(ABC):
         
         logger.info(f"{self.name} client initialized with endpoint: {self.endpoint}")
     
+    @property
+    def available_models(self) -> List[Dict[str, Any]]:
+        return self._available_models
+    
+    @available_models.setter
+    def available_models(self, models: List[Dict[str, Any]]):
+        self._available_models = models
+        self._model_index = None
+    
+    @property
+    def model_index(self) -> ModelIndex:
+        """Lookup index over available_models, rebuilt only after the list is replaced."""
+        if self._model_index is None:
+            self._model_index = ModelIndex(self._available_models, self._normalize_model_name)
+        return self._model_index
+    
+    @property
+    def request_handlers(self) -> List[Any]:
+        """Every request handler of the provider, for settings that apply to all of them."""
+        return [self.request_handler]
+    
+    def get_http_client(self) -> httpx.AsyncClient:
+        """Get the shared connection pool for this provider."""
+        return self.pools.get_client(self.provider_key)
+    
+    async def probe(self) -> bool:
+        """Lightweight health probe used by the background health monitor."""
+        return await self.request_handler.test_connection()
+    
+    def _record_success(self):
+        if self.health is not None:
+            self.health.record_success(self.provider_key)
+    
+    def _record_failure(self, error: str):
+        if self.health is not None:
+            self.health.record_failure(self.provider_key, error)
+    
     @abstractmethod
-    def test_connection(self) -> Dict[str, Any]:
+    async def test_connection(self) -> Dict[str, Any]:
         """
         Test the connection to the provider.
         Returns: {"status": "connected"|"error", "message": str}
@@ -30,9 +75,10 @@ class BaseClient(ABC):
         pass
     
     @abstractmethod
-    def fetch_models(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+    async def fetch_models(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """
-        Fetch available models from the provider.
+        Fetch available models from the provider and store them in available_models.
+        Served from cache unless force_refresh is set or the cache has expired.
         Returns: List of model dictionaries with at least 'id' and 'name' fields
         """
         pass
@@ -62,7 +108,8 @@ class BaseClient(ABC):
     @abstractmethod
     async def chat_completion(self, model: str, messages: List[Dict[str, Any]], 
                             temperature: float = 0.7, max_tokens: Optional[int] = None,
-                            stream: bool = False) -> Dict[str, Any]:
+                            stream: bool = False,
+                            sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Make a chat completion request.
         Args:
@@ -71,13 +118,17 @@ class BaseClient(ABC):
             temperature: Generation temperature
             max_tokens: Maximum tokens to generate
             stream: Whether to stream the response
+            sampling: Other OpenAI sampling parameters (top_p, stop, seed, ...)
         Returns: Response dictionary with status and data/error
         """
         pass
     
     @abstractmethod
     async def stream_chat_completion(self, model: str, messages: List[Dict[str, Any]],
-                                   temperature: float = 0.7, max_tokens: Optional[int] = None) -> AsyncGenerator[Dict[str, Any], None]:
+                                   temperature: float = 0.7, max_tokens: Optional[int] = None,
+                                   stream_mode: Optional[str] = None,
+                                   display_model: Optional[str] = None,
+                                   sampling: Optional[Dict[str, Any]] = None) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Stream a chat completion request.
         Args:
@@ -85,6 +136,9 @@ class BaseClient(ABC):
             messages: List of message dictionaries
             temperature: Generation temperature
             max_tokens: Maximum tokens to generate
+            stream_mode: "passthrough" (default), "smooth" or "relay"
+            display_model: Model name reported to the client (defaults to model)
+            sampling: Other OpenAI sampling parameters (top_p, stop, seed, ...)
         Yields: Response chunks as dictionaries
         """
         pass
@@ -96,10 +150,7 @@ class BaseClient(ABC):
             model_id: The model ID to search for
         Returns: Model dictionary or None if not found
         """
-        for model in self.available_models:
-            if model.get("id") == model_id:
-                return model
-        return None
+        return self.model_index.get(model_id)
     
     def search_models(self, query: str) -> List[Dict[str, Any]]:
         """
@@ -1,11 +1,13 @@
 import logging
 import httpx
 import json
-import requests
 import time
 from typing import Dict, List, Any, Optional, AsyncGenerator
 from .base_client import BaseClient
 from ..handlers import LlamaCppRequestHandler, LlamaCppResponseHandler
+from ..pool import ConnectionPoolRegistry
+from ..health import HealthMonitor
+from ..slots import LlamaCppSlotManager
 
 logger = logging.getLogger(__name__)
 
@@ -15,24 +17,46 @@ class LlamaCppClient(BaseClient):
     Handles model discovery, chat completions, and streaming for llama.cpp.
     """
     
-    def __init__(self, endpoint: str = "http://localhost:8080"):
-        super().__init__(endpoint, "LlamaCpp")
+    def __init__(self, endpoint: str = "http://localhost:8080",
+                 pools: Optional[ConnectionPoolRegistry] = None,
+                 health: Optional[HealthMonitor] = None,
+                 endpoints: Optional[List[str]] = None,
+                 slots_config: Optional[Dict[str, Any]] = None):
+        super().__init__(endpoint, "LlamaCpp", pools, health)
         self.current_model = None  # llama.cpp typically loads one model at a time
         
-        # Initialize handlers
-        self.request_handler = LlamaCppRequestHandler(endpoint)
+        # Several servers running the same model can sit behind one provider;
+        # model discovery and health checks use the first one
+        self.endpoints = [url.rstrip('/') for url in (endpoints or [endpoint])]
+        self._request_handlers = [LlamaCppRequestHandler(url, pools=self.pools, health=self.health)
+                                  for url in self.endpoints]
+        self.request_handler = self._request_handlers[0]
         self.response_handler = LlamaCppResponseHandler()
+        self.slots = LlamaCppSlotManager(self.endpoints, slots_config, self.get_http_client)
+    
+    @property
+    def request_handlers(self) -> List[LlamaCppRequestHandler]:
+        return self._request_handlers
+    
+    async def _prepare_slot(self, request_data: Dict[str, Any]):
+        """Pin the request to the slot holding its conversation; returns the lease and the handler to use."""
+        lease = await self.slots.acquire(request_data["messages"])
+        request_data["cache_prompt"] = True
+        if lease.slot_id is not None:
+            request_data["id_slot"] = lease.slot_id
+        return lease, self._request_handlers[lease.instance]
         
-    def test_connection(self) -> Dict[str, Any]:
+    async def test_connection(self) -> Dict[str, Any]:
         """Test the connection to llama.cpp server."""
         try:
+            client = self.get_http_client()
             # Check if llama.cpp server is running
-            response = requests.get(f"{self.endpoint}/health", timeout=10)
+            response = await client.get(f"{self.endpoint}/health", timeout=10.0)
             
             if response.status_code == 200:
                 # Get model info
                 try:
-                    props_response = requests.get(f"{self.endpoint}/props", timeout=10)
+                    props_response = await client.get(f"{self.endpoint}/props", timeout=10.0)
                     if props_response.status_code == 200:
                         props = props_response.json()
                         model_name = props.get("default_generation_settings", {}).get("model", "unknown")
@@ -43,7 +67,7 @@ class LlamaCppClient(BaseClient):
                             "message": "Llama.cpp connection successful",
                             "model": model_name
                         }
-                except:
+                except Exception:
                     pass
                 
                 return {
@@ -55,7 +79,7 @@ class LlamaCppClient(BaseClient):
                     "status": "error",
                     "message": f"Llama.cpp returned status {response.status_code}"
                 }
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             return {
                 "status": "error",
                 "message": "Cannot connect to Llama.cpp server"
@@ -66,58 +90,67 @@ class LlamaCppClient(BaseClient):
                 "message": f"Connection test failed: {str(e)}"
             }
 
-    async def fetch_models(self) -> Dict[str, Any]:
+    async def fetch_models(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """Fetch available models from llama.cpp server."""
+        if not force_refresh and self.available_models and self._is_cache_valid():
+            logger.info(f"Using cached Llama.cpp models ({len(self.available_models)} models)")
+            return self.available_models
+        
         logger.info(f"Fetching models from Llama.cpp at {self.endpoint}")
+        self.connection_error = None
         
         try:
-            async with httpx.AsyncClient() as client:
-                # Try v1/models endpoint first (OpenAI-compatible)
-                response = await client.get(f"{self.endpoint}/v1/models", timeout=10.0)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    models = data.get("data", [])
-                    
-                    if models:
-                        model_list = []
-                        for model in models:
-                            model_id = model.get("id", "default")
-                            model_list.append({
-                                "id": model_id,
-                                "object": "model",
-                                "created": int(time.time()),
-                                "owned_by": "llamacpp"
-                            })
-                        
-                        self._model_cache = model_list
-                        self._last_fetch = time.time()
-                        
-                        logger.info(f"Successfully fetched {len(model_list)} models from Llama.cpp")
-                        return {"models": model_list}
-                
-                # Fallback: create a default model entry
-                default_model = [{
-                    "id": self.current_model or "default",
-                    "object": "model", 
-                    "created": int(time.time()),
-                    "owned_by": "llamacpp"
-                }]
-                
-                self._model_cache = default_model
-                self._last_fetch = time.time()
-                
-                logger.info("Using default model for Llama.cpp")
-                return {"models": default_model}
-                    
+            client = self.get_http_client()
+            # Try v1/models endpoint first (OpenAI-compatible)
+            response = await client.get(f"{self.endpoint}/v1/models", timeout=10.0)
+
+            if response.status_code == 200:
+                data = response.json()
+                models = data.get("data", [])
+
+                if models:
+                    model_list = []
+                    for model in models:
+                        model_id = model.get("id", "default")
+                        model_list.append({
+                            "id": model_id,
+                            "name": model_id,
+                            "object": "model",
+                            "created": int(time.time()),
+                            "owned_by": "llamacpp"
+                        })
+
+                    self.available_models = model_list
+                    self._update_cache_time()
+
+                    logger.info(f"Successfully fetched {len(model_list)} models from Llama.cpp")
+                    return model_list
+
+            # Fallback: create a default model entry
+            model_id = self.current_model or "default"
+            default_model = [{
+                "id": model_id,
+                "name": model_id,
+                "object": "model", 
+                "created": int(time.time()),
+                "owned_by": "llamacpp"
+            }]
+
+            self.available_models = default_model
+            self._update_cache_time()
+
+            logger.info("Using default model for Llama.cpp")
+            return default_model
+
         except Exception as e:
-            error_msg = f"Error fetching Llama.cpp models: {str(e)}"
-            logger.error(error_msg)
-            return {"error": error_msg}
+            self.connection_error = str(e)
+            logger.error(f"Error fetching Llama.cpp models: {str(e)}")
+            return self.available_models
 
     async def chat_completion(self, model: str, messages: List[Dict[str, Any]], 
                             temperature: float = 0.7, max_tokens: Optional[int] = None,
-                            stream: bool = False) -> Dict[str, Any]:
+                            stream: bool = False,
+                            sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Handle chat completion request using the new handler architecture."""
         try:
             # Prepare request data
@@ -130,25 +163,33 @@ class LlamaCppClient(BaseClient):
             
             if max_tokens:
                 request_data["max_tokens"] = max_tokens
+            if sampling:
+                request_data.update(sampling)
             
-            # Use the new request handler
-            response = await self.request_handler.handle_chat_request(request_data)
-            
-            if isinstance(response, dict) and "error" in response:
-                return response
-            
-            # Use the new response handler
-            if stream:
-                return self.response_handler.handle_response(response, model, is_streaming=True)
-            else:
-                return self.response_handler.handle_response(response, model, is_streaming=False)
+            lease, handler = await self._prepare_slot(request_data)
+            try:
+                response = await handler.handle_chat_request(request_data)
+                
+                if isinstance(response, dict) and "error" in response:
+                    return response
+                
+                # Use the new response handler
+                if stream:
+                    return self.response_handler.handle_response(response, model, is_streaming=True)
+                else:
+                    return self.response_handler.handle_response(response, model, is_streaming=False)
+            finally:
+                lease.release()
                 
         except Exception as e:
             logger.error(f"Chat completion error: {str(e)}")
             return {"error": {"message": f"Chat completion failed: {str(e)}", "code": 500}}
 
     async def stream_chat_completion(self, model: str, messages: List[Dict[str, Any]], 
-                                   temperature: float = 0.7, max_tokens: Optional[int] = None) -> AsyncGenerator[str, None]:
+                                   temperature: float = 0.7, max_tokens: Optional[int] = None,
+                                   stream_mode: Optional[str] = None,
+                                   display_model: Optional[str] = None,
+                                   sampling: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
         """Handle streaming chat completion using the new handler architecture."""
         try:
             # Prepare request data
@@ -161,19 +202,25 @@ class LlamaCppClient(BaseClient):
             
             if max_tokens:
                 request_data["max_tokens"] = max_tokens
+            if sampling:
+                request_data.update(sampling)
             
-            # Use the new request handler
-            response = await self.request_handler.handle_chat_request(request_data)
-            
-            if isinstance(response, dict) and "error" in response:
-                # Yield error in SSE format
-                yield f"data: {json.dumps(response)}\n\n"
-                yield "data: [DONE]\n\n"
-                return
-            
-            # Use the new response handler for streaming
-            async for chunk in self.response_handler.stream_response(response, model):
-                yield chunk
+            # The slot stays claimed until the stream is finished or abandoned
+            lease, handler = await self._prepare_slot(request_data)
+            try:
+                response = await handler.handle_chat_request(request_data)
+                
+                if isinstance(response, dict) and "error" in response:
+                    # Yield error in SSE format
+                    yield f"data: {json.dumps(response)}\n\n"
+                    yield "data: [DONE]\n\n"
+                    return
+                
+                # Use the new response handler for streaming
+                async for chunk in self.response_handler.stream_response(response, display_model or model, stream_mode):
+                    yield chunk
+            finally:
+                lease.release()
                 
         except Exception as e:
             logger.error(f"Streaming error: {str(e)}")
@@ -181,10 +228,19 @@ class LlamaCppClient(BaseClient):
             yield f"data: {json.dumps(error_response)}\n\n"
             yield "data: [DONE]\n\n"
 
-    def get_model_name(self, requested_model: str) -> str:
+    def get_model_name(self, requested_model: str, model_mappings: Dict[str, str] = None) -> str:
         """Get the actual model name to use for Llama.cpp."""
-        # Use the base client's model mapping functionality
-        return self._resolve_model_name(requested_model)
+        model_mappings = model_mappings or {}
+        if requested_model in model_mappings:
+            return model_mappings[requested_model]
+        if self.model_index.has(requested_model):
+            return requested_model
+        # llama.cpp serves whatever model it was started with
+        if self.current_model:
+            return self.current_model
+        if self.available_models:
+            return self.available_models[0]["id"]
+        return model_mappings.get("default", "default")
 
     def process_messages(self, messages: List[Dict[str, Any]], thinking_mode: bool = True) -> List[Dict[str, Any]]:
         """Process messages for Llama.cpp format."""
@@ -1,11 +1,13 @@
 import logging
-import httpx
 import json
-import requests
 import time
-from typing import Dict, List, Any, Optional, AsyncGenerator
+from typing import Dict, List, Any, Optional, AsyncGenerator, Union
 from .base_client import BaseClient
 from ..handlers import OllamaRequestHandler, OllamaResponseHandler
+from ..pool import ConnectionPoolRegistry
+from ..health import HealthMonitor
+from ..residency import OllamaResidencyManager
+from ..sampling import OllamaOptionsTranslator
 
 logger = logging.getLogger(__name__)
 
@@ -15,18 +17,28 @@ class OllamaClient(BaseClient):
     Handles model discovery, chat completions, and streaming for Ollama.
     """
     
-    def __init__(self, endpoint: str = "http://localhost:11434"):
-        super().__init__(endpoint, "Ollama")
+    def __init__(self, endpoint: str = "http://localhost:11434",
+                 pools: Optional[ConnectionPoolRegistry] = None,
+                 health: Optional[HealthMonitor] = None,
+                 residency_config: Optional[Dict[str, Any]] = None,
+                 options_config: Optional[Dict[str, Any]] = None):
+        super().__init__(endpoint, "Ollama", pools, health)
 
         # Initialize handlers
-        self.request_handler = OllamaRequestHandler(endpoint)
+        self.request_handler = OllamaRequestHandler(endpoint, pools=self.pools, health=self.health)
         self.response_handler = OllamaResponseHandler()
-
+        self.residency = OllamaResidencyManager(self.endpoint, residency_config, self.get_http_client)
+        self.options = OllamaOptionsTranslator(options_config, self.residency)
+        # The handlers build every /api/chat payload and read every response
+        self.request_handler.options = self.options
+        self.request_handler.residency = self.residency
+        self.response_handler.residency = self.residency
     
-    def test_connection(self) -> Dict[str, Any]:
+    async def test_connection(self) -> Dict[str, Any]:
         """Test the connection to Ollama API."""
         try:
-            response = requests.get(f"{self.endpoint}/api/version", timeout=10)
+            client = self.get_http_client()
+            response = await client.get(f"{self.endpoint}/api/version", timeout=10.0)
             
             if response.status_code == 200:
                 version_data = response.json()
@@ -42,7 +54,7 @@ class OllamaClient(BaseClient):
             logger.error(f"Ollama connection test failed: {str(e)}")
             return {"status": "error", "message": f"Connection failed: {str(e)}"}
     
-    def fetch_models(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+    async def fetch_models(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """Fetch available models from Ollama."""
         # Use cache if available and not expired
         if not force_refresh and self.available_models and self._is_cache_valid():
@@ -53,7 +65,8 @@ class OllamaClient(BaseClient):
         
         try:
             logger.info(f"Fetching models from Ollama at {self.endpoint}")
-            response = requests.get(f"{self.endpoint}/api/tags", timeout=15)
+            client = self.get_http_client()
+            response = await client.get(f"{self.endpoint}/api/tags", timeout=15.0)
             logger.debug(f"Ollama response status: {response.status_code}")
             
             if response.status_code == 200:
@@ -95,39 +108,48 @@ class OllamaClient(BaseClient):
             self.available_models = []
             return []
     
-    def get_model_name(self, requested_model: str, model_mappings: Dict[str, str] = None) -> str:
+    def resolve_mapping(self, mapped: Union[str, List[str]]) -> str:
+        """
+        Pick the model for a mapping value. A list names interchangeable
+        alternatives; one that is already loaded in Ollama wins.
+        """
+        if isinstance(mapped, str):
+            return mapped
+        candidates = []
+        for name in mapped:
+            candidates.append(name if self.model_index.has(name) else self.model_index.find_normalized(name) or name)
+        return self.residency.choose(candidates) or "llama3"
+    
+    def get_model_name(self, requested_model: str, model_mappings: Dict[str, Union[str, List[str]]] = None) -> str:
         """Map requested model to available Ollama model."""
         if not self.available_models:
             logger.warning("No Ollama models available")
-            return model_mappings.get("default", "llama3") if model_mappings else "llama3"
+            return self.resolve_mapping(model_mappings.get("default", "llama3")) if model_mappings else "llama3"
         
         model_mappings = model_mappings or {}
+        index = self.model_index
         
         # Check if model is in mappings
         if requested_model in model_mappings:
-            mapped_model = model_mappings[requested_model]
-            # Try exact match first
-            if any(m["id"] == mapped_model for m in self.available_models):
+            mapped_model = self.resolve_mapping(model_mappings[requested_model])
+            # Try exact match first, then fuzzy match
+            if index.has(mapped_model):
                 return mapped_model
-            # Try fuzzy match
-            normalized_mapped = self._normalize_model_name(mapped_model)
-            for model in self.available_models:
-                if self._normalize_model_name(model["id"]) == normalized_mapped:
-                    return model["id"]
+            fuzzy_match = index.find_normalized(mapped_model)
+            if fuzzy_match:
+                return fuzzy_match
         
         # Try direct match
-        if any(m["id"] == requested_model for m in self.available_models):
+        if index.has(requested_model):
             return requested_model
         
-        # Try fuzzy matching
-        normalized_requested = self._normalize_model_name(requested_model)
-        for model in self.available_models:
-            normalized_available = self._normalize_model_name(model["id"])
-            if normalized_available == normalized_requested or normalized_available.startswith(normalized_requested):
-                return model["id"]
+        # Try fuzzy matching (normalized equality or prefix)
+        fuzzy_match = index.find_prefix(requested_model)
+        if fuzzy_match:
+            return fuzzy_match
         
         # Use default
-        default_model = (model_mappings.get("default") if model_mappings 
+        default_model = (self.resolve_mapping(model_mappings["default"]) if model_mappings.get("default")
                         else self.available_models[0]["id"] if self.available_models else "llama3")
         logger.warning(f"No match found for {requested_model}, using default: {default_model}")
         return default_model
@@ -153,91 +175,75 @@ class OllamaClient(BaseClient):
     
     async def chat_completion(self, model: str, messages: List[Dict[str, Any]], 
                             temperature: float = 0.7, max_tokens: Optional[int] = None,
-                            stream: bool = False) -> Dict[str, Any]:
-        """Make a chat completion request to Ollama."""
-        request_data = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "stream": stream
-        }
-        
-        if max_tokens:
-            request_data["max_tokens"] = max_tokens
-        
+                            stream: bool = False,
+                            sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Handle chat completion request using the handler architecture."""
         try:
-            async with httpx.AsyncClient(timeout=180.0) as client:
-                response = await client.post(
-                    f"{self.endpoint}/api/chat",
-                    json=request_data
-                )
-                
-                if response.status_code == 200:
-                    if stream:
-                        return {"status": "streaming", "response": response}
-                    else:
-                        return {"status": "success", "data": response.json()}
-                else:
-                    return {
-                        "status": "error",
-                        "code": response.status_code,
-                        "error": {"message": f"Ollama returned status: {response.status_code}"}
-                    }
-                    
+            request_data = {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "stream": stream
+            }
+            
+            if max_tokens:
+                request_data["max_tokens"] = max_tokens
+            if sampling:
+                request_data.update(sampling)
+            
+            # Looked up once per model, sizes num_ctx when the handler builds the payload
+            await self.request_handler.get_context_length(model)
+            response = await self.request_handler.handle_chat_request(request_data)
+            
+            if isinstance(response, dict) and "error" in response:
+                return response
+            
+            return self.response_handler.handle_response(response, model, is_streaming=stream)
+            
         except Exception as e:
             logger.error(f"Ollama chat completion error: {str(e)}")
-            return {
-                "status": "error",
-                "error": {"message": f"Request failed: {str(e)}"}
-            }
+            return {"error": {"message": f"Chat completion failed: {str(e)}", "code": 500}}
     
     async def stream_chat_completion(self, model: str, messages: List[Dict[str, Any]],
-                                   temperature: float = 0.7, max_tokens: Optional[int] = None) -> AsyncGenerator[Dict[str, Any], None]:
-        """Stream a chat completion from Ollama."""
-        request_data = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "stream": True
-        }
-        
-        if max_tokens:
-            request_data["max_tokens"] = max_tokens
-        
+                                   temperature: float = 0.7, max_tokens: Optional[int] = None,
+                                   stream_mode: Optional[str] = None,
+                                   display_model: Optional[str] = None,
+                                   sampling: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
+        """Stream a chat completion from Ollama as OpenAI SSE events."""
         try:
-            async with httpx.AsyncClient(timeout=180.0) as client:
-                async with client.stream(
-                    "POST",
-                    f"{self.endpoint}/api/chat",
-                    json=request_data
-                ) as response:
-                    
-                    if response.status_code != 200:
-                        yield {
-                            "error": {"message": f"Ollama returned status: {response.status_code}", "code": response.status_code}
-                        }
-                        return
-                    
-                    async for line in response.aiter_lines():
-                        if line.strip():
-                            try:
-                                chunk = json.loads(line)
-                                yield chunk
-                            except json.JSONDecodeError:
-                                continue
-                                
+            request_data = {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "stream": True
+            }
+            
+            if max_tokens:
+                request_data["max_tokens"] = max_tokens
+            if sampling:
+                request_data.update(sampling)
+            
+            await self.request_handler.get_context_length(model)
+            response = await self.request_handler.handle_chat_request(request_data)
+            
+            if isinstance(response, dict) and "error" in response:
+                # Yield error in SSE format
+                yield f"data: {json.dumps(response)}\n\n"
+                yield "data: [DONE]\n\n"
+                return
+            
+            async for chunk in self.response_handler.stream_response(response, display_model or model, stream_mode):
+                yield chunk
+                
         except Exception as e:
             logger.error(f"Ollama streaming error: {str(e)}")
-            yield {
-                "error": {"message": f"Streaming failed: {str(e)}"}
-            }
+            error_response = {"error": {"message": f"Streaming failed: {str(e)}", "code": 500}}
+            yield f"data: {json.dumps(error_response)}\n\n"
+            yield "data: [DONE]\n\n"
     
     def get_model_by_id(self, model_id: str) -> Optional[Dict[str, Any]]:
         """Get model details by ID."""
-        for model in self.available_models:
-            if model["id"] == model_id:
-                return model
-        return None
+        return self.model_index.get(model_id)
     
     def search_models(self, query: str) -> List[Dict[str, Any]]:
         """Search models by name."""
@@ -2,10 +2,11 @@ import logging
 import time
 import json
 import httpx
-import requests
 from typing import Dict, List, Any, Optional, AsyncGenerator
 from .base_client import BaseClient
 from ..handlers import OpenRouterRequestHandler, OpenRouterResponseHandler
+from ..pool import ConnectionPoolRegistry
+from ..health import HealthMonitor
 
 logger = logging.getLogger(__name__)
 
@@ -15,13 +16,15 @@ class OpenRouterClient(BaseClient):
     Handles authentication, model discovery, chat completions, and streaming.
     """
     
-    def __init__(self, api_key: str, endpoint: str = "https://openrouter.ai"):
-        super().__init__(endpoint, "OpenRouter")
+    def __init__(self, api_key: str, endpoint: str = "https://openrouter.ai",
+                 pools: Optional[ConnectionPoolRegistry] = None,
+                 health: Optional[HealthMonitor] = None):
+        super().__init__(endpoint, "OpenRouter", pools, health)
         self.api_key = api_key
         self.cache_duration = 600  # 10 minutes cache for OpenRouter models
         
         # Initialize handlers
-        self.request_handler = OpenRouterRequestHandler(endpoint, api_key)
+        self.request_handler = OpenRouterRequestHandler(endpoint, api_key, pools=self.pools, health=self.health)
         self.response_handler = OpenRouterResponseHandler()
         
     def _get_headers(self) -> Dict[str, str]:
@@ -33,13 +36,14 @@ class OpenRouterClient(BaseClient):
             "X-Title": "OllamaLink"
         }
     
-    def test_connection(self) -> Dict[str, Any]:
+    async def test_connection(self) -> Dict[str, Any]:
         """Test the connection to OpenRouter API."""
         try:
-            response = requests.get(
+            client = self.get_http_client()
+            response = await client.get(
                 f"{self.endpoint}/api/v1/models",
                 headers=self._get_headers(),
-                timeout=10
+                timeout=10.0
             )
             
             if response.status_code == 200:
@@ -62,7 +66,7 @@ class OpenRouterClient(BaseClient):
                     "status": "error",
                     "message": f"OpenRouter returned status {response.status_code}"
                 }
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             return {
                 "status": "error",
                 "message": "Cannot connect to OpenRouter server"
@@ -73,52 +77,63 @@ class OpenRouterClient(BaseClient):
                 "message": f"Connection test failed: {str(e)}"
             }
     
-    async def fetch_models(self) -> Dict[str, Any]:
+    async def fetch_models(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """Fetch available models from OpenRouter."""
+        if not force_refresh and self.available_models and self._is_cache_valid():
+            logger.info(f"Using cached OpenRouter models ({len(self.available_models)} models)")
+            return self.available_models
+        
         logger.info("Fetching models from OpenRouter")
+        self.connection_error = None
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.endpoint}/api/v1/models",
-                    headers=self._get_headers(),
-                    timeout=15.0
+            client = self.get_http_client()
+            response = await client.get(
+                f"{self.endpoint}/api/v1/models",
+                headers=self._get_headers(),
+                timeout=15.0
+            )
+
+            if response.status_code == 200:
+                data = response.json()
+                models = data.get("data", [])
+
+                model_list = []
+                for model in models:
+                    model_id = model.get("id", "unknown")
+                    model_list.append({
+                        "id": model_id,
+                        "name": model.get("name", model_id),
+                        "object": "model",
+                        "created": int(time.time()),
+                        "owned_by": model.get("owned_by", "openrouter"),
+                        "context_length": model.get("context_length", 0),
+                        "pricing": model.get("pricing", {}),
+                        "description": model.get("description", "")
+                    })
+
+                self.available_models = model_list
+                self._update_cache_time()
+                self.request_handler.context_lengths.update(
+                    {model["id"]: model["context_length"] or None for model in model_list}
                 )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    models = data.get("data", [])
-                    
-                    model_list = []
-                    for model in models:
-                        model_id = model.get("id", "unknown")
-                        model_list.append({
-                            "id": model_id,
-                            "object": "model",
-                            "created": int(time.time()),
-                            "owned_by": model.get("owned_by", "openrouter"),
-                            "context_length": model.get("context_length", 0),
-                            "pricing": model.get("pricing", {})
-                        })
-                    
-                    self._model_cache = model_list
-                    self._last_fetch = time.time()
-                    
-                    logger.info(f"Successfully fetched {len(model_list)} models from OpenRouter")
-                    return {"models": model_list}
-                else:
-                    error_msg = f"Failed to fetch models: HTTP {response.status_code}"
-                    logger.error(error_msg)
-                    return {"error": error_msg}
-                    
+
+                logger.info(f"Successfully fetched {len(model_list)} models from OpenRouter")
+                return model_list
+            else:
+                self.connection_error = f"HTTP {response.status_code}"
+                logger.error(f"Failed to fetch OpenRouter models: HTTP {response.status_code}")
+                return self.available_models
+
         except Exception as e:
-            error_msg = f"Error fetching OpenRouter models: {str(e)}"
-            logger.error(error_msg)
-            return {"error": error_msg}
+            self.connection_error = str(e)
+            logger.error(f"Error fetching OpenRouter models: {str(e)}")
+            return self.available_models
 
     async def chat_completion(self, model: str, messages: List[Dict[str, Any]], 
                             temperature: float = 0.7, max_tokens: Optional[int] = None,
-                            stream: bool = False) -> Dict[str, Any]:
+                            stream: bool = False,
+                            sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Handle chat completion request using the new handler architecture."""
         try:
             # Prepare request data
@@ -131,6 +146,8 @@ class OpenRouterClient(BaseClient):
             
             if max_tokens:
                 request_data["max_tokens"] = max_tokens
+            if sampling:
+                request_data.update(sampling)
             
             # Use the new request handler
             response = await self.request_handler.handle_chat_request(request_data)
@@ -149,7 +166,10 @@ class OpenRouterClient(BaseClient):
             return {"error": {"message": f"Chat completion failed: {str(e)}", "code": 500}}
 
     async def stream_chat_completion(self, model: str, messages: List[Dict[str, Any]], 
-                                   temperature: float = 0.7, max_tokens: Optional[int] = None) -> AsyncGenerator[str, None]:
+                                   temperature: float = 0.7, max_tokens: Optional[int] = None,
+                                   stream_mode: Optional[str] = None,
+                                   display_model: Optional[str] = None,
+                                   sampling: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
         """Handle streaming chat completion using the new handler architecture."""
         try:
             # Prepare request data
@@ -162,6 +182,8 @@ class OpenRouterClient(BaseClient):
             
             if max_tokens:
                 request_data["max_tokens"] = max_tokens
+            if sampling:
+                request_data.update(sampling)
             
             # Use the new request handler
             response = await self.request_handler.handle_chat_request(request_data)
@@ -184,7 +206,7 @@ class OpenRouterClient(BaseClient):
                 return
             
             # Use the new response handler for streaming
-            async for chunk in self.response_handler.stream_response(response, model):
+            async for chunk in self.response_handler.stream_response(response, display_model or model, stream_mode):
                 yield chunk
                 
         except Exception as e:
@@ -193,10 +215,12 @@ class OpenRouterClient(BaseClient):
             yield f"data: {json.dumps(error_response)}\n\n"
             yield "data: [DONE]\n\n"
 
-    def get_model_name(self, requested_model: str) -> str:
+    def get_model_name(self, requested_model: str, model_mappings: Dict[str, str] = None) -> str:
         """Get the actual model name to use for OpenRouter."""
-        # Use the base client's model mapping functionality
-        return self._resolve_model_name(requested_model)
+        model_mappings = model_mappings or {}
+        if requested_model in model_mappings:
+            return model_mappings[requested_model]
+        return self.model_index.find_casefold(requested_model) or requested_model
 
     def process_messages(self, messages: List[Dict[str, Any]], thinking_mode: bool = True) -> List[Dict[str, Any]]:
         """Process messages for OpenRouter format."""
@@ -0,0 +1,229 @@
+import logging
+import asyncio
+import hashlib
+import json
+import weakref
+from typing import Dict, Any, Optional, List, Callable, Awaitable, AsyncGenerator
+
+logger = logging.getLogger(__name__)
+
+# Once a stream has buffered this much unread output, later identical requests start their own generation
+DEFAULT_MAX_BUFFER_BYTES = 8 * 1024 * 1024
+
+
+def _chunk_size(chunk) -> int:
+    return len(chunk) if isinstance(chunk, (bytes, str)) else 0
+
+
+class _Flight:
+    """
+    One in-flight generation and the broadcast buffer of its stream.
+
+    `chunks` holds the stream from index `offset` on; chunks every
+    subscriber has read are dropped.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.setup: Optional[asyncio.Task] = None
+        self.producer: Optional[asyncio.Task] = None
+        self.waiting = 0
+        self.subscribers: Dict[object, int] = {}  # subscription token -> index of its next chunk
+        self.chunks: List[Any] = []
+        self.offset = 0
+        self.size = 0
+        self.done = False
+        self._changed = asyncio.Event()
+
+    def append(self, chunk):
+        self.chunks.append(chunk)
+        self.size += _chunk_size(chunk)
+        self._notify()
+
+    def trim(self) -> bool:
+        """Drop the chunks every subscriber has read; returns whether any were dropped."""
+        if self.waiting or not self.subscribers:
+            # Requests still waiting for the setup will replay from the first chunk
+            return False
+        drop = min(self.subscribers.values()) - self.offset
+        if drop <= 0:
+            return False
+        for chunk in self.chunks[:drop]:
+            self.size -= _chunk_size(chunk)
+        del self.chunks[:drop]
+        self.offset += drop
+        return True
+
+    def finish(self):
+        self.done = True
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class RequestCoalescer:
+    """
+    Single-flight execution of identical concurrent completions.
+
+    The first request for a key runs the generation; identical requests that
+    arrive while it is queued or running attach to it instead of starting
+    their own. Non-streaming requests share the result. Streaming requests
+    share a broadcast buffer: one producer task drains the upstream stream
+    into it and every subscriber reads it at its own pace. Chunks are
+    dropped once every subscriber has read them, so a stream holds only the
+    output its slowest subscriber hasn't read yet. Since a new subscriber
+    has to replay from the start, identical requests can join a stream
+    only until its first chunk has been consumed. The upstream generation
+    is cancelled only when every subscriber has gone away.
+
+    Configured by the "coalescing" section of config.json.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.enabled = config.get("enabled", True)
+        self.max_buffer_bytes = config.get("max_buffer_bytes", DEFAULT_MAX_BUFFER_BYTES)
+        self._flights: Dict[str, _Flight] = {}
+        self.stats = {
+            "leaders": 0,
+            "coalesced": 0,
+            "cancelled": 0
+        }
+
+    @staticmethod
+    def make_key(provider: str, actual_model: str, display_model: str, messages: List[Dict[str, Any]],
+                 temperature: Optional[float], max_tokens: Optional[int], stream: bool,
+                 stream_mode: Optional[str], sampling: Optional[Dict[str, Any]] = None) -> str:
+        """Canonical hash of everything that shapes the bytes a client receives."""
+        canonical = json.dumps(
+            [provider, actual_model, display_model, messages, temperature, max_tokens, bool(stream), stream_mode,
+             sampling or {}],
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def run(self, key: Optional[str], factory: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Run `factory` for `key`, or attach to the identical request already running it."""
+        if not self.enabled or key is None:
+            return await factory()
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(key)
+            self._flights[key] = flight
+            flight.setup = asyncio.get_running_loop().create_task(self._start(flight, factory))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+            logger.info(f"Coalescing identical request into in-flight generation ({len(flight.subscribers) + flight.waiting} already attached)")
+
+        flight.waiting += 1
+        try:
+            # Shield so one impatient client doesn't abort the generation others are waiting for
+            result = await asyncio.shield(flight.setup)
+        except asyncio.CancelledError:
+            flight.waiting -= 1
+            if flight.waiting == 0 and not flight.subscribers and not flight.setup.done():
+                flight.setup.cancel()
+                self._forget(flight)
+                self.stats["cancelled"] += 1
+            raise
+        except BaseException:
+            flight.waiting -= 1
+            raise
+        flight.waiting -= 1
+
+        result = dict(result)
+        if flight.producer is not None:
+            result["stream_generator"] = self._subscribe(flight)
+        return result
+
+    async def _start(self, flight: _Flight, factory: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        try:
+            result = await factory()
+        except BaseException:
+            self._forget(flight)
+            raise
+
+        generator = result.get("stream_generator") if isinstance(result, dict) else None
+        if generator is None:
+            self._forget(flight)
+            return result
+        flight.producer = asyncio.get_running_loop().create_task(self._pump(flight, generator))
+        return result
+
+    async def _pump(self, flight: _Flight, generator: AsyncGenerator):
+        try:
+            async for chunk in generator:
+                flight.append(chunk)
+                if flight.size > self.max_buffer_bytes:
+                    # Keep serving current subscribers, but stop accepting new ones
+                    self._forget(flight)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Shared stream failed: {str(e)}")
+        finally:
+            flight.finish()
+            self._forget(flight)
+            await generator.aclose()
+
+    def _subscribe(self, flight: _Flight) -> AsyncGenerator:
+        token = object()
+        flight.subscribers[token] = 0
+        subscription = self._replay(flight, token)
+        # A subscription that is never iterated (client gone before the body started) still detaches
+        weakref.finalize(subscription, self._leave, flight, token)
+        return subscription
+
+    async def _replay(self, flight: _Flight, token) -> AsyncGenerator:
+        index = 0
+        try:
+            while True:
+                if index < flight.offset + len(flight.chunks):
+                    chunk = flight.chunks[index - flight.offset]
+                    index += 1
+                    flight.subscribers[token] = index
+                    if flight.trim():
+                        # The start of the stream is gone, so nobody else can join it
+                        self._forget(flight)
+                    yield chunk
+                elif flight.done:
+                    return
+                else:
+                    await flight.wait()
+        finally:
+            self._leave(flight, token)
+
+    def _leave(self, flight: _Flight, token):
+        if token not in flight.subscribers:
+            return
+        del flight.subscribers[token]
+        if flight.subscribers:
+            if flight.trim():
+                self._forget(flight)
+            return
+        if flight.waiting or flight.done:
+            return
+        logger.info("All subscribers of a shared stream disconnected, cancelling generation")
+        self._forget(flight)
+        self.stats["cancelled"] += 1
+        if flight.producer is not None and not flight.producer.done():
+            flight.producer.cancel()
+
+    def _forget(self, flight: _Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            in_flight=len(self._flights),
+            subscribers=sum(len(flight.subscribers) for flight in self._flights.values())
+        )
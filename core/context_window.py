@@ -0,0 +1,175 @@
+import logging
+import hashlib
+import json
+import math
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from .tokens import token_counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_WINDOW_SETTINGS = {
+    "default_context_length": 8192,  # used when the provider doesn't report one
+    "context_lengths": {},  # per-model overrides of the reported context length
+    "block_fraction": 0.25,  # history is dropped in blocks of this fraction of the window
+    "completion_reserve": 1024,  # tokens kept free for the answer when max_tokens is not set
+    "safety_margin": 64,  # slack for chat template tokens the counter doesn't see
+    "max_tracked_prefixes": 20000
+}
+
+# Constant text, so the note itself never changes the prompt prefix
+OMITTED_NOTE = "Earlier messages of this conversation were omitted to fit the context window."
+
+
+def prefix_digests(messages: List[Dict[str, Any]]) -> List[bytes]:
+    """Chained digests of a conversation: entry i identifies messages[:i + 1] exactly."""
+    digests = []
+    digest = b""
+    for message in messages:
+        digest = hashlib.blake2b(
+            digest + json.dumps(message, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8", "surrogatepass"),
+            digest_size=16
+        ).digest()
+        digests.append(digest)
+    return digests
+
+
+class ContextWindowManager:
+    """
+    Fits growing conversations into a model's context window without
+    invalidating the provider's prompt cache on every turn.
+
+    Ollama and llama.cpp reuse the KV cache of the longest prompt prefix they
+    have already processed. Dropping "just enough" old messages on every turn
+    shifts the start of the history each time, so the whole prompt is
+    evaluated again. Instead, the history is cut at fixed token boundaries:
+    the cut only advances by a whole block (`block_fraction` of the window)
+    once the conversation outgrows the window, so consecutive turns keep a
+    byte-identical prefix until the next block has to go. The cut is derived
+    from the conversation alone, no per-conversation state is kept.
+
+    System messages and the last message are always kept. A constant note is
+    inserted after the leading system messages once history was dropped.
+
+    `observe()` tracks how much of each prompt repeats a prefix already sent
+    to the provider, which is what its prompt cache can skip.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        settings = dict(DEFAULT_CONTEXT_WINDOW_SETTINGS)
+        settings.update(config or {})
+        self.default_context_length = settings["default_context_length"]
+        self.context_lengths: Dict[str, int] = settings["context_lengths"]
+        self.block_fraction = min(1.0, max(0.01, settings["block_fraction"]))
+        self.completion_reserve = settings["completion_reserve"]
+        self.safety_margin = settings["safety_margin"]
+        self.max_tracked_prefixes = settings["max_tracked_prefixes"]
+        self._prefixes: "OrderedDict[bytes, None]" = OrderedDict()
+        self.stats = {
+            "prompts": 0,
+            "prompt_tokens": 0,
+            "reused_tokens": 0,
+            "truncated": 0,
+            "dropped_messages": 0
+        }
+
+    def configured_length(self, model: Optional[str]) -> Optional[int]:
+        """Context length set for a model in config.json, if any."""
+        if not model:
+            return None
+        return self.context_lengths.get(model)
+
+    def budget(self, context_length: int, max_tokens: Optional[int] = None) -> int:
+        """Prompt tokens available once the completion and safety margin are reserved."""
+        reserve = max_tokens if max_tokens else self.completion_reserve
+        return max(0, context_length - reserve - self.safety_margin)
+
+    def fit(self, messages: List[Dict[str, Any]], budget: int, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Drop old history in whole blocks until the conversation fits `budget` tokens.
+
+        Returns `messages` itself when nothing had to be dropped.
+        """
+        counts = token_counter.count_each(messages, model)
+        if sum(counts) <= budget or len(messages) < 2:
+            return messages
+
+        leading = 0
+        while leading < len(messages) - 1 and messages[leading].get("role") == "system":
+            leading += 1
+        system_tokens = sum(count for message, count in zip(messages, counts) if message.get("role") == "system")
+        note = {"role": "system", "content": OMITTED_NOTE}
+        # The window depends only on the system prompt, so it is the same on every turn
+        window = budget - system_tokens - token_counter.count_message(note, model)
+
+        history = [index for index in range(leading, len(messages) - 1) if messages[index].get("role") != "system"]
+        last_tokens = counts[-1]
+        history_tokens = sum(counts[index] for index in history)
+
+        if window <= last_tokens:
+            keep = set()
+            logger.warning(f"System prompt and last message leave no room for history (window {window} tokens)")
+        else:
+            # Advance the cut in whole blocks: it moves only once per block of growth
+            block = max(1, int(window * self.block_fraction))
+            overflow = history_tokens + last_tokens - window
+            cut = math.ceil(overflow / block) * block if overflow > 0 else 0
+            offset = 0
+            start = len(history)
+            for position, index in enumerate(history):
+                if offset >= cut:
+                    start = position
+                    break
+                offset += counts[index]
+            # Never start with tool results whose assistant call was dropped
+            while start < len(history) and messages[history[start]].get("role") == "tool":
+                start += 1
+            keep = set(history[start:])
+
+        dropped = len(history) - len(keep)
+        if dropped == 0:
+            return messages
+
+        fitted = list(messages[:leading]) + [note]
+        fitted.extend(message for index, message in enumerate(messages[leading:-1], leading)
+                      if index in keep or message.get("role") == "system")
+        fitted.append(messages[-1])
+
+        self.stats["truncated"] += 1
+        self.stats["dropped_messages"] += dropped
+        logger.info(f"Context window: dropped {dropped} of {len(history)} history messages "
+                    f"(~{sum(counts)} tokens, budget {budget})")
+        return fitted
+
+    def observe(self, messages: List[Dict[str, Any]], model: Optional[str] = None) -> int:
+        """Record a prompt and return how many of its tokens repeat a prefix sent before."""
+        if not messages:
+            return 0
+        counts = token_counter.count_each(messages, model)
+        reused = 0
+        matching = True
+        prefix_tokens = 0
+        for digest, count in zip(prefix_digests(messages), counts):
+            prefix_tokens += count
+            if matching and digest in self._prefixes:
+                reused = prefix_tokens
+                self._prefixes.move_to_end(digest)
+            else:
+                matching = False
+                self._prefixes[digest] = None
+        while len(self._prefixes) > self.max_tracked_prefixes:
+            self._prefixes.popitem(last=False)
+
+        self.stats["prompts"] += 1
+        self.stats["prompt_tokens"] += prefix_tokens
+        self.stats["reused_tokens"] += reused
+        return reused
+
+    def get_stats(self) -> Dict[str, Any]:
+        prompt_tokens = self.stats["prompt_tokens"]
+        return dict(
+            self.stats,
+            prefix_reuse_rate=round(self.stats["reused_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+            tracked_prefixes=len(self._prefixes)
+        )
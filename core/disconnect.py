@@ -0,0 +1,72 @@
+import logging
+import asyncio
+from typing import Dict, Any
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+
+class DisconnectAwareStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that stops generating as soon as the client goes away.
+
+    The body is streamed in a task next to a watcher on the ASGI receive
+    channel. An `http.disconnect` cancels the streaming task right away, even
+    while it is waiting on upstream (for example during prompt processing),
+    regardless of the server's ASGI spec version. The body iterator is then
+    closed explicitly, so its cleanup runs immediately instead of whenever
+    the generator is garbage collected: the admission slot is released and
+    the upstream httpx stream is closed, which makes Ollama and llama.cpp
+    abort the generation.
+    """
+
+    disconnects = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await super().__call__(scope, receive, send)
+            return
+
+        stream_task = asyncio.ensure_future(self.stream_response(send))
+        watcher = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({stream_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected = watcher.done() and not watcher.cancelled() and not stream_task.done()
+            for task in (stream_task, watcher):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(stream_task, watcher, return_exceptions=True)
+            await self._close_body()
+
+        if disconnected:
+            DisconnectAwareStreamingResponse.disconnects += 1
+            logger.info("Client disconnected, cancelled streaming response")
+            return
+
+        error = stream_task.exception()
+        if error is not None and not isinstance(error, OSError):
+            raise error
+        if error is None and self.background is not None:
+            await self.background()
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def _close_body(self):
+        aclose = getattr(self.body_iterator, "aclose", None)
+        if aclose is None:
+            return
+        try:
+            await aclose()
+        except Exception as e:
+            logger.debug(f"Error closing stream body: {str(e)}")
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        return {"disconnects": cls.disconnects}
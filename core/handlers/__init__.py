@@ -7,6 +7,7 @@ from .base_response_handler import BaseResponseHandler
 from .ollama_handlers import OllamaRequestHandler, OllamaResponseHandler
 from .openrouter_handlers import OpenRouterRequestHandler, OpenRouterResponseHandler
 from .llamacpp_handlers import LlamaCppRequestHandler, LlamaCppResponseHandler
+from .sse import StreamingChunkEncoder
 
 __all__ = [
     'BaseRequestHandler', 
@@ -16,5 +17,6 @@ __all__ = [
     'OpenRouterRequestHandler',
     'OpenRouterResponseHandler',
     'LlamaCppRequestHandler',
-    'LlamaCppResponseHandler'
+    'LlamaCppResponseHandler',
+    'StreamingChunkEncoder'
 ]
@@ -3,7 +3,11 @@ import asyncio
 import httpx
 from abc import ABC, abstractmethod
 from typing import Dict, List, Any, Optional
-from ..util import estimate_message_tokens, count_tokens_in_messages
+from ..tokens import token_counter
+from ..pool import ConnectionPoolRegistry
+from ..health import HealthMonitor
+from ..long_context import LongContextProcessor
+from ..context_window import ContextWindowManager
 
 logger = logging.getLogger(__name__)
 
@@ -16,16 +20,29 @@ class BaseRequestHandler(ABC):
     and error handling that can be used by all provider clients.
     """
     
+    provider_name = "generic"
+    
     def __init__(self, endpoint: str, max_retries: int = 3, 
                  max_tokens_per_chunk: int = 8000, chunk_overlap: int = 1,
-                 max_streaming_tokens: int = 32000):
+                 max_streaming_tokens: int = 32000,
+                 pools: Optional[ConnectionPoolRegistry] = None,
+                 health: Optional[HealthMonitor] = None):
         self.endpoint = endpoint
         self.max_retries = max_retries
         self.max_tokens_per_chunk = max_tokens_per_chunk
         self.chunk_overlap = chunk_overlap
         self.prefer_streaming = True
         self.max_streaming_tokens = max_streaming_tokens
+        self.pools = pools
+        self.health = health
         self._client = None
+        self.long_context = LongContextProcessor({
+            "max_tokens_per_chunk": max_tokens_per_chunk,
+            "chunk_overlap": chunk_overlap
+        })
+        self.context_window = ContextWindowManager()
+        # Context lengths reported by the provider, None when it couldn't tell
+        self.context_lengths: Dict[str, Optional[int]] = {}
     
     def __del__(self):
         """Cleanup when the handler is destroyed."""
@@ -64,30 +81,76 @@ class BaseRequestHandler(ABC):
         """Handle provider-specific error responses."""
         pass
     
+    def configure_long_context(self, config: Dict[str, Any]):
+        """Apply the "long_context" settings from config.json on top of the handler's defaults."""
+        settings = {"max_tokens_per_chunk": self.max_tokens_per_chunk, "chunk_overlap": self.chunk_overlap}
+        settings.update(config or {})
+        self.max_tokens_per_chunk = settings["max_tokens_per_chunk"]
+        self.chunk_overlap = settings["chunk_overlap"]
+        self.long_context = LongContextProcessor(settings)
+    
+    def configure_context_window(self, config: Dict[str, Any]):
+        """Apply the "context_window" settings from config.json."""
+        self.context_window = ContextWindowManager(config)
+    
+    async def fetch_context_length(self, model: str) -> Optional[int]:
+        """Ask the provider for a model's context length. None if it can't be determined."""
+        return None
+    
+    async def get_context_length(self, model: Optional[str]) -> int:
+        """Context length of a model: configured, then reported by the provider, then the default."""
+        configured = self.context_window.configured_length(model)
+        if configured:
+            return configured
+        key = model or ""
+        if key not in self.context_lengths:
+            try:
+                self.context_lengths[key] = await self.fetch_context_length(model)
+            except Exception as e:
+                logger.warning(f"Could not determine context length of {model}: {str(e)}")
+                self.context_lengths[key] = None
+        return self.context_lengths[key] or self.context_window.default_context_length
+    
     async def get_client(self) -> httpx.AsyncClient:
-        """Get or create a persistent HTTP client."""
+        """Get the shared provider pool, or a private client when no registry is set."""
+        if self.pools is not None:
+            return self.pools.get_client(self.provider_name)
         if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(
-                timeout=httpx.Timeout(connect=10.0, read=180.0, write=10.0, pool=5.0),
-                limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
-            )
+            self._client = ConnectionPoolRegistry().create_client(self.provider_name)
         return self._client
     
+    def get_timeout(self, read_timeout: Optional[float] = None) -> httpx.Timeout:
+        """Get the request timeout for this provider."""
+        pools = self.pools or ConnectionPoolRegistry()
+        return pools.get_timeout(self.provider_name, read_timeout)
+    
     async def close_client(self):
-        """Close the HTTP client if it exists."""
+        """Close the private HTTP client if it exists. Shared pools are closed by the registry."""
         if self._client is not None and not self._client.is_closed:
             await self._client.aclose()
             self._client = None
     
-    async def test_connection(self) -> bool:
-        """Test connection to the provider."""
+    async def test_connection(self, timeout: float = 5.0) -> bool:
+        """Probe the provider's health URL. Used by the background health monitor."""
         try:
             client = await self.get_client()
-            health_response = await client.get(self.get_health_url())
+            health_response = await client.get(
+                self.get_health_url(),
+                headers=self.get_request_headers(),
+                timeout=timeout
+            )
             return health_response.status_code == 200
         except Exception:
             return False
     
+    def _record_success(self):
+        if self.health is not None:
+            self.health.record_success(self.provider_name)
+    
+    def _record_failure(self, error: str):
+        if self.health is not None:
+            self.health.record_failure(self.provider_name, error)
+    
     def sanitize_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Sanitize message content, handling complex content structures."""
         sanitized_messages = []
@@ -117,15 +180,16 @@ class BaseRequestHandler(ABC):
         # Sanitize messages
         if "messages" in request_data:
             request_data["messages"] = self.sanitize_messages(request_data["messages"])
+            self.context_window.observe(request_data["messages"], request_data.get("model"))
         
         # Prepare provider-specific request data
         prepared_data = self.prepare_request_data(request_data)
         
         is_streaming = prepared_data.get("stream", self.prefer_streaming)
         
-        # Test connection first
-        if not await self.test_connection():
-            return {"error": {"message": "Cannot connect to provider API", "code": 503}}
+        # Consult the circuit breaker instead of probing the provider on every request
+        if self.health is not None and not self.health.allow_request(self.provider_name):
+            return {"error": {"message": "Provider temporarily unavailable", "code": 503}}
         
         while retry_count < self.max_retries:
             try:
@@ -134,18 +198,29 @@ class BaseRequestHandler(ABC):
                 
                 headers = self.get_request_headers(is_streaming)
                 
-                # Update timeout for non-streaming requests
-                if not is_streaming:
-                    client._timeout = httpx.Timeout(connect=10.0, read=timeout_seconds, write=10.0, pool=5.0)
+                # Per-request timeout, the shared pool client must not be mutated
+                timeout = self.get_timeout(None if is_streaming else timeout_seconds)
                 
-                response = await client.post(url, json=prepared_data, headers=headers)
+                # Streaming responses are returned unread so deltas can be forwarded as
+                # they arrive; the response handler closes them when the stream ends
+                request = client.build_request("POST", url, json=prepared_data, headers=headers, timeout=timeout)
+                response = await client.send(request, stream=is_streaming)
 
+                if response.status_code >= 500:
+                    self._record_failure(f"HTTP {response.status_code}")
+                else:
+                    self._record_success()
+                
                 if response.status_code == 200:
                     return response
-                else:
-                    return self.handle_error_response(response, model)
+                
+                if is_streaming:
+                    await response.aread()
+                    await response.aclose()
+                return self.handle_error_response(response, model)
                         
             except httpx.TimeoutException:
+                self._record_failure("Request timeout")
                 retry_count += 1
                 if retry_count >= self.max_retries:
                     logger.error(f"Request timeout after {self.max_retries} retries")
@@ -153,6 +228,7 @@ class BaseRequestHandler(ABC):
                 await asyncio.sleep(min(2 ** retry_count, 8))
                 
             except Exception as e:
+                self._record_failure(str(e))
                 retry_count += 1
                 if retry_count >= self.max_retries:
                     logger.error(f"Request failed after {self.max_retries} retries: {str(e)}")
@@ -170,7 +246,7 @@ class BaseRequestHandler(ABC):
         current_tokens = 0
         
         for message in messages:
-            message_tokens = estimate_message_tokens(message)
+            message_tokens = token_counter.count_message(message)
             
             if current_tokens + message_tokens > self.max_tokens_per_chunk and current_chunk:
                 chunks.append(current_chunk)
@@ -187,83 +263,36 @@ class BaseRequestHandler(ABC):
     
     async def process_chunked_request(self, original_request: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Process large requests by chunking messages.
+        Process requests that exceed the per-call token budget with the
+        configured long-context strategy (sliding window, map-reduce or 413).
         """
-        messages = original_request.get("messages", [])
-        chunks = self.chunk_messages(messages)
-        
-        if len(chunks) <= 1:
-            return await self.make_request(original_request)
+        timeout = original_request.get("timeout", 90)
         
-        logger.info(f"Processing {len(chunks)} chunks")
+        async def send(request_data: Dict[str, Any]):
+            return await self.make_request(request_data, timeout)
         
-        current_context = []
-        
-        for i, chunk in enumerate(chunks):
-            chunk_request = original_request.copy()
-            chunk_request["messages"] = current_context + chunk
-            chunk_request["stream"] = False  # Force non-streaming for chunks
-            
-            response = await self.make_request(chunk_request)
-            
-            if isinstance(response, dict) and "error" in response:
-                return response
-            
-            # This would need to be implemented per provider
-            # For now, return the last response
-            if i == len(chunks) - 1:
-                return response
-            
-            # Update context (provider-specific logic needed)
-            # current_context = self._update_context(response, current_context)
-            
-        return {"error": {"message": "Chunking processing error", "code": 500}}
+        return await self.long_context.process(original_request, send)
     
     async def process_large_streaming_request(self, request_data: Dict[str, Any]) -> httpx.Response:
         """
-        Process large streaming requests by reducing context.
+        Process large streaming requests by fitting them into the model's context window.
+        Old history is dropped in whole blocks so the prompt prefix stays cacheable.
         """
         messages = request_data.get("messages", [])
-        total_tokens = count_tokens_in_messages(messages)
-        logger.info(f"Processing large streaming request ({len(messages)} messages, ~{total_tokens} tokens)")
+        model = request_data.get("model")
+        context_length = await self.get_context_length(model)
+        budget = min(self.context_window.budget(context_length, request_data.get("max_tokens")),
+                     self.max_streaming_tokens)
+        logger.info(f"Processing large streaming request ({len(messages)} messages, "
+                    f"context {context_length}, prompt budget {budget})")
         
-        max_safe_tokens = min(self.max_streaming_tokens, 12000)
-        
-        if total_tokens <= max_safe_tokens:
+        fitted_messages = self.context_window.fit(messages, budget, model)
+        if fitted_messages is messages:
             logger.info("Request within token limit")
             return await self.make_request(request_data, min(request_data.get("timeout", 90), 90))
-            
-        # Reduce context by keeping system messages and recent messages
-        system_messages = [msg for msg in messages if msg.get("role") == "system"]
-        other_messages = [msg for msg in messages if msg.get("role") != "system"]
-        
-        system_tokens = sum(estimate_message_tokens(msg) for msg in system_messages)
-        available_tokens = max_safe_tokens - system_tokens - 200
-        
-        preserved_messages = []
-        current_tokens = 0
-        
-        for msg in reversed(other_messages):
-            msg_tokens = estimate_message_tokens(msg)
-            if current_tokens + msg_tokens <= available_tokens:
-                preserved_messages.insert(0, msg)
-                current_tokens += msg_tokens
-            else:
-                break
-        
-        reduced_messages = system_messages + preserved_messages
-        
-        if len(reduced_messages) < len(messages):
-            logger.info(f"Reduced context from {len(messages)} to {len(reduced_messages)} messages")
-            
-            context_note = {
-                "role": "system",
-                "content": f"Note: Only the most recent {len(preserved_messages)} messages were included due to token limits."
-            }
-            reduced_messages.insert(len(system_messages), context_note)
         
         modified_request = request_data.copy()
-        modified_request["messages"] = reduced_messages
+        modified_request["messages"] = fitted_messages
         
         timeout = min(request_data.get("timeout", 180), 180)
         
@@ -277,7 +306,7 @@ class BaseRequestHandler(ABC):
         request_data["timeout"] = timeout
         
         message_count = len(request_data.get("messages", []))
-        token_count = count_tokens_in_messages(request_data.get("messages", []))
+        token_count = self.calculate_request_size(request_data)
         is_large_request = message_count > 5 or token_count > 6000
         
         is_stream = request_data.get("stream", True)
@@ -299,4 +328,4 @@ class BaseRequestHandler(ABC):
     
     def calculate_request_size(self, request_data: Dict[str, Any]) -> int:
         """Calculate the token size of a request."""
-        return count_tokens_in_messages(request_data.get("messages", []))
+        return token_counter.count_messages(request_data.get("messages", []), request_data.get("model"))
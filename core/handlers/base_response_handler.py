@@ -5,11 +5,25 @@ import random
 import asyncio
 import re
 from abc import ABC, abstractmethod
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, Any, AsyncGenerator, Optional, Callable
 import httpx
+from .sse import (
+    StreamingChunkEncoder, DONE_EVENT, COMPLETED_EVENT, CompletionEvent, encode_event, encode_comment,
+    encode_json_string
+)
 
 logger = logging.getLogger(__name__)
 
+# Streaming modes
+STREAM_MODE_PASSTHROUGH = "passthrough"  # forward each upstream delta as one event, no delays
+STREAM_MODE_SMOOTH = "smooth"  # split deltas into words, paced no slower than the upstream rate
+STREAM_MODE_RELAY = "relay"  # forward raw upstream SSE bytes (OpenAI-native upstreams only)
+STREAM_MODES = (STREAM_MODE_PASSTHROUGH, STREAM_MODE_SMOOTH, STREAM_MODE_RELAY)
+DEFAULT_STREAM_MODE = STREAM_MODE_PASSTHROUGH
+
+# Matches the model field of an OpenAI SSE chunk, e.g. "model":"openai/gpt-4o"
+MODEL_FIELD_RE = re.compile(rb'"model"\s*:\s*"(?:[^"\\]|\\.)*"')
+
 
 class BaseResponseHandler(ABC):
     """
@@ -19,8 +33,15 @@ class BaseResponseHandler(ABC):
     and handling streaming responses that can be used by all provider clients.
     """
     
-    def __init__(self):
-        pass
+    # Upstreams that already emit OpenAI SSE can be relayed without re-encoding
+    supports_relay = False
+    
+    def __init__(self, max_smoothing_delay: float = 0.03):
+        # Upper bound for the pause between words in smooth mode
+        self.max_smoothing_delay = max_smoothing_delay
+        # Streams abandoned by their client, and the tokens generated for them before they were cut off
+        self.cancelled_streams = 0
+        self.cancelled_tokens = 0
     
     @abstractmethod
     def parse_provider_response(self, response: httpx.Response) -> Dict[str, Any]:
@@ -47,6 +68,10 @@ class BaseResponseHandler(ABC):
         """Check if streaming is complete based on chunk data."""
         pass
     
+    def observe_final_response(self, data: Dict[str, Any]):
+        """Called with the complete response, or the final chunk of a stream; no-op by default."""
+        pass
+    
     def generate_message_id(self) -> str:
         """Generate a unique message ID for OpenAI compatibility."""
         return f"chatcmpl-{random.randint(10000, 99999)}"
@@ -93,62 +118,150 @@ class BaseResponseHandler(ABC):
             }
         }
     
-    def create_streaming_chunk(self, content: str, message_id: str, model: str, 
-                              finish_reason: str = None) -> Dict[str, Any]:
-        """Create OpenAI-compatible streaming chunk."""
-        chunk = {
-            "id": message_id,
-            "object": "chat.completion.chunk",
-            "created": self.get_current_timestamp(),
-            "model": model,
-            "choices": [{
-                "index": 0,
-                "delta": {},
-                "finish_reason": finish_reason
-            }]
-        }
+    async def smooth_content(self, content: str, upstream_interval: float) -> AsyncGenerator[str, None]:
+        """
+        Optional rate-shaping stage for smooth mode.
         
-        if content:
-            chunk["choices"][0]["delta"]["content"] = content
+        Splits a delta into words and spreads them over at most the observed
+        interval between upstream deltas, so delivery never falls behind the
+        upstream token rate.
+        """
+        words = re.findall(r'\S+|\s+', content)
+        if len(words) <= 1:
+            yield content
+            return
         
-        return chunk
+        delay = min(self.max_smoothing_delay, upstream_interval / len(words))
+        for word in words:
+            yield word
+            # Only pause after actual words, not whitespace
+            if delay > 0 and word.strip():
+                await asyncio.sleep(delay)
     
-    def create_role_chunk(self, message_id: str, model: str) -> Dict[str, Any]:
-        """Create the initial role chunk for streaming."""
-        return {
-            "id": message_id,
-            "object": "chat.completion.chunk",
-            "created": self.get_current_timestamp(),
-            "model": model,
-            "choices": [{
-                "index": 0,
-                "delta": {
-                    "role": "assistant"
-                },
-                "finish_reason": None
-            }]
-        }
+    async def relay_response(self, response: httpx.Response, requested_model: str,
+                             on_usage: Optional[Callable[[Dict[str, Any]], None]] = None) -> AsyncGenerator[bytes, None]:
+        """
+        Zero-parse relay for upstreams that already speak OpenAI SSE.
+        
+        Upstream bytes are forwarded as-is. Only the model field is rewritten,
+        and only when it differs from the requested model. Events are parsed
+        lazily, and only the ones carrying usage when `on_usage` is given.
+        """
+        target_field = b'"model":' + encode_json_string(requested_model)
+        upstream_field = None
+        needs_split = True
+        buffer = b""
+        tail = b""
+        events_relayed = 0
+        
+        try:
+            logger.info(f"Relaying upstream stream for {requested_model}")
+            async for chunk in response.aiter_bytes():
+                events_relayed += chunk.count(b"data:")
+                if not needs_split:
+                    # Model already matches and nobody wants usage: pure byte relay
+                    if buffer:
+                        chunk, buffer = buffer + chunk, b""
+                    tail = (tail + chunk)[-32:]
+                    yield CompletionEvent(chunk) if tail.rstrip().endswith(b"[DONE]") else chunk
+                    continue
+                
+                buffer += chunk
+                if b"\n\n" not in buffer:
+                    continue
+                
+                *events, buffer = buffer.split(b"\n\n")
+                for i, event in enumerate(events):
+                    if upstream_field is None:
+                        match = MODEL_FIELD_RE.search(event)
+                        if match:
+                            upstream_field = match.group(0)
+                    if upstream_field is not None and upstream_field != target_field:
+                        event = event.replace(upstream_field, target_field, 1)
+                    if on_usage is not None and b'"usage"' in event:
+                        self._report_relay_usage(event, on_usage)
+                    events[i] = event
+                
+                data = b"\n\n".join(events) + b"\n\n"
+                tail = data[-32:]
+                yield CompletionEvent(data) if not buffer and tail.rstrip().endswith(b"[DONE]") else data
+                
+                if upstream_field == target_field and on_usage is None:
+                    needs_split = False
+            
+            if buffer:
+                tail = buffer[-32:]
+                yield CompletionEvent(buffer) if tail.rstrip().endswith(b"[DONE]") else buffer
+            if not tail.rstrip().endswith(b"[DONE]"):
+                yield DONE_EVENT
+                
+        except (asyncio.CancelledError, GeneratorExit):
+            self.record_cancellation(requested_model, events_relayed)
+            raise
+        except Exception as e:
+            logger.error(f"Stream relay error: {str(e)}")
+            try:
+                yield encode_event(self.format_openai_error("Stream error", 500))
+                yield DONE_EVENT
+            except:
+                pass
+        finally:
+            await response.aclose()
+    
+    def record_cancellation(self, requested_model: str, tokens: int):
+        """Count a stream whose client went away; closing it aborts the upstream generation."""
+        self.cancelled_streams += 1
+        self.cancelled_tokens += tokens
+        logger.info(f"Stream for {requested_model} cancelled by client after ~{tokens} tokens, closing upstream")
+    
+    def _report_relay_usage(self, event: bytes, on_usage: Callable[[Dict[str, Any]], None]):
+        """Parse a single relayed event for its usage block."""
+        try:
+            payload = event.split(b"data:", 1)[1]
+            usage = json.loads(payload).get("usage")
+            if usage:
+                on_usage(usage)
+        except Exception as e:
+            logger.debug(f"Could not parse usage from relayed event: {str(e)}")
     
     async def stream_response(self, response: httpx.Response, 
-                            requested_model: str) -> AsyncGenerator[str, None]:
-        """Process streaming response from provider into OpenAI format."""
+                            requested_model: str,
+                            stream_mode: Optional[str] = None,
+                            on_usage: Optional[Callable[[Dict[str, Any]], None]] = None) -> AsyncGenerator[bytes, None]:
+        """Process streaming response from provider into OpenAI format SSE bytes."""
+        stream_mode = stream_mode or DEFAULT_STREAM_MODE
+        if stream_mode == STREAM_MODE_RELAY and self.supports_relay:
+            async for event in self.relay_response(response, requested_model, on_usage):
+                yield event
+            return
+        
+        deltas = 0
         try:
-            logger.info(f"Starting stream processing for {requested_model}")
+            logger.info(f"Starting stream processing for {requested_model} (mode={stream_mode})")
             chunk_index = 0
             message_id = self.generate_message_id()
             created_time = self.get_current_timestamp()
             last_yield_time = time.time()
             start_time = time.time()
             
+            # Invariant parts of every chunk are rendered once for the whole stream
+            encoder = StreamingChunkEncoder(message_id, requested_model, created_time)
+            
             # Send initial role chunk
-            role_event = self.create_role_chunk(message_id, requested_model)
-            logger.debug(f"Sending role chunk: {role_event}")
-            yield f"data: {json.dumps(role_event)}\n\n"
+            logger.debug("Sending role chunk")
+            yield encoder.role()
             
             keepalive_interval = 5
             max_idle_time = 60  # Only timeout if NO data received for 60 seconds
             lines_processed = 0
             last_data_time = time.time()
+            upstream_done = False
+            
+            # Smooth mode bookkeeping: EWMA of the time between upstream deltas,
+            # excluding the time spent shaping the previous delta
+            upstream_interval = 0.0
+            last_content_time = None
+            shaping_time = 0.0
             
             logger.info(f"Starting to iterate over response lines...")
             async for line in response.aiter_lines():
@@ -167,23 +280,15 @@ class BaseResponseHandler(ABC):
                 if idle_time > max_idle_time:
                     logger.warning(f"Stream idle timeout after {idle_time:.1f}s with no data")
                     
-                    timeout_chunk = self.create_streaming_chunk(
-                        "\n\n[Connection lost - no data received]",
-                        message_id, requested_model
-                    )
-                    yield f"data: {json.dumps(timeout_chunk)}\n\n"
-                    
-                    finish_chunk = self.create_streaming_chunk(
-                        "", message_id, requested_model, "stop"
-                    )
-                    yield f"data: {json.dumps(finish_chunk)}\n\n"
-                    yield "data: [DONE]\n\n"
+                    yield encoder.content("\n\n[Connection lost - no data received]")
+                    yield encoder.finish("stop")
+                    yield DONE_EVENT
                     return
                 
                 # Send keepalive
                 if current_time - last_yield_time > keepalive_interval:
                     logger.debug("Sending keepalive")
-                    yield f": keepalive {int(current_time)}\n\n"
+                    yield encode_comment(f"keepalive {int(current_time)}")
                     last_yield_time = current_time
                 
                 if not line.strip():
@@ -197,6 +302,7 @@ class BaseResponseHandler(ABC):
                         
                         if data_content.strip() == "[DONE]":
                             logger.debug("Received [DONE] marker")
+                            upstream_done = True
                             break
                         
                         chunk_data = json.loads(data_content)
@@ -207,9 +313,8 @@ class BaseResponseHandler(ABC):
                     # Handle errors
                     if "error" in chunk_data:
                         logger.error(f"Stream error: {chunk_data['error']}")
-                        error_response = self.format_openai_error("Stream error", 500)
-                        yield f"data: {json.dumps(error_response)}\n\n"
-                        yield "data: [DONE]\n\n"
+                        yield encode_event(self.format_openai_error("Stream error", 500))
+                        yield DONE_EVENT
                         return
                     
                     # Parse chunk using provider-specific logic
@@ -219,42 +324,35 @@ class BaseResponseHandler(ABC):
                     # Send content if available  
                     if parsed_chunk.get("content"):
                         content = parsed_chunk["content"]
+                        deltas += 1
                         logger.debug(f"Sending content: {repr(content)}")
                         
-                        # Split content for smoother streaming experience
-                        if len(content) > 1:
-                            # Split by words and send each word separately
-                            # Split on word boundaries, keeping punctuation with words
-                            words = re.findall(r'\S+|\s+', content)
+                        if stream_mode == STREAM_MODE_SMOOTH:
+                            if last_content_time is not None:
+                                gap = max(0.0, current_time - last_content_time - shaping_time)
+                                upstream_interval = 0.8 * upstream_interval + 0.2 * gap if upstream_interval else gap
+                            last_content_time = current_time
                             
-                            for word in words:
-                                # Don't skip spaces - they're important for readability!
-                                content_chunk = self.create_streaming_chunk(
-                                    word, message_id, requested_model
-                                )
-                                yield f"data: {json.dumps(content_chunk)}\n\n"
+                            shaping_start = time.time()
+                            async for piece in self.smooth_content(content, upstream_interval):
+                                yield encoder.content(piece)
                                 chunk_index += 1
-                                
-                                # Only add delay for actual words, not spaces
-                                if word.strip():
-                                    await asyncio.sleep(0.03)  # 30ms delay
+                            shaping_time = time.time() - shaping_start
                         else:
-                            # Single character, send as-is
-                            content_chunk = self.create_streaming_chunk(
-                                content, message_id, requested_model
-                            )
-                            yield f"data: {json.dumps(content_chunk)}\n\n"
+                            # Passthrough: one event per upstream delta, as soon as it arrives
+                            yield encoder.content(content)
                             chunk_index += 1
                         
                         last_yield_time = current_time
                     
+                    if on_usage is not None and chunk_data.get("usage"):
+                        on_usage(chunk_data["usage"])
+                    
                     # Check if streaming is done
                     if self.is_streaming_done(chunk_data):
-                        finish_chunk = self.create_streaming_chunk(
-                            "", message_id, requested_model, "stop"
-                        )
-                        yield f"data: {json.dumps(finish_chunk)}\n\n"
-                        yield "data: [DONE]\n\n"
+                        self.observe_final_response(chunk_data)
+                        yield encoder.finish("stop")
+                        yield COMPLETED_EVENT
                         return
                 
                 except json.JSONDecodeError:
@@ -264,19 +362,25 @@ class BaseResponseHandler(ABC):
                     logger.error(f"Error processing chunk: {str(e)}")
             
             logger.info(f"Stream completed: {lines_processed} lines, {chunk_index} chunks in {time.time() - start_time:.2f}s")
-            yield "data: [DONE]\n\n"
+            # Only an upstream [DONE] marks a complete answer; a stream that just stopped may be truncated
+            yield COMPLETED_EVENT if upstream_done else DONE_EVENT
             
+        except (asyncio.CancelledError, GeneratorExit):
+            self.record_cancellation(requested_model, deltas)
+            raise
         except Exception as e:
             logger.error(f"Stream error: {str(e)}")
             try:
-                error_response = self.format_openai_error("Stream error", 500)
-                yield f"data: {json.dumps(error_response)}\n\n"
-                yield "data: [DONE]\n\n"
+                yield encode_event(self.format_openai_error("Stream error", 500))
+                yield DONE_EVENT
             except:
                 pass
+        finally:
+            # Release the pooled upstream connection
+            await response.aclose()
     
     def handle_response(self, response: httpx.Response, requested_model: str, 
-                       is_streaming: bool = False) -> Any:
+                       is_streaming: bool = False, stream_mode: Optional[str] = None) -> Any:
         """
         Main entry point for handling responses.
         
@@ -284,16 +388,18 @@ class BaseResponseHandler(ABC):
             response: HTTP response from provider
             requested_model: The model name requested by client
             is_streaming: Whether this is a streaming response
+            stream_mode: "passthrough" (default), "smooth" or "relay"
             
         Returns:
-            For streaming: AsyncGenerator yielding SSE chunks
+            For streaming: AsyncGenerator yielding SSE events as bytes
             For non-streaming: Dict with OpenAI-compatible response
         """
         if is_streaming:
-            return self.stream_response(response, requested_model)
+            return self.stream_response(response, requested_model, stream_mode)
         else:
             try:
                 parsed_response = self.parse_provider_response(response)
+                self.observe_final_response(parsed_response)
                 return self.format_openai_response(parsed_response, requested_model)
             except Exception as e:
                 logger.error(f"Error handling response: {str(e)}")
@@ -1,6 +1,6 @@
 import logging
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import httpx
 from .base_request_handler import BaseRequestHandler
 from .base_response_handler import BaseResponseHandler
@@ -11,13 +11,25 @@ logger = logging.getLogger(__name__)
 class LlamaCppRequestHandler(BaseRequestHandler):
     """Llama.cpp-specific request handler implementation."""
     
+    provider_name = "llamacpp"
+    
     def get_chat_url(self) -> str:
         """Return the Llama.cpp chat completion URL."""
         return f"{self.endpoint}/v1/chat/completions"
     
     def get_health_url(self) -> str:
         """Return the Llama.cpp health check URL."""
-        return f"{self.endpoint}/v1/models"
+        return f"{self.endpoint}/health"
+    
+    async def fetch_context_length(self, model: str) -> Optional[int]:
+        """Per-slot context size of the loaded model, from /props."""
+        client = await self.get_client()
+        response = await client.get(f"{self.endpoint}/props", timeout=10.0)
+        if response.status_code != 200:
+            return None
+        props = response.json()
+        n_ctx = props.get("default_generation_settings", {}).get("n_ctx") or props.get("n_ctx")
+        return int(n_ctx) if n_ctx else None
     
     def prepare_request_data(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """Transform request data to Llama.cpp format."""
@@ -87,6 +99,8 @@ class LlamaCppRequestHandler(BaseRequestHandler):
 class LlamaCppResponseHandler(BaseResponseHandler):
     """Llama.cpp-specific response handler implementation."""
     
+    supports_relay = True
+    
     def parse_provider_response(self, response: httpx.Response) -> Dict[str, Any]:
         """Parse Llama.cpp response format."""
         try:
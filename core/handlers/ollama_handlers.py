@@ -1,6 +1,6 @@
 import logging
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import httpx
 from .base_request_handler import BaseRequestHandler
 from .base_response_handler import BaseResponseHandler
@@ -11,6 +11,14 @@ logger = logging.getLogger(__name__)
 class OllamaRequestHandler(BaseRequestHandler):
     """Ollama-specific request handler implementation."""
     
+    provider_name = "ollama"
+    
+    def __init__(self, endpoint: str, **kwargs):
+        super().__init__(endpoint, **kwargs)
+        # Set by OllamaClient: OpenAI -> Ollama options translation and keep_alive handling
+        self.options = None
+        self.residency = None
+    
     def get_chat_url(self) -> str:
         """Return the Ollama chat completion URL."""
         return f"{self.endpoint}/api/chat"
@@ -19,15 +27,44 @@ class OllamaRequestHandler(BaseRequestHandler):
         """Return the Ollama health check URL."""
         return f"{self.endpoint}/api/version"
     
+    async def fetch_context_length(self, model: str) -> Optional[int]:
+        """Context length of a model from /api/show, or its Modelfile num_ctx if that is missing."""
+        client = await self.get_client()
+        response = await client.post(f"{self.endpoint}/api/show", json={"model": model}, timeout=10.0)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        context_length = None
+        for key, value in (data.get("model_info") or {}).items():
+            if key.endswith(".context_length"):
+                context_length = int(value)
+                break
+        if context_length is None:
+            # Requests set num_ctx explicitly, the Modelfile default only matters as a fallback
+            for line in (data.get("parameters") or "").splitlines():
+                parts = line.split()
+                if len(parts) == 2 and parts[0] == "num_ctx":
+                    context_length = int(parts[1])
+        return context_length
+    
     def prepare_request_data(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Transform request data to Ollama format."""
-        # Ollama uses the same format as OpenAI, so minimal transformation needed
+        """Transform request data to an /api/chat payload with options, num_ctx and keep_alive."""
         prepared = request_data.copy()
+        # Router bookkeeping, not an Ollama field
+        prepared.pop("timeout", None)
         
         # Ensure stream is set properly
         if "stream" not in prepared:
             prepared["stream"] = self.prefer_streaming
         
+        if self.options is not None:
+            model = prepared.get("model")
+            # Known once the client looked it up with get_context_length()
+            context_length = self.context_window.configured_length(model) or self.context_lengths.get(model or "")
+            prepared = self.options.translate(prepared, context_length)
+        if self.residency is not None:
+            prepared = self.residency.apply(prepared)
+        
         return prepared
     
     def get_request_headers(self, is_streaming: bool = False) -> Dict[str, str]:
@@ -71,6 +108,16 @@ class OllamaRequestHandler(BaseRequestHandler):
 class OllamaResponseHandler(BaseResponseHandler):
     """Ollama-specific response handler implementation."""
     
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Set by OllamaClient to learn load times and residency from final responses
+        self.residency = None
+    
+    def observe_final_response(self, data: Dict[str, Any]):
+        """Record load_duration and residency of the model that answered."""
+        if self.residency is not None:
+            self.residency.record_response(data.get("model"), data)
+    
     def parse_provider_response(self, response: httpx.Response) -> Dict[str, Any]:
         """Parse Ollama response format."""
         try:
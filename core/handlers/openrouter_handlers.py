@@ -1,9 +1,11 @@
 import logging
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import httpx
 from .base_request_handler import BaseRequestHandler
 from .base_response_handler import BaseResponseHandler
+from ..pool import ConnectionPoolRegistry
+from ..health import HealthMonitor
 
 logger = logging.getLogger(__name__)
 
@@ -11,10 +13,14 @@ logger = logging.getLogger(__name__)
 class OpenRouterRequestHandler(BaseRequestHandler):
     """OpenRouter-specific request handler implementation."""
     
+    provider_name = "openrouter"
+    
     def __init__(self, endpoint: str, api_key: str, max_retries: int = 3, 
                  max_tokens_per_chunk: int = 8000, chunk_overlap: int = 1,
-                 max_streaming_tokens: int = 32000):
-        super().__init__(endpoint, max_retries, max_tokens_per_chunk, chunk_overlap, max_streaming_tokens)
+                 max_streaming_tokens: int = 32000, pools: Optional[ConnectionPoolRegistry] = None,
+                 health: Optional[HealthMonitor] = None):
+        super().__init__(endpoint, max_retries, max_tokens_per_chunk, chunk_overlap, max_streaming_tokens,
+                         pools, health)
         self.api_key = api_key
     
     def get_chat_url(self) -> str:
@@ -22,8 +28,8 @@ class OpenRouterRequestHandler(BaseRequestHandler):
         return f"{self.endpoint}/api/v1/chat/completions"
     
     def get_health_url(self) -> str:
-        """Return the OpenRouter health check URL."""
-        return f"{self.endpoint}/api/v1/models"
+        """Return the OpenRouter health check URL (API key info, a tiny payload)."""
+        return f"{self.endpoint}/api/v1/key"
     
     def prepare_request_data(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """Transform request data to OpenRouter format."""
@@ -90,6 +96,8 @@ class OpenRouterRequestHandler(BaseRequestHandler):
 class OpenRouterResponseHandler(BaseResponseHandler):
     """OpenRouter-specific response handler implementation."""
     
+    supports_relay = True
+    
     def parse_provider_response(self, response: httpx.Response) -> Dict[str, Any]:
         """Parse OpenRouter response format."""
         try:
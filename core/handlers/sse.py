@@ -0,0 +1,86 @@
+import json
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+
+DONE_EVENT = b"data: [DONE]\n\n"
+
+
+class CompletionEvent(bytes):
+    """
+    Bytes of the event ending a stream the upstream itself finished.
+
+    Stream wrappers forward chunks unchanged, so consumers such as the
+    response cache can tell a complete answer from one cut short by an idle
+    timeout, an error or a dropped connection, which end in a plain
+    DONE_EVENT.
+    """
+
+    __slots__ = ()
+
+
+COMPLETED_EVENT = CompletionEvent(DONE_EVENT)
+
+
+def is_completion(chunk) -> bool:
+    """Whether a stream chunk marks a response the upstream finished normally."""
+    return isinstance(chunk, CompletionEvent)
+
+
+def encode_json_string(text: str) -> bytes:
+    """Escape a string as a JSON string literal, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(text)
+    return json.dumps(text).encode("utf-8")
+
+
+def encode_event(data) -> bytes:
+    """Encode an arbitrary JSON payload as a single SSE data event."""
+    if orjson is not None:
+        return b"data: " + orjson.dumps(data) + b"\n\n"
+    return b"data: " + json.dumps(data).encode("utf-8") + b"\n\n"
+
+
+def encode_comment(text: str) -> bytes:
+    """Encode an SSE comment line (used for keepalives)."""
+    return f": {text}\n\n".encode("utf-8")
+
+
+class StreamingChunkEncoder:
+    """
+    Encoder for OpenAI-compatible `chat.completion.chunk` events.
+
+    The id, created timestamp and model of a chunk never change within a
+    stream, so the invariant prefix and suffix of each event are rendered once
+    per stream. Per token only the delta content is escaped and spliced in,
+    and events are emitted as bytes ready to be written to the socket.
+    """
+
+    def __init__(self, message_id: str, model: str, created: int):
+        prefix = (
+            b'data: {"id":' + encode_json_string(message_id)
+            + b',"object":"chat.completion.chunk","created":' + str(int(created)).encode("ascii")
+            + b',"model":' + encode_json_string(model)
+            + b',"choices":[{"index":0,"delta":'
+        )
+        self._content_prefix = prefix + b'{"content":'
+        self._content_suffix = b'},"finish_reason":null}]}\n\n'
+        self._role_event = prefix + b'{"role":"assistant"},"finish_reason":null}]}\n\n'
+        self._finish_prefix = prefix + b'{},"finish_reason":'
+        self._finish_suffix = b'}]}\n\n'
+
+    def role(self) -> bytes:
+        """Initial event announcing the assistant role."""
+        return self._role_event
+
+    def content(self, text: str) -> bytes:
+        """Event carrying a content delta."""
+        return self._content_prefix + encode_json_string(text) + self._content_suffix
+
+    def finish(self, finish_reason: Optional[str] = "stop") -> bytes:
+        """Final event with an empty delta and the finish reason."""
+        reason = encode_json_string(finish_reason) if finish_reason is not None else b"null"
+        return self._finish_prefix + reason + self._finish_suffix
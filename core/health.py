@@ -0,0 +1,202 @@
+import logging
+import asyncio
+import time
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    The breaker opens after `failure_threshold` consecutive failures and rejects
+    requests until `recovery_timeout` seconds have passed. It then lets a single
+    trial request through (half-open) and closes again on the first success.
+    All checks are O(1) so they can be consulted on every request.
+    """
+
+    def __init__(self, failure_threshold: int = 3, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_started_at = 0.0
+        self.last_success = 0.0
+        self.last_failure = 0.0
+        self.last_error: Optional[str] = None
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent to the provider."""
+        if self.state == CLOSED:
+            return True
+
+        now = time.time()
+        if self.state == OPEN:
+            if now - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = HALF_OPEN
+            self.trial_started_at = now
+            return True
+
+        # Half-open: only one trial at a time, unless the trial never reported back
+        if now - self.trial_started_at >= self.recovery_timeout:
+            self.trial_started_at = now
+            return True
+        return False
+
+    def is_available(self) -> bool:
+        """Return True unless the breaker is open and still cooling down."""
+        if self.state == OPEN:
+            return time.time() - self.opened_at >= self.recovery_timeout
+        return True
+
+    def record_success(self):
+        """Record a successful request or probe."""
+        if self.state != CLOSED:
+            logger.info("Circuit closed after successful request")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.last_success = time.time()
+        self.last_error = None
+
+    def record_failure(self, error: Optional[str] = None):
+        """Record a failed request or probe."""
+        now = time.time()
+        self.consecutive_failures += 1
+        self.last_failure = now
+        self.last_error = error
+
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failures: {error}")
+            self.state = OPEN
+            self.opened_at = now
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the breaker state for status endpoints."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "last_success": self.last_success or None,
+            "last_failure": self.last_failure or None,
+            "last_error": self.last_error
+        }
+
+
+class HealthMonitor:
+    """
+    Background health monitor for all providers.
+
+    Each provider registers an async probe that is run on an interval. Real
+    request outcomes are reported as passive signals through `record_success`
+    and `record_failure`, so the breaker reacts between probes as well.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.interval = config.get("health_check_interval", 30)
+        self.probe_timeout = config.get("health_check_timeout", 5.0)
+        self.failure_threshold = config.get("failure_threshold", 3)
+        self.recovery_timeout = config.get("recovery_timeout", 30.0)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._probes: Dict[str, Callable[[], Awaitable[bool]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.last_probe: Dict[str, float] = {}
+
+    def register(self, provider: str, probe: Callable[[], Awaitable[bool]]):
+        """Register a provider and the async probe used to check it."""
+        self._probes[provider] = probe
+        self.breakers.setdefault(provider, CircuitBreaker(self.failure_threshold, self.recovery_timeout))
+
+    def get_breaker(self, provider: str) -> Optional[CircuitBreaker]:
+        return self.breakers.get(provider)
+
+    def is_available(self, provider: str) -> bool:
+        """O(1) check used by routing; unknown providers are unavailable."""
+        breaker = self.breakers.get(provider)
+        return breaker is not None and breaker.is_available()
+
+    def allow_request(self, provider: str) -> bool:
+        """O(1) check used right before sending a request."""
+        breaker = self.breakers.get(provider)
+        return breaker is None or breaker.allow_request()
+
+    def record_success(self, provider: str):
+        breaker = self.breakers.get(provider)
+        if breaker is not None:
+            breaker.record_success()
+
+    def record_failure(self, provider: str, error: Optional[str] = None):
+        breaker = self.breakers.get(provider)
+        if breaker is not None:
+            breaker.record_failure(error)
+
+    async def probe(self, provider: str) -> bool:
+        """Run the registered probe for a provider and update its breaker."""
+        probe = self._probes.get(provider)
+        if probe is None:
+            return False
+
+        self.last_probe[provider] = time.time()
+        try:
+            healthy = await asyncio.wait_for(probe(), timeout=self.probe_timeout)
+        except asyncio.TimeoutError:
+            healthy = False
+            error = "Health probe timed out"
+        except Exception as e:
+            healthy = False
+            error = f"Health probe failed: {str(e)}"
+        else:
+            error = None if healthy else "Health probe failed"
+
+        if healthy:
+            self.record_success(provider)
+        else:
+            self.record_failure(provider, error)
+            logger.debug(f"{provider} health probe failed: {error}")
+        return healthy
+
+    async def probe_all(self):
+        """Probe all registered providers concurrently."""
+        if self._probes:
+            await asyncio.gather(*(self.probe(provider) for provider in self._probes))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Health monitor error: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background probe loop on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Health monitor started (interval {self.interval}s)")
+
+    async def stop(self):
+        """Stop the background probe loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Return breaker state for all providers."""
+        return {
+            provider: dict(breaker.to_dict(), last_probe=self.last_probe.get(provider))
+            for provider, breaker in self.breakers.items()
+        }
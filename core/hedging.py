@@ -0,0 +1,242 @@
+import logging
+import asyncio
+import math
+import re
+import time
+from collections import deque
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable, AsyncGenerator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEDGING_SETTINGS = {
+    "enabled": False,  # a hedge sends the request twice, which a paid provider bills twice
+    "percentile": 0.95,  # TTFT percentile of the primary after which the backup is started
+    "multiplier": 1.0,
+    "initial_delay": 2.0,  # seconds, used until `min_samples` first tokens were observed
+    "min_delay": 0.25,
+    "max_delay": 10.0,
+    "min_samples": 20,
+    "window": 200,  # recent TTFT samples kept per provider and model
+    "models": []  # requested model names to hedge; empty hedges every streamed request
+}
+
+# A content delta with at least one character, in an OpenAI SSE event
+CONTENT_RE = re.compile(rb'"content"\s*:\s*"(?!")')
+
+# Outcomes of a contender's wait for its first token
+TOKEN = "token"
+ERROR = "error"
+ENDED = "ended"
+
+# Opens a backup stream: (provider, model, generator), or None when there is nothing to hedge with
+BackupFactory = Callable[[], Awaitable[Optional[Tuple[str, str, AsyncGenerator]]]]
+
+
+def classify_event(chunk) -> Optional[str]:
+    """TOKEN for an event carrying generated text, ERROR for an error event, None otherwise."""
+    data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+    if not isinstance(data, bytes):
+        return None
+    if CONTENT_RE.search(data):
+        return TOKEN
+    if b'"error"' in data:
+        return ERROR
+    return None
+
+
+class TTFTTracker:
+    """Sliding window of time-to-first-token samples per provider and model."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], deque] = {}
+
+    def record(self, provider: str, model: str, seconds: float):
+        samples = self._samples.get((provider, model))
+        if samples is None:
+            samples = self._samples[(provider, model)] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def count(self, provider: str, model: str) -> int:
+        return len(self._samples.get((provider, model), ()))
+
+    def percentile(self, provider: str, model: str, fraction: float) -> Optional[float]:
+        samples = self._samples.get((provider, model))
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            f"{provider}/{model}": {
+                "samples": len(samples),
+                "p50": round(self.percentile(provider, model, 0.5), 3),
+                "p95": round(self.percentile(provider, model, 0.95), 3),
+                "p99": round(self.percentile(provider, model, 0.99), 3)
+            }
+            for (provider, model), samples in self._samples.items() if samples
+        }
+
+
+class _Contender:
+    """One upstream stream racing for the first token."""
+
+    def __init__(self, provider: str, model: str, generator: AsyncGenerator):
+        self.provider = provider
+        self.model = model
+        self.generator = generator
+        self.buffer: List[Any] = []
+        self.started = time.monotonic()
+        self.ttft: Optional[float] = None
+        self.task = asyncio.ensure_future(self._until_first_token())
+
+    async def _until_first_token(self) -> str:
+        while True:
+            try:
+                chunk = await self.generator.__anext__()
+            except StopAsyncIteration:
+                return ENDED
+            self.buffer.append(chunk)
+            kind = classify_event(chunk)
+            if kind == TOKEN:
+                self.ttft = time.monotonic() - self.started
+                return TOKEN
+            if kind == ERROR:
+                return ERROR
+
+    @property
+    def outcome(self) -> Optional[str]:
+        if not self.task.done() or self.task.cancelled():
+            return None
+        return ERROR if self.task.exception() is not None else self.task.result()
+
+    async def close(self):
+        """Abandon the stream; closing the generator aborts the upstream generation."""
+        if not self.task.done():
+            self.task.cancel()
+        try:
+            await self.task
+        except BaseException:
+            pass
+        try:
+            await self.generator.aclose()
+        except Exception:
+            pass
+
+
+class HedgingPolicy:
+    """
+    Hedged streaming for latency-critical completions.
+
+    A streamed request that has not produced its first token after the hedge
+    delay is sent again to a backup provider (the router picks the next
+    provider in `provider_priority` that serves the model and has a free
+    admission slot). Whichever stream produces text first is forwarded, the
+    other is closed, which cancels its upstream generation. A primary that
+    fails before its first token is replaced by the backup right away.
+
+    The delay is learned per provider and model: a percentile of recently
+    observed time-to-first-token, so only the slow tail gets hedged. TTFT is
+    measured on every routed stream, hedged or not. A primary that loses a
+    race contributes the time it had waited, a lower bound of its real TTFT,
+    which errs towards hedging sooner.
+
+    Configured by the "hedging" section of config.json and off by default:
+    set "enabled" to true and list the latency-critical models (for example
+    the one Cursor uses for autocomplete) in "models".
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        settings = dict(DEFAULT_HEDGING_SETTINGS)
+        settings.update(config or {})
+        self.enabled = settings["enabled"]
+        self.percentile = settings["percentile"]
+        self.multiplier = settings["multiplier"]
+        self.initial_delay = settings["initial_delay"]
+        self.min_delay = settings["min_delay"]
+        self.max_delay = settings["max_delay"]
+        self.min_samples = settings["min_samples"]
+        self.models = set(settings["models"])
+        self.ttft = TTFTTracker(settings["window"])
+        self.stats = {
+            "streams": 0,
+            "hedged": 0,
+            "backup_wins": 0,
+            "primary_failures": 0,
+            "no_backup": 0
+        }
+
+    def applies_to(self, requested_model: str) -> bool:
+        return self.enabled and (not self.models or requested_model in self.models)
+
+    def delay(self, provider: str, model: str) -> float:
+        """Seconds to wait for the primary's first token before hedging."""
+        if self.ttft.count(provider, model) < self.min_samples:
+            return self.initial_delay
+        observed = self.ttft.percentile(provider, model, self.percentile) * self.multiplier
+        return min(self.max_delay, max(self.min_delay, observed))
+
+    async def stream(self, provider: str, model: str, generator: AsyncGenerator,
+                     backup: Optional[BackupFactory] = None) -> AsyncGenerator:
+        """Forward `generator`, racing it against a backup stream once the hedge delay has passed."""
+        self.stats["streams"] += 1
+        primary = _Contender(provider, model, generator)
+        contenders = [primary]
+        winner = None
+        try:
+            delay = self.delay(provider, model)
+            await asyncio.wait({primary.task}, timeout=delay if backup is not None else None)
+            if primary.outcome != TOKEN and backup is not None:
+                if primary.outcome is not None:
+                    self.stats["primary_failures"] += 1
+                    logger.info(f"Primary stream {provider}/{model} failed before its first token, hedging")
+                started = await backup()
+                if started is None:
+                    self.stats["no_backup"] += 1
+                else:
+                    self.stats["hedged"] += 1
+                    logger.info(f"No first token from {provider}/{model} after {delay:.2f}s, "
+                                f"hedging with {started[0]}/{started[1]}")
+                    contenders.append(_Contender(*started))
+            winner = await self._race(contenders)
+
+            for contender in contenders:
+                if contender is not winner:
+                    if contender is primary and primary.ttft is None:
+                        # Censored sample: the primary had not answered after this long
+                        self.ttft.record(provider, model, time.monotonic() - primary.started)
+                    await contender.close()
+            if winner.ttft is not None:
+                self.ttft.record(winner.provider, winner.model, winner.ttft)
+            if winner is not primary:
+                self.stats["backup_wins"] += 1
+
+            for chunk in winner.buffer:
+                yield chunk
+            winner.buffer = []
+            async for chunk in winner.generator:
+                yield chunk
+        finally:
+            for contender in contenders:
+                await contender.close()
+
+    @staticmethod
+    async def _race(contenders: List[_Contender]) -> _Contender:
+        """First contender to produce a token; the primary if none does."""
+        pending = {contender.task for contender in contenders}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for contender in contenders:
+                if contender.task in done and contender.outcome == TOKEN:
+                    return contender
+        # Nobody produced text: forward the primary's error or empty stream
+        return contenders[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            delays={key: round(self.delay(*key.split("/", 1)), 3) for key in self.ttft.get_stats()},
+            ttft=self.ttft.get_stats()
+        )
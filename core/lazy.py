@@ -0,0 +1,183 @@
+import logging
+import asyncio
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Resources warmed in the background once the server is up, in registration order
+_resources: List["LazyResource"] = []
+
+
+class LazyResource(Generic[T]):
+    """
+    A heavy resource built on first use instead of at import time.
+
+    `get()` builds the value once (thread-safe) and returns it afterwards.
+    Resources can also be warmed in a background thread by `warm_up()` after
+    the server has started, so the first request rarely pays for the load.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T], warm: bool = True):
+        self.name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.load_time: Optional[float] = None
+        self.error: Optional[str] = None
+        if warm:
+            _resources.append(self)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> T:
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                started = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                finally:
+                    self.load_time = time.perf_counter() - started
+                    startup_profiler.record(f"load {self.name}", self.load_time)
+                self._loaded = True
+        return self._value
+
+
+async def warm_up(resources: Optional[List[LazyResource]] = None):
+    """Load registered resources one by one in a worker thread without blocking the event loop."""
+    for resource in list(resources if resources is not None else _resources):
+        if resource.loaded:
+            continue
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, resource.get)
+            logger.info(f"Warmed up {resource.name} in {resource.load_time:.3f}s")
+        except Exception as e:
+            logger.warning(f"Warm-up of {resource.name} failed, it will load on first use: {str(e)}")
+
+
+class _ImportTimer:
+    """sys.meta_path hook timing every module import, excluding time spent in nested imports."""
+
+    def __init__(self, profiler: "StartupProfiler"):
+        self.profiler = profiler
+        self._stack: List[List[float]] = []
+
+    def find_spec(self, fullname, path=None, target=None):
+        # Let the real finders locate the module, then time its execution
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self, fullname)
+                return spec
+        return None
+
+    def run(self, fullname: str, call: Callable[[], Any]):
+        started = time.perf_counter()
+        self._stack.append([0.0])
+        try:
+            return call()
+        finally:
+            nested = self._stack.pop()[0]
+            total = time.perf_counter() - started
+            if self._stack:
+                self._stack[-1][0] += total
+            self.profiler.imports.append((fullname, total - nested, total))
+
+
+class _TimedLoader:
+    def __init__(self, loader, timer: _ImportTimer, fullname: str):
+        self._loader = loader
+        self._timer = timer
+        self._fullname = fullname
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        return self._timer.run(self._fullname, lambda: self._loader.exec_module(module))
+
+
+class StartupProfiler:
+    """
+    Collects import and initialization timings for `--profile-startup`.
+
+    Disabled (and free) unless `install()` is called, which should happen
+    before the heavy imports it is meant to measure.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.imports: List[Tuple[str, float, float]] = []
+        self.phases: List[Tuple[str, float]] = []
+        self._timer: Optional[_ImportTimer] = None
+
+    def install(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started = time.perf_counter()
+        self._timer = _ImportTimer(self)
+        sys.meta_path.insert(0, self._timer)
+
+    def uninstall(self):
+        if self._timer in sys.meta_path:
+            sys.meta_path.remove(self._timer)
+
+    def record(self, name: str, seconds: float):
+        if self.enabled:
+            self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block of initialization work."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def report(self, top: int = 25) -> str:
+        """Render the per-module import and per-phase init times."""
+        lines = [f"Startup profile ({time.perf_counter() - self.started:.3f}s since profiling started)", ""]
+
+        by_package: Dict[str, float] = {}
+        for name, self_time, _ in self.imports:
+            package = name.split(".")[0]
+            by_package[package] = by_package.get(package, 0.0) + self_time
+        lines.append(f"Imports by top-level package ({sum(by_package.values()):.3f}s total):")
+        for package, seconds in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+            lines.append(f"  {seconds * 1000:9.1f} ms  {package}")
+
+        lines.append("")
+        lines.append("Slowest modules (self / cumulative):")
+        for name, self_time, total in sorted(self.imports, key=lambda item: item[1], reverse=True)[:top]:
+            lines.append(f"  {self_time * 1000:9.1f} ms  {total * 1000:9.1f} ms  {name}")
+
+        lines.append("")
+        lines.append("Initialization:")
+        for name, seconds in self.phases:
+            lines.append(f"  {seconds * 1000:9.1f} ms  {name}")
+        return "\n".join(lines)
+
+
+startup_profiler = StartupProfiler()
@@ -0,0 +1,250 @@
+import logging
+import asyncio
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple, Union
+
+import httpx
+
+from .tokens import token_counter, MESSAGE_OVERHEAD_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Long-context strategies
+STRATEGY_SLIDING_WINDOW = "sliding_window"  # walk the history in overlapping windows, carrying notes forward
+STRATEGY_MAP_REDUCE = "map_reduce"  # summarize history chunks in parallel, answer from the summaries
+STRATEGY_REFUSE = "refuse"  # reject requests that don't fit with 413
+STRATEGIES = (STRATEGY_SLIDING_WINDOW, STRATEGY_MAP_REDUCE, STRATEGY_REFUSE)
+
+DEFAULT_LONG_CONTEXT_SETTINGS = {
+    "strategy": STRATEGY_SLIDING_WINDOW,
+    "max_tokens_per_chunk": 8000,  # prompt tokens sent in any single upstream call
+    "chunk_overlap": 1,  # messages repeated at the start of the next window
+    "summary_tokens": 512,  # completion budget of each intermediate summary
+    "max_parallel": 4  # concurrent map calls in map_reduce
+}
+
+# Tokens reserved for the "[part i/n]" label of a split message
+PART_LABEL_TOKENS = 12
+
+SUMMARIZE_PROMPT = (
+    "Summarize the conversation excerpt above for a later turn that will not see it. "
+    "Keep every fact, decision, file name, code identifier and open question; drop pleasantries. "
+    "Reply with the notes only."
+)
+CONTINUE_PROMPT = (
+    "Update the notes with the conversation excerpt above. Keep everything still relevant from "
+    "the earlier notes and add what is new. Reply with the notes only."
+)
+NOTES_HEADER = "Notes on the earlier part of this conversation, which was too long to include in full:\n\n"
+
+Send = Callable[[Dict[str, Any]], Awaitable[Union[httpx.Response, Dict[str, Any]]]]
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """Text content of a message, including the text parts of multi-part content."""
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for item in content:
+            if isinstance(item, dict) and item.get("type") == "text":
+                parts.append(item.get("text", ""))
+            elif isinstance(item, str):
+                parts.append(item)
+        return " ".join(parts)
+    return ""
+
+
+def response_text(response: Union[httpx.Response, Dict[str, Any]]) -> str:
+    """Assistant text of a non-streaming response, in OpenAI or Ollama format."""
+    data = response.json() if isinstance(response, httpx.Response) else response
+    choices = data.get("choices")
+    if choices:
+        return (choices[0].get("message") or {}).get("content") or ""
+    return (data.get("message") or {}).get("content") or ""
+
+
+class LongContextProcessor:
+    """
+    Fits conversations that exceed a provider's context budget.
+
+    The request is split into its system messages, the history, and the
+    final message the model has to answer. If
+    everything fits in `max_tokens_per_chunk` prompt tokens it is sent as-is.
+    Otherwise the history is cut into token-bounded chunks (oversized
+    messages are split themselves) and the configured strategy decides:
+
+    - sliding_window: windows overlapping by `chunk_overlap` messages are
+      walked in order, each call updating running notes; the last window is
+      sent together with the notes and the final turn.
+    - map_reduce: every chunk is summarized concurrently, then one call
+      answers the final turn from the combined summaries.
+    - refuse: the request is rejected with 413.
+
+    Only the final call uses the caller's streaming setting.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        settings = dict(DEFAULT_LONG_CONTEXT_SETTINGS)
+        settings.update(config or {})
+        if settings["strategy"] not in STRATEGIES:
+            logger.warning(f"Unknown long-context strategy '{settings['strategy']}', using {STRATEGY_SLIDING_WINDOW}")
+            settings["strategy"] = STRATEGY_SLIDING_WINDOW
+        self.strategy = settings["strategy"]
+        self.max_tokens_per_chunk = settings["max_tokens_per_chunk"]
+        self.chunk_overlap = max(0, settings["chunk_overlap"])
+        self.summary_tokens = settings["summary_tokens"]
+        self.max_parallel = max(1, settings["max_parallel"])
+
+    def fits(self, messages: List[Dict[str, Any]], model: Optional[str] = None) -> bool:
+        return token_counter.count_messages(messages, model) <= self.max_tokens_per_chunk
+
+    @staticmethod
+    def split_conversation(messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split messages into (system messages, history, final turn)."""
+        system = [message for message in messages if message.get("role") == "system"]
+        others = [message for message in messages if message.get("role") != "system"]
+        return system, others[:-1], others[-1:]
+
+    def chunk_history(self, history: List[Dict[str, Any]], budget: int,
+                      model: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """Cut the history into chunks of at most `budget` tokens, splitting oversized messages."""
+        chunks = []
+        current: List[Dict[str, Any]] = []
+        current_tokens = 0
+        for message in history:
+            tokens = token_counter.count_message(message, model)
+            pieces = [(message, tokens)]
+            if tokens > budget:
+                # Leave room for the "[part i/n]" label
+                parts = token_counter.split_text(message_text(message),
+                                                 budget - MESSAGE_OVERHEAD_TOKENS - PART_LABEL_TOKENS, model)
+                pieces = []
+                for index, part in enumerate(parts):
+                    piece = dict(message, content=f"[part {index + 1}/{len(parts)}] {part}")
+                    pieces.append((piece, token_counter.count_message(piece, model)))
+            for piece, piece_tokens in pieces:
+                if current and current_tokens + piece_tokens > budget:
+                    chunks.append(current)
+                    current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += piece_tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _budget(self, *fixed: List[Dict[str, Any]], reserve: int = 0, model: Optional[str] = None) -> int:
+        used = sum(token_counter.count_message(message, model) for messages in fixed for message in messages)
+        return self.max_tokens_per_chunk - used - reserve
+
+    @staticmethod
+    def _notes_message(notes: str) -> Dict[str, Any]:
+        return {"role": "system", "content": NOTES_HEADER + notes}
+
+    def _too_large(self, total_tokens: int, detail: str = "") -> Dict[str, Any]:
+        message = f"Request of ~{total_tokens} tokens exceeds the context budget of {self.max_tokens_per_chunk} tokens"
+        return {"error": {"message": message + (f" ({detail})" if detail else ""), "code": 413,
+                          "type": "context_length_exceeded"}}
+
+    async def process(self, request_data: Dict[str, Any], send: Send) -> Union[httpx.Response, Dict[str, Any]]:
+        """Send a request through the configured strategy; `send` performs one upstream call."""
+        messages = request_data.get("messages", [])
+        model = request_data.get("model")
+        total_tokens = token_counter.count_messages(messages, model)
+        if total_tokens <= self.max_tokens_per_chunk:
+            return await send(request_data)
+        if self.strategy == STRATEGY_REFUSE:
+            logger.warning(f"Refusing request of ~{total_tokens} tokens (budget {self.max_tokens_per_chunk})")
+            return self._too_large(total_tokens)
+
+        system, history, final_turn = self.split_conversation(messages)
+        if self.strategy == STRATEGY_MAP_REDUCE:
+            return await self._map_reduce(request_data, system, history, final_turn, total_tokens, model, send)
+        return await self._sliding_window(request_data, system, history, final_turn, total_tokens, model, send)
+
+    def _summary_request(self, request_data: Dict[str, Any], messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return dict(request_data, messages=messages, stream=False, max_tokens=self.summary_tokens)
+
+    async def _summarize(self, request_data: Dict[str, Any], messages: List[Dict[str, Any]], send: Send) -> Union[str, Dict[str, Any]]:
+        response = await send(self._summary_request(request_data, messages))
+        if isinstance(response, dict) and "error" in response:
+            return response
+        try:
+            return response_text(response)
+        except (ValueError, AttributeError, KeyError, IndexError) as e:
+            return {"error": {"message": f"Could not read summary response: {str(e)}", "code": 502}}
+
+    async def _sliding_window(self, request_data, system, history, final_turn, total_tokens, model, send: Send):
+        # Every window must leave room for the notes, the instruction and the final turn
+        notes_budget = self.summary_tokens + MESSAGE_OVERHEAD_TOKENS + token_counter.count_text(NOTES_HEADER, model)
+        instruction = {"role": "user", "content": CONTINUE_PROMPT}
+        budget = self._budget(system, final_turn, [instruction], reserve=notes_budget, model=model)
+        if budget <= MESSAGE_OVERHEAD_TOKENS * 2:
+            return self._too_large(total_tokens, "system prompt and final message leave no room for history")
+
+        # Part of every window is kept free for the messages repeated from the previous one
+        overlap_budget = budget // 4 if self.chunk_overlap else 0
+        chunks = self.chunk_history(history, budget - overlap_budget, model)
+        logger.info(f"Sliding window over {len(chunks)} windows (~{total_tokens} tokens, overlap {self.chunk_overlap})")
+
+        notes = None
+        previous: List[Dict[str, Any]] = []
+        for index, chunk in enumerate(chunks):
+            window = self._with_overlap(previous, chunk, budget, model)
+            context = list(system) + ([self._notes_message(notes)] if notes else [])
+            if index == len(chunks) - 1:
+                return await send(dict(request_data, messages=context + window + final_turn))
+            prompt = CONTINUE_PROMPT if notes else SUMMARIZE_PROMPT
+            result = await self._summarize(request_data, context + window + [{"role": "user", "content": prompt}], send)
+            if isinstance(result, dict):
+                return result
+            notes = result
+            previous = chunk
+        return await send(dict(request_data, messages=list(system) + final_turn))
+
+    def _with_overlap(self, previous: List[Dict[str, Any]], chunk: List[Dict[str, Any]], budget: int,
+                      model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Prefix a chunk with up to `chunk_overlap` trailing messages of the previous one, within budget."""
+        used = sum(token_counter.count_message(message, model) for message in chunk)
+        overlap: List[Dict[str, Any]] = []
+        for message in reversed(previous[-self.chunk_overlap:] if self.chunk_overlap else []):
+            tokens = token_counter.count_message(message, model)
+            if used + tokens > budget:
+                break
+            overlap.insert(0, message)
+            used += tokens
+        return overlap + chunk
+
+    async def _map_reduce(self, request_data, system, history, final_turn, total_tokens, model, send: Send):
+        instruction = {"role": "user", "content": SUMMARIZE_PROMPT}
+        budget = self._budget(system, [instruction], model=model)
+        final_budget = (self._budget(system, final_turn, model=model)
+                        - token_counter.count_text(NOTES_HEADER, model) - MESSAGE_OVERHEAD_TOKENS)
+        if budget <= MESSAGE_OVERHEAD_TOKENS * 2 or final_budget <= 0:
+            return self._too_large(total_tokens, "system prompt and final message leave no room for history")
+
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def summarize(chunk):
+            async with semaphore:
+                return await self._summarize(request_data, list(system) + chunk + [instruction], send)
+
+        parts = history
+        level = 0
+        while True:
+            chunks = self.chunk_history(parts, budget, model)
+            logger.info(f"Map-reduce level {level}: {len(chunks)} chunks (~{total_tokens} tokens, {self.max_parallel} in parallel)")
+            summaries = await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+            for summary in summaries:
+                if isinstance(summary, dict):
+                    return summary
+            notes = "\n\n".join(f"Part {index + 1}:\n{summary}" for index, summary in enumerate(summaries))
+            if token_counter.count_text(notes, model) <= final_budget:
+                break
+            if len(summaries) == 1 or (level > 0 and len(summaries) >= len(parts)):
+                return self._too_large(total_tokens, "summaries do not fit the final call")
+            # Too many summaries for the final call: reduce them again
+            parts = [{"role": "user", "content": f"Part {index + 1}:\n{summary}"} for index, summary in enumerate(summaries)]
+            level += 1
+
+        return await send(dict(request_data, messages=list(system) + [self._notes_message(notes)] + final_turn))
@@ -0,0 +1,107 @@
+import logging
+from typing import Dict, Any, Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Defaults applied to every provider unless overridden in config.json
+DEFAULT_POOL_SETTINGS = {
+    "max_connections": 64,
+    "max_keepalive_connections": 32,
+    "keepalive_expiry": 60.0,
+    "connect_timeout": 10.0,
+    "read_timeout": 180.0,
+    "write_timeout": 10.0,
+    "pool_timeout": 30.0
+}
+
+# Provider specific defaults, local servers rarely need huge pools
+PROVIDER_POOL_DEFAULTS = {
+    "ollama": {"max_connections": 32, "max_keepalive_connections": 16},
+    "llamacpp": {"max_connections": 32, "max_keepalive_connections": 16},
+    "openrouter": {"max_connections": 128, "max_keepalive_connections": 64}
+}
+
+
+class ConnectionPoolRegistry:
+    """
+    Registry of long-lived, provider-scoped HTTP connection pools.
+
+    One httpx.AsyncClient is kept per provider and shared by the router, the
+    provider clients and the request handlers. Pool sizes are read from the
+    optional "connection_pool" block of each provider section in config.json.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config or {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get_pool_settings(self, provider: str) -> Dict[str, Any]:
+        """Return the effective pool settings for a provider."""
+        settings = dict(DEFAULT_POOL_SETTINGS)
+        settings.update(PROVIDER_POOL_DEFAULTS.get(provider, {}))
+        settings.update(self.config.get(provider, {}).get("connection_pool", {}))
+        return settings
+
+    def get_timeout(self, provider: str, read: Optional[float] = None) -> httpx.Timeout:
+        """Build a timeout for a provider, optionally overriding the read timeout."""
+        settings = self.get_pool_settings(provider)
+        return httpx.Timeout(
+            connect=settings["connect_timeout"],
+            read=read if read is not None else settings["read_timeout"],
+            write=settings["write_timeout"],
+            pool=settings["pool_timeout"]
+        )
+
+    def create_client(self, provider: str) -> httpx.AsyncClient:
+        """Create a new (unregistered) client using the provider's pool settings."""
+        settings = self.get_pool_settings(provider)
+        logger.info(
+            f"Creating connection pool for {provider}: "
+            f"max_connections={settings['max_connections']}, "
+            f"max_keepalive_connections={settings['max_keepalive_connections']}"
+        )
+        return httpx.AsyncClient(
+            timeout=self.get_timeout(provider),
+            limits=httpx.Limits(
+                max_connections=settings["max_connections"],
+                max_keepalive_connections=settings["max_keepalive_connections"],
+                keepalive_expiry=settings["keepalive_expiry"]
+            )
+        )
+
+    def get_client(self, provider: str) -> httpx.AsyncClient:
+        """Get the shared client for a provider, creating it on first use."""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self.create_client(provider)
+            self._clients[provider] = client
+        return client
+
+    def open(self, providers) -> None:
+        """Eagerly create pools for the given providers (called at app startup)."""
+        for provider in providers:
+            self.get_client(provider)
+
+    async def aclose(self) -> None:
+        """Close every pool (called at app shutdown)."""
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for provider, client in clients:
+            if not client.is_closed:
+                try:
+                    await client.aclose()
+                    logger.info(f"Closed connection pool for {provider}")
+                except Exception as e:
+                    logger.error(f"Error closing connection pool for {provider}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return configured limits and open state for each pool."""
+        return {
+            provider: {
+                "open": not client.is_closed,
+                "max_connections": self.get_pool_settings(provider)["max_connections"],
+                "max_keepalive_connections": self.get_pool_settings(provider)["max_keepalive_connections"]
+            }
+            for provider, client in self._clients.items()
+        }
@@ -0,0 +1,287 @@
+import logging
+import asyncio
+import re
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESIDENCY_SETTINGS = {
+    "enabled": True,
+    "keep_alive": "30m",  # sent with every request unless the model has its own value
+    "model_keep_alive": {},  # Ollama model name -> keep_alive ("1h", seconds, -1 = forever)
+    "preload": [],  # models or mapping names kept warm: loaded at startup and after idle eviction
+    "poll_interval": 30,  # seconds between /api/ps polls
+    "cold_start_threshold": 0.5,  # load_duration (seconds) above which a request counts as a cold start
+    "load_timeout": 300
+}
+
+DURATION_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*$")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}
+
+
+def parse_keep_alive(value: Union[str, int, float, None]) -> Optional[float]:
+    """Seconds a keep_alive value keeps a model loaded; None for forever or unparseable values."""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = DURATION_RE.match(str(value or ""))
+        if not match:
+            return None
+        seconds = float(match.group(1)) * DURATION_UNITS[match.group(2)]
+    return None if seconds < 0 else seconds
+
+
+def _parse_expiry(value: Optional[str]) -> Optional[float]:
+    """Unix time of an /api/ps expires_at (RFC 3339, possibly with nanoseconds)."""
+    if not value:
+        return None
+    value = re.sub(r"(\.\d{6})\d+", r"\1", value.replace("Z", "+00:00"))
+    try:
+        expires = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    # Ollama reports a far-future date for keep_alive -1
+    return None if expires.year > 2100 else expires.timestamp()
+
+
+class _ModelStats:
+    def __init__(self):
+        self.requests = 0
+        self.cold_starts = 0
+        self.preloads = 0
+        self.load_time = 0.0
+        self.last_load_time: Optional[float] = None
+
+    def record_load(self, seconds: float, preload: bool = False):
+        if preload:
+            self.preloads += 1
+        else:
+            self.cold_starts += 1
+        self.load_time += seconds
+        self.last_load_time = seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        loads = self.cold_starts + self.preloads
+        return {
+            "requests": self.requests,
+            "cold_starts": self.cold_starts,
+            "preloads": self.preloads,
+            "avg_load_time": round(self.load_time / loads, 3) if loads else None,
+            "last_load_time": round(self.last_load_time, 3) if self.last_load_time is not None else None
+        }
+
+
+class OllamaResidencyManager:
+    """
+    Keeps the models Cursor switches between loaded in Ollama.
+
+    Ollama unloads a model five minutes after its last request, or earlier
+    when another model needs the memory, and reloading multi-GB weights takes
+    seconds. The manager:
+
+    - sends `keep_alive` with every request (per model or the default);
+    - polls `/api/ps` to know which models are resident and until when;
+    - loads the `preload` models at startup, and again when one of them was
+      dropped by its idle timer (not when memory pressure evicted it, which
+      would only make Ollama thrash);
+    - lets routing pick a resident model when a mapping lists alternatives;
+    - counts cold starts and load times per model from the `load_duration`
+      Ollama reports.
+
+    Configured by the "residency" section of the "ollama" config.
+    """
+
+    def __init__(self, endpoint: str, config: Optional[Dict[str, Any]] = None,
+                 get_http_client: Optional[Callable[[], httpx.AsyncClient]] = None):
+        settings = dict(DEFAULT_RESIDENCY_SETTINGS)
+        settings.update(config or {})
+        self.endpoint = endpoint.rstrip('/')
+        self.enabled = settings["enabled"]
+        self.keep_alive = settings["keep_alive"]
+        self.model_keep_alive: Dict[str, Any] = settings["model_keep_alive"]
+        self.preload_models: List[str] = list(settings["preload"])
+        self.poll_interval = settings["poll_interval"]
+        self.cold_start_threshold = settings["cold_start_threshold"]
+        self.load_timeout = settings["load_timeout"]
+        self._get_http_client = get_http_client
+        # Resident model name -> expiry (unix time, None = no expiry known)
+        self.resident: Dict[str, Optional[float]] = {}
+        self.version = 0
+        self.last_poll: Optional[float] = None
+        self.models: Dict[str, _ModelStats] = {}
+        self._resolve: Callable[[str], str] = lambda name: name
+        self._ready: Optional[Callable[[], Awaitable[Any]]] = None
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _stats(self, model: str) -> _ModelStats:
+        stats = self.models.get(model)
+        if stats is None:
+            stats = self.models[model] = _ModelStats()
+        return stats
+
+    def _set_resident(self, resident: Dict[str, Optional[float]]):
+        if set(resident) != set(self.resident):
+            # Routing memoizes model choices; a different resident set invalidates them
+            self.version += 1
+        self.resident = resident
+
+    def is_resident(self, model: str) -> bool:
+        return model in self.resident
+
+    def keep_alive_for(self, model: str) -> Any:
+        return self.model_keep_alive.get(model, self.keep_alive)
+
+    def choose(self, candidates: List[str]) -> Optional[str]:
+        """First resident candidate, otherwise the first candidate."""
+        if not candidates:
+            return None
+        if self.enabled:
+            for candidate in candidates:
+                if candidate in self.resident:
+                    return candidate
+        return candidates[0]
+
+    def apply(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Add keep_alive to an /api/chat payload and count the request."""
+        model = request_data.get("model")
+        if not self.enabled or not model:
+            return request_data
+        request_data.setdefault("keep_alive", self.keep_alive_for(model))
+        self._stats(model).requests += 1
+        return request_data
+
+    def record_response(self, model: str, data: Dict[str, Any]):
+        """Inspect a final /api/chat response for load time and mark the model resident."""
+        if not self.enabled or not model or not isinstance(data, dict):
+            return
+        load_duration = data.get("load_duration")
+        if load_duration:
+            seconds = load_duration / 1e9
+            if seconds >= self.cold_start_threshold:
+                self._stats(model).record_load(seconds)
+                logger.info(f"Cold start of Ollama model {model}: loaded in {seconds:.1f}s")
+        keep_alive = parse_keep_alive(self.keep_alive_for(model))
+        resident = dict(self.resident)
+        resident[model] = time.time() + keep_alive if keep_alive is not None else None
+        self._set_resident(resident)
+
+    async def refresh(self) -> Dict[str, Optional[float]]:
+        """Poll /api/ps for the models currently loaded."""
+        client = self._get_http_client()
+        response = await client.get(f"{self.endpoint}/api/ps", timeout=5.0)
+        response.raise_for_status()
+        resident = {}
+        for entry in response.json().get("models", []):
+            name = entry.get("name") or entry.get("model")
+            if name:
+                resident[name] = _parse_expiry(entry.get("expires_at"))
+        self.last_poll = time.time()
+        self._set_resident(resident)
+        return resident
+
+    async def preload(self, model: str) -> bool:
+        """Load a model with an empty request, without generating anything."""
+        task = self._loading.get(model)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._preload(model))
+            self._loading[model] = task
+            task.add_done_callback(lambda _: self._loading.pop(model, None))
+        return await asyncio.shield(task)
+
+    async def _preload(self, model: str) -> bool:
+        started = time.perf_counter()
+        try:
+            client = self._get_http_client()
+            response = await client.post(
+                f"{self.endpoint}/api/generate",
+                json={"model": model, "keep_alive": self.keep_alive_for(model)},
+                timeout=self.load_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Preloading Ollama model {model} failed: {str(e)}")
+            return False
+        if response.status_code != 200:
+            logger.warning(f"Preloading Ollama model {model} failed: HTTP {response.status_code}")
+            return False
+        seconds = time.perf_counter() - started
+        self._stats(model).record_load(seconds, preload=True)
+        keep_alive = parse_keep_alive(self.keep_alive_for(model))
+        self._set_resident(dict(self.resident, **{model: time.time() + keep_alive if keep_alive is not None else None}))
+        logger.info(f"Preloaded Ollama model {model} in {seconds:.1f}s")
+        return True
+
+    def hot_models(self) -> List[str]:
+        """Ollama model names of the preload list (mapping names resolved)."""
+        models = []
+        for name in self.preload_models:
+            model = self._resolve(name)
+            if model and model not in models:
+                models.append(model)
+        return models
+
+    async def _run(self):
+        if self._ready is not None:
+            # Preload names resolve against the model list, which is still empty right at startup
+            await self._ready()
+        # Hot models seen resident or preloaded at least once; the others are retried every poll
+        warmed = set()
+        while True:
+            try:
+                previous = dict(self.resident)
+                resident = await self.refresh()
+                now = time.time()
+                for model in self.hot_models():
+                    if model in resident:
+                        warmed.add(model)
+                        continue
+                    expiry = previous.get(model)
+                    # Load at startup, and after an idle timeout, but never fight memory-pressure eviction
+                    idle_evicted = model in previous and expiry is not None and now >= expiry
+                    if (model not in warmed or idle_evicted) and await self.preload(model):
+                        warmed.add(model)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"Ollama residency poll failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self, resolve: Optional[Callable[[str], str]] = None,
+              ready: Optional[Callable[[], Awaitable[Any]]] = None):
+        """
+        Start polling /api/ps and preloading on the running event loop.
+        `ready` is awaited before the first pass, so that `resolve` sees the fetched model list.
+        """
+        if resolve is not None:
+            self._resolve = resolve
+        if ready is not None:
+            self._ready = ready
+        if not self.enabled:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "resident": {
+                model: datetime.fromtimestamp(expiry).isoformat(timespec="seconds") if expiry else None
+                for model, expiry in self.resident.items()
+            },
+            "last_poll": self.last_poll,
+            "preload": self.hot_models(),
+            "models": {model: stats.to_dict() for model, stats in self.models.items()}
+        }
@@ -0,0 +1,68 @@
+from typing import Dict, Any, List, Optional, Callable
+
+
+class ModelIndex:
+    """
+    Precomputed lookup tables over a provider's model list.
+
+    Built once per catalogue refresh so model resolution on the request path
+    is a handful of dict lookups instead of repeated scans over every model.
+    Where several models match, the one listed first wins, which keeps the
+    results identical to the linear scans this replaces.
+    """
+
+    def __init__(self, models: List[Dict[str, Any]], normalize: Callable[[str], str]):
+        self.normalize = normalize
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_lower: Dict[str, str] = {}
+        self.by_normalized: Dict[str, str] = {}
+        self.ids: List[str] = []
+        # Trie over normalized ids; each node is [children, index of first model below it]
+        self._trie: list = [{}, None]
+
+        for model in models:
+            model_id = model.get("id")
+            if not model_id:
+                continue
+            self.ids.append(model_id)
+            self.by_id.setdefault(model_id, model)
+            self.by_lower.setdefault(model_id.lower(), model_id)
+            normalized = normalize(model_id)
+            self.by_normalized.setdefault(normalized, model_id)
+            self._insert(normalized, len(self.ids) - 1)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _insert(self, key: str, position: int):
+        node = self._trie
+        if node[1] is None:
+            node[1] = position
+        for char in key:
+            child = node[0].get(char)
+            if child is None:
+                child = node[0][char] = [{}, position]
+            node = child
+
+    def has(self, model_id: str) -> bool:
+        return model_id in self.by_id
+
+    def get(self, model_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(model_id)
+
+    def find_casefold(self, name: str) -> Optional[str]:
+        """Case-insensitive exact match."""
+        return self.by_lower.get(name.lower())
+
+    def find_normalized(self, name: str) -> Optional[str]:
+        """First model whose normalized id equals the normalized name."""
+        return self.by_normalized.get(self.normalize(name))
+
+    def find_prefix(self, name: str) -> Optional[str]:
+        """First model whose normalized id starts with the normalized name."""
+        node = self._trie
+        for char in self.normalize(name):
+            node = node[0].get(char)
+            if node is None:
+                return None
+        return self.ids[node[1]] if node[1] is not None else None
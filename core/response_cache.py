@@ -0,0 +1,305 @@
+import logging
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, List, AsyncGenerator
+
+from .handlers.base_response_handler import MODEL_FIELD_RE
+from .handlers.sse import is_completion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SETTINGS = {
+    "enabled": False,
+    "max_bytes": 64 * 1024 * 1024,
+    "max_entry_bytes": 4 * 1024 * 1024,
+    "ttl": 3600,
+    "disk_path": None,
+    "disk_max_bytes": 512 * 1024 * 1024
+}
+
+# Values of the X-Response-Cache request header
+CACHE_MODE_FORCE = "force"    # cache even if the request isn't deterministic
+CACHE_MODE_BYPASS = "bypass"  # neither read nor write the cache
+
+KIND_JSON = "json"
+KIND_SSE = "sse"
+
+
+def parse_cache_mode(value: Optional[str]) -> Optional[str]:
+    """Map an X-Response-Cache header value to a cache mode."""
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value in ("1", "true", "yes", "force", "use"):
+        return CACHE_MODE_FORCE
+    if value in ("0", "false", "no", "bypass", "no-store"):
+        return CACHE_MODE_BYPASS
+    return None
+
+
+class CacheEntry:
+    """A cached response body and what kind of response it was."""
+
+    __slots__ = ("kind", "body", "created")
+
+    def __init__(self, kind: str, body: bytes, created: Optional[float] = None):
+        self.kind = kind
+        self.body = body
+        self.created = created if created is not None else time.time()
+
+
+class ResponseCache:
+    """
+    Exact-match cache of chat completion responses.
+
+    Keys are a canonical hash of provider, resolved model, messages,
+    temperature, max_tokens, the other sampling parameters and whether the
+    response streams. Only
+    deterministic requests (temperature 0) are cached unless the client
+    forces it with the X-Response-Cache header. Entries live in an in-memory
+    LRU bounded by total bytes, with an optional on-disk tier whose reads and
+    writes run off the event loop. Cached streams are replayed as SSE in one
+    write instead of at generation speed.
+
+    Configured by the "response_cache" section of config.json (off by default).
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        settings = dict(DEFAULT_CACHE_SETTINGS)
+        settings.update(config or {})
+        self.enabled = settings["enabled"]
+        self.max_bytes = settings["max_bytes"]
+        self.max_entry_bytes = settings["max_entry_bytes"]
+        self.ttl = settings["ttl"]
+        self.disk_max_bytes = settings["disk_max_bytes"]
+        self.disk_path: Optional[Path] = Path(settings["disk_path"]) if settings["disk_path"] else None
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "bypassed": 0
+        }
+        if self.enabled and self.disk_path is not None:
+            try:
+                self.disk_path.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.error(f"Disabling on-disk response cache at {self.disk_path}: {str(e)}")
+                self.disk_path = None
+
+    def is_cacheable(self, temperature: Optional[float], cache_mode: Optional[str] = None) -> bool:
+        """Whether a request may be served from and stored in the cache."""
+        if not self.enabled:
+            return False
+        if cache_mode == CACHE_MODE_BYPASS:
+            self.stats["bypassed"] += 1
+            return False
+        return cache_mode == CACHE_MODE_FORCE or temperature == 0
+
+    @staticmethod
+    def make_key(provider: str, model: str, messages: List[Dict[str, Any]], temperature: Optional[float],
+                 max_tokens: Optional[int], stream: bool, sampling: Optional[Dict[str, Any]] = None) -> str:
+        """Canonical hash identifying a request."""
+        canonical = json.dumps(
+            [provider, model, messages, temperature, max_tokens, bool(stream), sampling or {}],
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        """Look a key up in memory, then on disk."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.time() - entry.created < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["memory_hits"] += 1
+                return entry
+            self._remove(key)
+
+        if self.disk_path is not None:
+            entry = await asyncio.get_running_loop().run_in_executor(None, self._read_disk, key)
+            if entry is not None:
+                self.stats["hits"] += 1
+                self.stats["disk_hits"] += 1
+                self._store_memory(key, entry)
+                return entry
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, kind: str, body: bytes):
+        """Store a response in memory and, if configured, on disk."""
+        if len(body) > self.max_entry_bytes:
+            return
+        entry = CacheEntry(kind, body)
+        self._store_memory(key, entry)
+        self.stats["stores"] += 1
+        if self.disk_path is not None:
+            asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, entry)
+
+    def _store_memory(self, key: str, entry: CacheEntry):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += len(entry.body)
+        while self._bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+    def _disk_file(self, key: str) -> Path:
+        return self.disk_path / f"{key}.cache"
+
+    def _read_disk(self, key: str) -> Optional[CacheEntry]:
+        path = self._disk_file(key)
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable response cache file {path}: {str(e)}")
+            self._unlink(path)
+            return None
+        if time.time() - header.get("created", 0) >= self.ttl:
+            self._unlink(path)
+            return None
+        return CacheEntry(header.get("kind", KIND_JSON), body, header.get("created"))
+
+    def _write_disk(self, key: str, entry: CacheEntry):
+        path = self._disk_file(key)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(json.dumps({"kind": entry.kind, "created": entry.created}).encode("utf-8") + b"\n")
+                f.write(entry.body)
+            os.replace(tmp_path, path)
+            self._trim_disk()
+        except OSError as e:
+            logger.error(f"Failed to write response cache file {path}: {str(e)}")
+            self._unlink(tmp_path)
+
+    def _trim_disk(self):
+        files = []
+        total = 0
+        for path in self.disk_path.glob("*.cache"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.disk_max_bytes:
+            return
+        for _, size, path in sorted(files):
+            self._unlink(path)
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+
+    @staticmethod
+    def _unlink(path: Path):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    def build_result(self, entry: CacheEntry, provider: str, model: str, display_model: str) -> Optional[Dict[str, Any]]:
+        """Turn a cache entry back into a routed result."""
+        result = {
+            "provider": provider,
+            "model": model,
+            "display_model": display_model,
+            "cached": True
+        }
+        if entry.kind == KIND_SSE:
+            result["stream"] = True
+            result["stream_generator"] = self.replay(entry, display_model)
+            return result
+        try:
+            result["result"] = json.loads(entry.body)
+        except ValueError:
+            return None
+        result["stream"] = False
+        return result
+
+    async def replay(self, entry: CacheEntry, display_model: str) -> AsyncGenerator[bytes, None]:
+        """Replay a cached SSE stream in a single write, relabelled for the requested model."""
+        replacement = b'"model":' + json.dumps(display_model).encode("utf-8")
+        yield MODEL_FIELD_RE.sub(lambda _: replacement, entry.body)
+
+    def record(self, key: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a freshly routed result, teeing streams until the upstream finishes them."""
+        if not isinstance(result, dict) or result.get("fallback") or result.get("error"):
+            return result
+
+        if result.get("stream"):
+            generator = result.get("stream_generator")
+            if generator is not None:
+                result["stream_generator"] = self._record_stream(key, generator)
+            return result
+
+        payload = result.get("result")
+        if isinstance(payload, dict) and "error" not in payload and payload.get("status") != "error":
+            try:
+                body = json.dumps(payload).encode("utf-8")
+            except (TypeError, ValueError):
+                return result
+            self.put(key, KIND_JSON, body)
+        return result
+
+    async def _record_stream(self, key: str, generator) -> AsyncGenerator:
+        chunks: List[bytes] = []
+        size = 0
+        cacheable = True
+        completed = False
+        finished = False
+        try:
+            async for chunk in generator:
+                # Set by the response handler on the final event of a stream the upstream finished
+                finished = is_completion(chunk)
+                if cacheable:
+                    data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                    if not isinstance(data, bytes) or data.startswith(b'data: {"error"'):
+                        cacheable = False
+                    else:
+                        size += len(data)
+                        if size > self.max_entry_bytes:
+                            cacheable = False
+                            chunks = []
+                        else:
+                            chunks.append(data)
+                yield chunk
+            completed = True
+        finally:
+            await generator.aclose()
+            if completed and cacheable and finished and chunks:
+                self.put(key, KIND_SSE, b"".join(chunks))
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            entries=len(self._entries),
+            bytes=self._bytes,
+            max_bytes=self.max_bytes,
+            hit_rate=round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            disk=str(self.disk_path) if self.disk_path is not None else None
+        )
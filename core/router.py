@@ -1,13 +1,28 @@
 import logging
-import httpx
-import json
+import asyncio
 import time
-from typing import Dict, List, Any, Optional, Tuple, AsyncGenerator
+from typing import Dict, List, Any, Optional, Tuple, Callable, Awaitable
 from .clients import OllamaClient, OpenRouterClient, LlamaCppClient
 from .util import load_config
+from .tokens import token_counter
+from .pool import ConnectionPoolRegistry
+from .health import HealthMonitor
+from .catalogue import ModelCatalogue, ModelSnapshot
+from .admission import AdmissionController, AdmissionPermit
+from .scheduler import FairScheduler
+from .response_cache import ResponseCache
+from .coalescing import RequestCoalescer
+from .hedging import HedgingPolicy
+from .routing_policy import RoutingPolicyEngine, Candidate
+from .handlers.base_response_handler import (
+    STREAM_MODES, DEFAULT_STREAM_MODE, STREAM_MODE_PASSTHROUGH, STREAM_MODE_RELAY
+)
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on memoized model resolutions (cleared wholesale when reached)
+MAX_RESOLUTION_CACHE_SIZE = 1024
+
 class Router:
     """
     Enhanced router that supports Ollama and OpenRouter.ai providers.
@@ -15,6 +30,9 @@ class Router:
     
     def __init__(self, ollama_endpoint: str = None, config_path: str = "config.json"):
         self.config = load_config(config_path)
+        token_counter.configure(self.config.get("tokenizers", {}))
+        self.pools = ConnectionPoolRegistry(self.config)
+        self.health = HealthMonitor(self.config.get("routing", {}))
         self.ollama_client = None
         self.openrouter_client = None
         self.llamacpp_client = None
@@ -24,7 +42,9 @@ class Router:
         if ollama_config.get("enabled", True):  # Default to enabled for backwards compatibility
             ollama_endpoint = ollama_endpoint or ollama_config.get("endpoint", "http://localhost:11434")
             self.ollama_endpoint = ollama_endpoint 
-            self.ollama_client = OllamaClient(endpoint=ollama_endpoint)
+            self.ollama_client = OllamaClient(endpoint=ollama_endpoint, pools=self.pools, health=self.health,
+                                              residency_config=ollama_config.get("residency", {}),
+                                              options_config=ollama_config.get("options", {}))
             self.thinking_mode = ollama_config.get("thinking_mode", True)
         else:
             self.ollama_client = None
@@ -38,7 +58,9 @@ class Router:
             if api_key:
                 self.openrouter_client = OpenRouterClient(
                     api_key=api_key,
-                    endpoint=openrouter_config.get("endpoint", "https://openrouter.ai/api/v1")
+                    endpoint=openrouter_config.get("endpoint", "https://openrouter.ai/api/v1"),
+                    pools=self.pools,
+                    health=self.health
                 )
                 logger.info("OpenRouter client initialized")
             else:
@@ -48,7 +70,11 @@ class Router:
         llamacpp_config = self.config.get("llamacpp", {})
         if llamacpp_config.get("enabled", False):
             self.llamacpp_client = LlamaCppClient(
-                endpoint=llamacpp_config.get("endpoint", "http://localhost:8080")
+                endpoint=llamacpp_config.get("endpoint", "http://localhost:8080"),
+                pools=self.pools,
+                health=self.health,
+                endpoints=llamacpp_config.get("endpoints"),
+                slots_config=llamacpp_config.get("slots", {})
             )
             logger.info("Llama.cpp client initialized")
         
@@ -64,103 +90,198 @@ class Router:
         self.enable_fallback = routing_config.get("enable_fallback", True)
         self.cost_optimization = routing_config.get("cost_optimization", True)
         
-        # Provider health tracking
-        self.provider_health = {
-            "ollama": {"available": bool(self.ollama_client), "last_check": 0, "consecutive_failures": 0},
-            "openrouter": {"available": bool(self.openrouter_client), "last_check": 0, "consecutive_failures": 0},
-            "llamacpp": {"available": bool(self.llamacpp_client), "last_check": 0, "consecutive_failures": 0}
-        }
+        # Provider health tracking: probes run in the background, requests report outcomes
+        for provider in self.get_enabled_providers():
+            self.health.register(provider, self.get_client(provider).probe)
         
-        # Initialize models for all clients
-        if self.ollama_client:
-            try:
-                models = self.ollama_client.fetch_models()
-                logger.info(f"Successfully fetched {len(models)} models from Ollama")
-                if self.ollama_client.connection_error:
-                    logger.error(f"Ollama connection error: {self.ollama_client.connection_error}")
-            except Exception as e:
-                logger.error(f"Failed to fetch Ollama models during initialization: {str(e)}")
-                
-        if self.llamacpp_client:
-            try:
-                models = self.llamacpp_client.fetch_models()
-                logger.info(f"Successfully fetched {len(models)} models from Llama.cpp")
-            except Exception as e:
-                logger.error(f"Failed to fetch Llama.cpp models during initialization: {str(e)}")
+        # Strategy for requests that don't fit a single upstream call, optionally per provider
+        long_context_config = self.config.get("long_context", {})
+        for provider in self.get_enabled_providers():
+            settings = {key: value for key, value in long_context_config.items() if key != "providers"}
+            settings.update(long_context_config.get("providers", {}).get(provider, {}))
+            for handler in self.get_client(provider).request_handlers:
+                handler.configure_long_context(settings)
+        
+        # Context window budgets and prefix-stable truncation, optionally per provider
+        context_window_config = self.config.get("context_window", {})
+        for provider in self.get_enabled_providers():
+            settings = {key: value for key, value in context_window_config.items() if key != "providers"}
+            settings.update(context_window_config.get("providers", {}).get(provider, {}))
+            for handler in self.get_client(provider).request_handlers:
+                handler.configure_context_window(settings)
+        
+        # Model catalogues are fetched asynchronously by startup(), never on the constructor path
+        self._model_refresh_task: Optional[asyncio.Task] = None
+        self.model_fetch_timeout = routing_config.get("model_fetch_timeout", 20)
+        self.catalogue = ModelCatalogue()
+        self.admission = AdmissionController(self.config.get("admission", {}))
+        self.scheduler = FairScheduler(self.config.get("scheduler", {}))
+        self.response_cache = ResponseCache(self.config.get("response_cache", {}))
+        self.coalescer = RequestCoalescer(self.config.get("coalescing", {}))
+        self.hedging = HedgingPolicy(self.config.get("hedging", {}))
+        self.routing_policy = RoutingPolicyEngine(self.config.get("routing_policy", {}), routing_config)
+        for provider in self.get_enabled_providers():
+            client = self.get_client(provider)
+            ttl = self.config.get(provider, {}).get("model_cache_ttl", client.cache_duration)
+            self.catalogue.register(provider, self._make_model_loader(client), ttl)
+        self._resolution_cache: Dict[str, Tuple[str, str]] = {}
+        self._resolution_state = None
+        self._mappings_version = 0
+        self._model_snapshot: Optional[ModelSnapshot] = None
         
-        ollama_models = len(self.ollama_client.available_models) if self.ollama_client else 0
-        logger.info(f"Router initialized - Ollama: {ollama_models} models, OpenRouter: {bool(self.openrouter_client)}, Llama.cpp: {bool(self.llamacpp_client)}")
+        logger.info(f"Router initialized - Ollama: {bool(self.ollama_client)}, OpenRouter: {bool(self.openrouter_client)}, Llama.cpp: {bool(self.llamacpp_client)}")
         logger.info(f"Provider priority: {self.provider_priority}")
         logger.info(f"OpenRouter mappings: {self.openrouter_mappings}")
         logger.info(f"Ollama mappings: {self.ollama_mappings}")
     
-
+    def get_enabled_providers(self) -> List[str]:
+        """Return the names of all configured provider clients."""
+        providers = []
+        if self.ollama_client:
+            providers.append("ollama")
+        if self.openrouter_client:
+            providers.append("openrouter")
+        if self.llamacpp_client:
+            providers.append("llamacpp")
+        return providers
     
-    async def _make_ollama_request(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Make a direct HTTP request to Ollama."""
-        url = f"{self.ollama_endpoint}/api/chat"
-        
-        try:
-            async with httpx.AsyncClient(timeout=180.0) as client:
-                response = await client.post(url, json=request_data)
-                
-                if response.status_code == 200:
-                    if request_data.get("stream", False):
-                        return {"status": "streaming", "response": response}
-                    else:
-                        return {"status": "success", "data": response.json()}
-                else:
-                    return {
-                        "status": "error",
-                        "code": response.status_code,
-                        "error": {"message": f"Ollama returned status: {response.status_code}"}
-                    }
-        except Exception as e:
-            logger.error(f"Ollama request failed: {str(e)}")
-            return {
-                "status": "error",
-                "error": {"message": f"Request failed: {str(e)}"}
-            }
+    def mapped_models(self) -> List[str]:
+        """Requested and provider model names of every model mapping."""
+        models = []
+        for mappings in (self.ollama_mappings, self.openrouter_mappings, self.llamacpp_mappings):
+            for name, target in mappings.items():
+                targets = target if isinstance(target, list) else [target]
+                for model in [name] + targets:
+                    if isinstance(model, str) and model not in models:
+                        models.append(model)
+        return models
     
-    async def _stream_ollama_request(self, request_data: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
-        """Stream a request to Ollama."""
-        url = f"{self.ollama_endpoint}/api/chat"
-        
+    def get_client(self, provider: str):
+        """Return the client for a provider, or None if it is not enabled."""
+        return {
+            "ollama": self.ollama_client,
+            "openrouter": self.openrouter_client,
+            "llamacpp": self.llamacpp_client
+        }.get(provider)
+    
+    def _make_model_loader(self, client):
+        """Build the catalogue loader for a provider client."""
+        async def load() -> List[Dict[str, Any]]:
+            models = await client.fetch_models(force_refresh=True)
+            if client.connection_error:
+                # Keep routing on the last good catalogue while the provider is unreachable
+                client.available_models = self.catalogue.get_models(client.provider_key)
+                raise RuntimeError(client.connection_error)
+            return models
+        return load
+    
+    async def refresh_models(self, force_refresh: bool = True) -> Dict[str, int]:
+        """Fetch model catalogues from all enabled providers concurrently."""
+        if force_refresh:
+            catalogues = await self.catalogue.refresh_all()
+        else:
+            catalogues = await self.catalogue.get_all()
+        return {provider: len(models) for provider, models in catalogues.items()}
+    
+    async def wait_for_models(self, timeout: Optional[float] = None):
+        """Wait for the startup model fetch, if it is still running."""
+        task = self._model_refresh_task
+        if task is None or task.done():
+            return
         try:
-            async with httpx.AsyncClient(timeout=180.0) as client:
-                async with client.stream("POST", url, json=request_data) as response:
-                    if response.status_code != 200:
-                        yield {
-                            "error": {"message": f"Ollama returned status: {response.status_code}", "code": response.status_code}
-                        }
-                        return
-                    
-                    async for line in response.aiter_lines():
-                        if line.strip():
-                            try:
-                                chunk = json.loads(line)
-                                yield chunk
-                            except json.JSONDecodeError:
-                                continue
+            await asyncio.wait_for(asyncio.shield(task), timeout or self.model_fetch_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Timed out waiting for initial model fetch")
         except Exception as e:
-            logger.error(f"Ollama streaming failed: {str(e)}")
-            yield {
-                "error": {"message": f"Streaming failed: {str(e)}"}
-            }
+            logger.error(f"Initial model fetch failed: {str(e)}")
+    
+    async def startup(self):
+        """
+        Open the shared connection pools, start the background health monitor and
+        kick off the initial model fetch without blocking server startup.
+        """
+        self.pools.open(self.get_enabled_providers())
+        self.health.start()
+        if self._model_refresh_task is None or self._model_refresh_task.done():
+            self._model_refresh_task = asyncio.get_running_loop().create_task(self.refresh_models())
+        if self.ollama_client:
+            self.ollama_client.residency.start(
+                lambda name: self.ollama_client.get_model_name(name, self.ollama_mappings),
+                ready=self.wait_for_models)
+    
+    async def aclose(self):
+        """Release all shared resources held by the router."""
+        if self._model_refresh_task is not None and not self._model_refresh_task.done():
+            self._model_refresh_task.cancel()
+            try:
+                await self._model_refresh_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._model_refresh_task = None
+        await self.catalogue.aclose()
+        await self.health.stop()
+        if self.ollama_client:
+            await self.ollama_client.residency.stop()
+        self.routing_policy.close()
+        await self.pools.aclose()
+    
+    def _get_routing_state(self) -> Tuple[int, int, Tuple[str, ...]]:
+        """Everything model resolution and the merged model list depend on."""
+        return (
+            self.catalogue.version,
+            self._mappings_version,
+            tuple(p for p in self.get_enabled_providers() if self.health.is_available(p))
+        )
+    
+    def update_model_mappings(self, provider: str, mappings: Dict[str, str]):
+        """Replace a provider's model mappings and invalidate derived routing state."""
+        if provider == "ollama":
+            self.ollama_mappings = mappings
+        elif provider == "openrouter":
+            self.openrouter_mappings = mappings
+        elif provider == "llamacpp":
+            self.llamacpp_mappings = mappings
+        else:
+            raise ValueError(f"Unknown provider: {provider}")
+        self._mappings_version += 1
     
     async def determine_provider_and_model(self, requested_model: str) -> Tuple[str, str, str]:
         """
         Determine the best provider and model for a request.
         
+        Results are memoized until a catalogue changes or a provider's health
+        flips, so repeated requests for the same model skip resolution entirely.
+        
         Returns:
             Tuple of (provider, actual_model, display_model)
         """
+        await self.wait_for_models()
+        self.catalogue.revalidate()
+        
+        # Mappings with alternatives resolve to whichever model is loaded, so residency counts too
+        state = (self._get_routing_state(), self.ollama_client.residency.version if self.ollama_client else 0)
+        if state != self._resolution_state:
+            self._resolution_cache.clear()
+            self._resolution_state = state
+        
+        cached = self._resolution_cache.get(requested_model)
+        if cached is not None:
+            return cached[0], cached[1], requested_model
+        
+        provider, actual_model, display_model = await self._resolve_provider_and_model(requested_model)
+        if len(self._resolution_cache) >= MAX_RESOLUTION_CACHE_SIZE:
+            self._resolution_cache.clear()
+        self._resolution_cache[requested_model] = (provider, actual_model)
+        return provider, actual_model, display_model
+    
+    async def _resolve_provider_and_model(self, requested_model: str) -> Tuple[str, str, str]:
+        """Resolve a model against the mappings and provider catalogues (uncached)."""
         logger.info(f"Determining provider for model: {requested_model}")
         logger.info(f"Checking mappings - Ollama: {requested_model in self.ollama_mappings}, OpenRouter: {requested_model in self.openrouter_mappings}")
         
         # Check if model is explicitly mapped to a provider
         if requested_model in self.ollama_mappings:
-            ollama_model = self.ollama_mappings[requested_model]
+            ollama_model = self.ollama_client.resolve_mapping(self.ollama_mappings[requested_model]) if self.ollama_client else None
             ollama_healthy = await self._is_provider_healthy("ollama")
             logger.info(f"Ollama mapping found: {ollama_model}, healthy: {ollama_healthy}")
             if ollama_healthy:
@@ -184,13 +305,12 @@ class Router:
                     return "llamacpp", actual_model, requested_model
                 elif provider == "openrouter" and self.openrouter_client:
                     # Check if model exists in OpenRouter
-                    if not self.openrouter_client.available_models:
-                        await self.openrouter_client.fetch_models()
+                    await self.catalogue.get("openrouter")
                     
                     # Try exact match first
-                    for model in self.openrouter_client.available_models:
-                        if model["id"].lower() == requested_model.lower():
-                            return "openrouter", model["id"], requested_model
+                    exact_match = self.openrouter_client.model_index.find_casefold(requested_model)
+                    if exact_match:
+                        return "openrouter", exact_match, requested_model
                     
                     # Try partial match
                     matching_models = self.openrouter_client.search_models(requested_model)
@@ -206,164 +326,266 @@ class Router:
         
         raise Exception("No healthy providers available")
     
-    async def _is_provider_healthy(self, provider: str) -> bool:
-        """Check if a provider is healthy and available."""
-        current_time = time.time()
-        health_info = self.provider_health.get(provider, {})
+    async def select_route(self, model: str, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None,
+                           stream: bool = False) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        """
+        Provider and model for one request, as chosen by the routing policy.
         
-        if current_time - health_info.get("last_check", 0) < 30:
-            return health_info.get("available", False)
+        The static resolution (mappings and provider_priority) is the first
+        candidate; the other healthy providers serving the same model follow.
+        Also returns the start of the request's trace entry when traffic is
+        recorded for the simulator.
+        """
+        provider, actual_model, _ = await self.determine_provider_and_model(model)
+        engine = self.routing_policy
+        if engine.is_static and not engine.record_path:
+            return provider, actual_model, None
         
-        if provider == "ollama":
-            if not self.ollama_client:
-                # Ollama is disabled
-                self.provider_health["ollama"].update({
-                    "available": False,
-                    "last_check": current_time,
-                    "consecutive_failures": 999  # Mark as permanently disabled
-                })
-                return False
-            try:
-                is_healthy = (len(self.ollama_client.available_models) > 0 and self.ollama_client.connection_error is None)
-                self.provider_health["ollama"].update({
-                    "available": is_healthy,
-                    "last_check": current_time,
-                    "consecutive_failures": 0 if is_healthy else health_info.get("consecutive_failures", 0) + 1
-                })
-                return is_healthy
-            except Exception:
-                self.provider_health["ollama"]["available"] = False
-                return False
-                
-        elif provider == "openrouter" and self.openrouter_client:
-            # OpenRouter is healthy if client is initialized (has API key)
-            logger.info(f"OpenRouter client available: True")
-            self.provider_health["openrouter"].update({
-                "available": True,
-                "last_check": current_time,
-                "consecutive_failures": 0
-            })
-            return True
-                
-        elif provider == "llamacpp" and self.llamacpp_client:
-            try:
-                is_healthy = (len(self.llamacpp_client.available_models) > 0 and self.llamacpp_client.connection_error is None)
-                self.provider_health["llamacpp"].update({
-                    "available": is_healthy,
-                    "last_check": current_time,
-                    "consecutive_failures": 0 if is_healthy else health_info.get("consecutive_failures", 0) + 1
-                })
-                return is_healthy
-            except Exception:
-                self.provider_health["llamacpp"]["available"] = False
-                return False
+        request = engine.make_request(model, token_counter.count_messages(messages, actual_model), max_tokens, stream)
+        candidates = self._route_candidates(model, provider, actual_model)
+        chosen = engine.choose(candidates, request)
+        trace = engine.trace(request, candidates)
+        if chosen is None:
+            return provider, actual_model, trace
+        return chosen.provider, chosen.model, trace
+    
+    def _route_candidates(self, model: str, static_provider: str, static_model: str) -> List[Candidate]:
+        """Candidates for a requested model, the statically resolved one first."""
+        priority = self.routing_config.get("provider_priority", ["ollama", "llamacpp", "openrouter"])
+        rank = lambda provider: priority.index(provider) if provider in priority else len(priority)
+        routes = [(static_provider, static_model)]
+        for provider in sorted(self.get_enabled_providers(), key=rank):
+            if provider == static_provider or not self.health.is_available(provider):
+                continue
+            actual_model = self._serving_model(provider, model)
+            if actual_model:
+                routes.append((provider, actual_model))
         
-        return False
+        candidates = []
+        for provider, actual_model in routes:
+            client = self.get_client(provider)
+            handler = client.request_handler
+            context_length = (handler.context_window.configured_length(actual_model)
+                              or handler.context_lengths.get(actual_model))
+            listing = client.get_model_by_id(actual_model) or {}
+            candidates.append(self.routing_policy.make_candidate(
+                provider, actual_model, rank(provider), self.admission.get_stats(provider),
+                context_length, listing.get("pricing")))
+        return candidates
     
-    async def get_available_models(self) -> List[Dict[str, Any]]:
-        """Get combined list of available models from all providers."""
+    def _serving_model(self, provider: str, model: str) -> Optional[str]:
+        """The model a provider would serve for `model` if it maps or lists it; a provider's default doesn't count."""
+        client = self.get_client(provider)
+        if client is None:
+            return None
+        mappings = {"ollama": self.ollama_mappings, "openrouter": self.openrouter_mappings,
+                    "llamacpp": self.llamacpp_mappings}.get(provider, {})
+        if model in mappings:
+            return client.get_model_name(model, mappings)
+        return client.model_index.find_casefold(model)
+    
+    async def _is_provider_healthy(self, provider: str) -> bool:
+        """Check if a provider is enabled and its circuit breaker is not open."""
+        return self.get_client(provider) is not None and self.health.is_available(provider)
+    
+    def get_model_snapshot(self) -> ModelSnapshot:
+        """
+        Return the merged model list of all providers as an immutable snapshot.
+        
+        The snapshot is rebuilt only when a provider catalogue, the mappings or
+        the set of healthy providers changes. It reads cached catalogues only,
+        so it is safe to call from synchronous status endpoints.
+        """
+        state = self._get_routing_state()
+        snapshot = self._model_snapshot
+        if snapshot is not None and snapshot.state == state:
+            return snapshot
+        
+        created = int(time.time())
+        healthy = set(state[2])
         models = []
+        seen = set()
+        counts = {}
         
-        if await self._is_provider_healthy("ollama"):
-            ollama_models = self.ollama_client.get_available_models()
-            for model in ollama_models:
-                model["provider"] = "ollama"
-                models.append(model)
+        for provider in ("ollama", "openrouter", "llamacpp"):
+            if self.get_client(provider) is None:
+                continue
+            provider_models = self.catalogue.get_models(provider)
+            counts[provider] = len(provider_models)
+            if provider not in healthy:
+                continue
+            for model in provider_models:
+                entry = {
+                    "id": model["id"],
+                    "object": "model",
+                    "created": created,
+                    "owned_by": model.get("owned_by", provider) if provider == "openrouter" else provider,
+                    "provider": provider
+                }
+                if provider == "openrouter":
+                    entry["context_length"] = model.get("context_length", 4096)
+                    entry["description"] = model.get("description", "")
+                models.append(entry)
+                seen.add(entry["id"])
         
-        if await self._is_provider_healthy("openrouter"):
-            try:
-                openrouter_response = await self.openrouter_client.fetch_models()
-                openrouter_models = openrouter_response.get("models", [])
-                for model in openrouter_models:
-                    models.append({
-                        "id": model["id"],
-                        "object": "model",
-                        "created": int(time.time()),
-                        "owned_by": model.get("owned_by", "openrouter"),
-                        "provider": "openrouter",
-                        "context_length": model.get("context_length", 4096),
-                        "description": model.get("description", "")
-                    })
-            except Exception as e:
-                logger.error(f"Failed to fetch OpenRouter models: {str(e)}")
-        
-        if await self._is_provider_healthy("llamacpp"):
-            llamacpp_models = self.llamacpp_client.get_available_models()
-            for model in llamacpp_models:
-                model["provider"] = "llamacpp"
-                models.append(model)
-        
-        for mapped_name in self.ollama_mappings.keys():
-            if mapped_name != "default" and not any(m["id"] == mapped_name for m in models):
+        for provider, mappings in (("ollama", self.ollama_mappings),
+                                   ("openrouter", self.openrouter_mappings),
+                                   ("llamacpp", self.llamacpp_mappings)):
+            for mapped_name in mappings:
+                if mapped_name == "default" and provider == "ollama":
+                    continue
+                if mapped_name in seen:
+                    continue
+                seen.add(mapped_name)
                 models.append({
                     "id": mapped_name,
                     "object": "model",
-                    "created": int(time.time()),
-                    "owned_by": "ollama-mapped",
-                    "provider": "ollama"
+                    "created": created,
+                    "owned_by": f"{provider}-mapped",
+                    "provider": provider
                 })
         
-        for mapped_name in self.openrouter_mappings.keys():
-            if not any(m["id"] == mapped_name for m in models):
-                models.append({
-                    "id": mapped_name,
-                    "object": "model", 
-                    "created": int(time.time()),
-                    "owned_by": "openrouter-mapped",
-                    "provider": "openrouter"
-                })
+        version = snapshot.version + 1 if snapshot is not None else 1
+        self._model_snapshot = ModelSnapshot(version, state, models, counts)
+        return self._model_snapshot
+    
+    async def get_available_models(self) -> List[Dict[str, Any]]:
+        """Get combined list of available models from all providers."""
+        await self.wait_for_models()
+        await self.catalogue.get_all()
+        return self.get_model_snapshot().to_list()
+    
+    async def get_models_body(self) -> bytes:
+        """
+        Return the serialized /v1/models response from the current snapshot.
+        Stale catalogues are revalidated in the background by the catalogue cache.
+        """
+        await self.wait_for_models()
+        await self.catalogue.get_all()
+        return self.get_model_snapshot().body
+    
+    def resolve_stream_mode(self, model: str, requested_mode: Optional[str] = None) -> str:
+        """
+        Pick the streaming mode for a request.
         
-        for mapped_name in self.llamacpp_mappings.keys():
-            if not any(m["id"] == mapped_name for m in models):
-                models.append({
-                    "id": mapped_name,
-                    "object": "model",
-                    "created": int(time.time()),
-                    "owned_by": "llamacpp-mapped",
-                    "provider": "llamacpp"
-                })
+        A mode requested by the client wins, then a per-model override from the
+        "streaming" config section, then the configured default (passthrough).
+        Passthrough is upgraded to the zero-parse relay unless "relay" is disabled;
+        providers that don't speak OpenAI SSE treat relay as passthrough.
+        """
+        streaming_config = self.config.get("streaming", {})
+        selected = DEFAULT_STREAM_MODE
+        for mode in (requested_mode, streaming_config.get("model_modes", {}).get(model), streaming_config.get("mode")):
+            if mode in STREAM_MODES:
+                selected = mode
+                break
+        if selected == STREAM_MODE_PASSTHROUGH and streaming_config.get("relay", True):
+            return STREAM_MODE_RELAY
+        return selected
+    
+    async def _admit(self, provider: str, model: str, messages: List[Dict[str, Any]],
+                     max_tokens: Optional[int], tenant: Optional[str]) -> AdmissionPermit:
+        """Shape and tag a request for its tenant, then wait for an admission slot."""
+        if not self.scheduler.enabled:
+            return await self.admission.acquire(provider, model)
         
-        return models
+        tenant = tenant or "anonymous"
+        cost = self.scheduler.estimate_cost(messages, max_tokens, model)
+        await self.scheduler.shape(tenant, cost)
+        priority = self.scheduler.tag(provider, tenant, cost)
+        permit = await self.admission.acquire(provider, model, priority)
+        self.scheduler.dispatched(provider, priority)
+        return permit
     
     async def make_request_with_provider(self, provider: str, model: str, messages: List[Dict[str, Any]], 
                                        temperature: float = 0.7, max_tokens: Optional[int] = None,
-                                       stream: bool = False) -> Dict[str, Any]:
+                                       stream: bool = False, stream_mode: Optional[str] = None,
+                                       tenant: Optional[str] = None,
+                                       cache_mode: Optional[str] = None,
+                                       sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Make a request to a specific provider explicitly chosen by the frontend.
+        Raises AdmissionRejected when the provider or model is saturated.
         """
+        client = self.get_client(provider)
+        if client is None:
+            return await self._route_request_with_provider(provider, model, messages, temperature,
+                                                           max_tokens, stream, stream_mode, sampling)
+        
+        mappings = {"ollama": self.ollama_mappings, "openrouter": self.openrouter_mappings,
+                    "llamacpp": self.llamacpp_mappings}[provider]
+        actual_model = client.get_model_name(model, mappings)
+        cache_key, cached = await self._lookup_cached(provider, actual_model, model, messages, temperature,
+                                                      max_tokens, stream, cache_mode, sampling)
+        if cached is not None:
+            return cached
+        
+        flight_key = self.coalescer.make_key(provider, actual_model, model, messages, temperature,
+                                             max_tokens, stream, stream_mode, sampling)
+        route = lambda permit: self._route_request_with_provider(provider, model, messages, temperature,
+                                                                 max_tokens, stream, stream_mode, sampling,
+                                                                 permit=permit)
+        return await self.coalescer.run(flight_key, lambda: self._dispatch(
+            provider, actual_model, messages, max_tokens, tenant, cache_key, route))
+    
+    async def _route_request_with_provider(self, provider: str, model: str, messages: List[Dict[str, Any]],
+                                           temperature: float = 0.7, max_tokens: Optional[int] = None,
+                                           stream: bool = False, stream_mode: Optional[str] = None,
+                                           sampling: Optional[Dict[str, Any]] = None,
+                                           trace: Optional[Dict[str, Any]] = None,
+                                           permit: Optional[AdmissionPermit] = None) -> Dict[str, Any]:
+        """Dispatch an explicit provider request (admission already handled, `permit` is tied to the result)."""
         logger.info(f"Explicit provider request: {provider} for model {model}")
         
+        stream_mode = self.resolve_stream_mode(model, stream_mode)
+        started = time.monotonic()
+        
         if provider == "ollama":
-            return await self._make_ollama_request_direct(model, messages, temperature, max_tokens, stream)
+            result = await self._make_ollama_request_direct(model, messages, temperature, max_tokens, stream, stream_mode, sampling)
         elif provider == "openrouter":
-            return await self._make_openrouter_request_direct(model, messages, temperature, max_tokens, stream)
+            result = await self._make_openrouter_request_direct(model, messages, temperature, max_tokens, stream, stream_mode, sampling)
         elif provider == "llamacpp":
-            return await self._make_llamacpp_request_direct(model, messages, temperature, max_tokens, stream)
+            result = await self._make_llamacpp_request_direct(model, messages, temperature, max_tokens, stream, stream_mode, sampling)
         else:
             raise ValueError(f"Unknown provider: {provider}. Supported providers: ollama, openrouter, llamacpp")
+        # Explicit requests feed the latency metrics the routing policy scores providers with
+        result = self.routing_policy.observe(result, started, trace)
+        return self.admission.attach(permit, result) if permit is not None else result
     
     async def _make_ollama_request_direct(self, model: str, messages: List[Dict[str, Any]], 
                                         temperature: float = 0.7, max_tokens: Optional[int] = None,
-                                        stream: bool = False) -> Dict[str, Any]:
+                                        stream: bool = False, stream_mode: Optional[str] = None,
+                                        sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Make a direct request to Ollama."""
         if not self.ollama_client:
             raise Exception("Ollama client not available")
         
         # Get the actual model name using Ollama mappings
         actual_model = self.ollama_client.get_model_name(model, self.ollama_mappings)
+        return await self._ollama_request(actual_model, model, messages, temperature,
+                                          max_tokens, stream, stream_mode, sampling)
+    
+    async def _ollama_request(self, actual_model: str, display_model: str, messages: List[Dict[str, Any]],
+                              temperature: float = 0.7, max_tokens: Optional[int] = None,
+                              stream: bool = False, stream_mode: Optional[str] = None,
+                              sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """The single Ollama request path: routed, explicit-provider and fallback requests all end here."""
         processed_messages = self.ollama_client.process_messages(messages, self.thinking_mode)
         
         if stream:
             return {
                 "provider": "ollama",
                 "model": actual_model,
-                "display_model": model,
+                "display_model": display_model,
                 "stream": True,
                 "stream_generator": self.ollama_client.stream_chat_completion(
                     model=actual_model,
                     messages=processed_messages,
                     temperature=temperature,
-                    max_tokens=max_tokens
+                    max_tokens=max_tokens,
+                    stream_mode=stream_mode,
+                    display_model=display_model,
+                    sampling=sampling
                 )
             }
         else:
@@ -372,19 +594,21 @@ class Router:
                 messages=processed_messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                stream=False
+                stream=False,
+                sampling=sampling
             )
             return {
                 "provider": "ollama",
                 "model": actual_model,
-                "display_model": model,
+                "display_model": display_model,
                 "result": result,
                 "stream": False
             }
     
     async def _make_openrouter_request_direct(self, model: str, messages: List[Dict[str, Any]], 
                                             temperature: float = 0.7, max_tokens: Optional[int] = None,
-                                            stream: bool = False) -> Dict[str, Any]:
+                                            stream: bool = False, stream_mode: Optional[str] = None,
+                                            sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Make a direct request to OpenRouter."""
         if not self.openrouter_client:
             raise Exception("OpenRouter client not available")
@@ -404,7 +628,10 @@ class Router:
                     model=actual_model,
                     messages=messages,
                     temperature=temperature,
-                    max_tokens=max_tokens
+                    max_tokens=max_tokens,
+                    stream_mode=stream_mode,
+                    display_model=model,
+                    sampling=sampling
                 )
             }
         else:
@@ -413,7 +640,8 @@ class Router:
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                stream=False
+                stream=False,
+                sampling=sampling
             )
             return {
                 "provider": "openrouter",
@@ -425,26 +653,38 @@ class Router:
     
     async def _make_llamacpp_request_direct(self, model: str, messages: List[Dict[str, Any]], 
                                           temperature: float = 0.7, max_tokens: Optional[int] = None,
-                                          stream: bool = False) -> Dict[str, Any]:
+                                          stream: bool = False, stream_mode: Optional[str] = None,
+                                          sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Make a direct request to Llama.cpp."""
         if not self.llamacpp_client:
             raise Exception("Llama.cpp client not available")
         
         # Get the actual model name using Llama.cpp mappings
         actual_model = self.llamacpp_client.get_model_name(model, self.llamacpp_mappings)
+        return await self._llamacpp_request(actual_model, model, messages, temperature,
+                                            max_tokens, stream, stream_mode, sampling)
+    
+    async def _llamacpp_request(self, actual_model: str, display_model: str, messages: List[Dict[str, Any]],
+                                temperature: float = 0.7, max_tokens: Optional[int] = None,
+                                stream: bool = False, stream_mode: Optional[str] = None,
+                                sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """The single Llama.cpp request path shared by routed and explicit-provider requests."""
         processed_messages = self.llamacpp_client.process_messages(messages, self.thinking_mode)
         
         if stream:
             return {
                 "provider": "llamacpp",
                 "model": actual_model,
-                "display_model": model,
+                "display_model": display_model,
                 "stream": True,
                 "stream_generator": self.llamacpp_client.stream_chat_completion(
                     model=actual_model,
                     messages=processed_messages,
                     temperature=temperature,
-                    max_tokens=max_tokens
+                    max_tokens=max_tokens,
+                    stream_mode=stream_mode,
+                    display_model=display_model,
+                    sampling=sampling
                 )
             }
         else:
@@ -453,60 +693,171 @@ class Router:
                 messages=processed_messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                stream=False
+                stream=False,
+                sampling=sampling
             )
             return {
                 "provider": "llamacpp",
                 "model": actual_model,
-                "display_model": model,
+                "display_model": display_model,
                 "result": result,
                 "stream": False
             }
     
     async def make_request(self, model: str, messages: List[Dict[str, Any]], 
                           temperature: float = 0.7, max_tokens: Optional[int] = None,
-                          stream: bool = False) -> Dict[str, Any]:
+                          stream: bool = False, stream_mode: Optional[str] = None,
+                          tenant: Optional[str] = None, cache_mode: Optional[str] = None,
+                          sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Route request to appropriate provider with fallback support.
+        
+        Deterministic requests are answered from the response cache when
+        possible, and identical concurrent requests share one generation.
+        Otherwise the request is scheduled fairly among tenants and admitted
+        against the chosen provider and model first; AdmissionRejected is
+        raised when they are saturated.
+        """
+        try:
+            provider, actual_model, trace = await self.select_route(model, messages, max_tokens, stream)
+        except Exception:
+            # Let routing report the failure and try its fallbacks
+            return await self._route_request(model, messages, temperature, max_tokens, stream, stream_mode, sampling)
+        
+        cache_key, cached = await self._lookup_cached(provider, actual_model, model, messages, temperature,
+                                                      max_tokens, stream, cache_mode, sampling)
+        if cached is not None:
+            return cached
+        
+        flight_key = self.coalescer.make_key(provider, actual_model, model, messages, temperature,
+                                             max_tokens, stream, stream_mode, sampling)
+        route = lambda permit: self._route_hedged(model, messages, temperature, max_tokens, stream, stream_mode,
+                                                  sampling, (provider, actual_model), trace, permit)
+        return await self.coalescer.run(flight_key, lambda: self._dispatch(
+            provider, actual_model, messages, max_tokens, tenant, cache_key, route))
+    
+    async def _dispatch(self, provider: str, actual_model: str, messages: List[Dict[str, Any]],
+                        max_tokens: Optional[int], tenant: Optional[str], cache_key: Optional[str],
+                        route: Callable[[AdmissionPermit], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Admit a request and run `route` with its admission permit, which
+        `route` ties to the upstream response; the response cache is tied
+        to the result here.
+        """
+        permit = await self._admit(provider, actual_model, messages, max_tokens, tenant)
+        try:
+            result = await route(permit)
+        except BaseException:
+            permit.release()
+            raise
+        return self.response_cache.record(cache_key, result) if cache_key else result
+    
+    async def _lookup_cached(self, provider: str, actual_model: str, model: str,
+                             messages: List[Dict[str, Any]], temperature: float, max_tokens: Optional[int],
+                             stream: bool, cache_mode: Optional[str],
+                             sampling: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Return the cache key of a request (None if it isn't cacheable) and a cached result if there is one."""
+        if not self.response_cache.is_cacheable(temperature, cache_mode):
+            return None, None
+        cache_key = self.response_cache.make_key(provider, actual_model, messages, temperature, max_tokens, stream,
+                                                 sampling)
+        entry = await self.response_cache.get(cache_key)
+        if entry is None:
+            return cache_key, None
+        logger.info(f"Serving {provider}/{actual_model} response from cache")
+        return cache_key, self.response_cache.build_result(entry, provider, actual_model, model)
+    
+    async def _route_hedged(self, model: str, messages: List[Dict[str, Any]],
+                            temperature: float = 0.7, max_tokens: Optional[int] = None,
+                            stream: bool = False, stream_mode: Optional[str] = None,
+                            sampling: Optional[Dict[str, Any]] = None,
+                            selected: Optional[Tuple[str, str]] = None,
+                            trace: Optional[Dict[str, Any]] = None,
+                            permit: Optional[AdmissionPermit] = None) -> Dict[str, Any]:
+        """
+        Route a request; a stream is hedged against a backup provider if its first token is late.
+        `permit` is tied to the primary stream, so a primary that loses the race frees its slot right away.
+        """
+        started = time.monotonic()
+        result = await self._route_request(model, messages, temperature, max_tokens, stream, stream_mode, sampling,
+                                           selected)
+        result = self.routing_policy.observe(result, started, trace)
+        if permit is not None:
+            result = self.admission.attach(permit, result)
+        generator = result.get("stream_generator") if isinstance(result, dict) else None
+        if generator is None or result.get("fallback") or not self.hedging.applies_to(model):
+            return result
+        
+        provider = result["provider"]
+        backup = lambda: self._start_hedge(provider, model, messages, temperature, max_tokens, stream_mode, sampling,
+                                           trace)
+        result["stream_generator"] = self.hedging.stream(provider, result["model"], generator, backup)
+        return result
+    
+    def _hedge_target(self, primary: str, model: str) -> Optional[Tuple[str, str]]:
+        """Next healthy provider after `primary` in provider_priority that maps or lists the model."""
+        priority = self.routing_config.get("provider_priority", ["ollama", "llamacpp", "openrouter"])
+        candidates = priority[priority.index(primary) + 1:] if primary in priority else priority
+        for provider in candidates:
+            if provider == primary or not self.health.is_available(provider):
+                continue
+            actual_model = self._serving_model(provider, model)
+            if actual_model:
+                return provider, actual_model
+        return None
+    
+    async def _start_hedge(self, primary: str, model: str, messages: List[Dict[str, Any]],
+                           temperature: float, max_tokens: Optional[int], stream_mode: Optional[str],
+                           sampling: Optional[Dict[str, Any]],
+                           trace: Optional[Dict[str, Any]] = None) -> Optional[Tuple[str, str, Any]]:
+        """Open the backup stream of a hedged request, if a provider has a free slot for it right now."""
+        target = self._hedge_target(primary, model)
+        if target is None:
+            return None
+        provider, actual_model = target
+        # A hedge never queues: waiting for a slot would defeat its purpose and add load where it hurts
+        permit = self.admission.try_acquire(provider, actual_model)
+        if permit is None:
+            logger.info(f"Not hedging {model} with {provider}: no free admission slot")
+            return None
+        try:
+            result = await self._route_request_with_provider(provider, model, messages, temperature,
+                                                             max_tokens, True, stream_mode, sampling, trace)
+        except Exception as e:
+            permit.release()
+            logger.warning(f"Hedge request to {provider} failed: {str(e)}")
+            return None
+        result = self.admission.attach(permit, result)
+        if result.get("stream_generator") is None:
+            return None
+        return provider, result["model"], result["stream_generator"]
+    
+    async def _route_request(self, model: str, messages: List[Dict[str, Any]],
+                             temperature: float = 0.7, max_tokens: Optional[int] = None,
+                             stream: bool = False, stream_mode: Optional[str] = None,
+                             sampling: Optional[Dict[str, Any]] = None,
+                             selected: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
+        """
+        Route request to appropriate provider with fallback support (admission already handled).
+        `selected` is the (provider, model) chosen by the routing policy, resolved here if not given.
         """
         primary_error = None
+        stream_mode = self.resolve_stream_mode(model, stream_mode)
         
         try:
-            provider, actual_model, display_model = await self.determine_provider_and_model(model)
+            if selected is not None:
+                (provider, actual_model), display_model = selected, model
+            else:
+                provider, actual_model, display_model = await self.determine_provider_and_model(model)
             logger.info(f"Routing {model} → {provider}:{actual_model}")
             
             if provider == "ollama":
-                # Use Ollama with direct HTTP handling
-                processed_messages = self.ollama_client.process_messages(messages, self.thinking_mode)
-                
-                # Create request data in Ollama format
-                request_data = {
-                    "model": actual_model,
-                    "messages": processed_messages,
-                    "temperature": temperature,
-                    "stream": stream
-                }
-                
-                if max_tokens:
-                    request_data["max_tokens"] = max_tokens
-                
-                if stream:
-                    return {
-                        "provider": provider,
-                        "model": actual_model,
-                        "display_model": display_model,
-                        "stream": True,
-                        "stream_generator": self._stream_ollama_request(request_data)
-                    }
-                else:
-                    result = await self._make_ollama_request(request_data)
-                    return {
-                        "provider": provider,
-                        "model": actual_model,
-                        "display_model": display_model,
-                        "result": result,
-                        "stream": False
-                    }
+                return await self._ollama_request(actual_model, display_model, messages, temperature,
+                                                  max_tokens, stream, stream_mode, sampling)
+            
+            elif provider == "llamacpp":
+                return await self._llamacpp_request(actual_model, display_model, messages, temperature,
+                                                    max_tokens, stream, stream_mode, sampling)
                 
             elif provider == "openrouter":
                 # Use OpenRouter client
@@ -520,7 +871,10 @@ class Router:
                             model=actual_model,
                             messages=messages,
                             temperature=temperature,
-                            max_tokens=max_tokens
+                            max_tokens=max_tokens,
+                            stream_mode=stream_mode,
+                            display_model=display_model,
+                            sampling=sampling
                         )
                     }
                 else:
@@ -529,7 +883,8 @@ class Router:
                         messages=messages,
                         temperature=temperature,
                         max_tokens=max_tokens,
-                        stream=False
+                        stream=False,
+                        sampling=sampling
                     )
                     
                     # Check if result is an error response - don't fallback for user/billing errors
@@ -571,36 +926,10 @@ class Router:
                             fallback_model = self.ollama_client.get_model_name(model, self.ollama_mappings)
                             logger.info(f"Fallback: {model} → ollama:{fallback_model}")
                             
-                            processed_messages = self.ollama_client.process_messages(messages, self.thinking_mode)
-                            request_data = {
-                                "model": fallback_model,
-                                "messages": processed_messages,
-                                "temperature": temperature,
-                                "stream": stream
-                            }
-                            
-                            if max_tokens:
-                                request_data["max_tokens"] = max_tokens
-                            
-                            if stream:
-                                return {
-                                    "provider": "ollama",
-                                    "model": fallback_model,
-                                    "display_model": model,
-                                    "stream": True,
-                                    "stream_generator": self._stream_ollama_request(request_data),
-                                    "fallback": True
-                                }
-                            else:
-                                result = await self._make_ollama_request(request_data)
-                                return {
-                                    "provider": "ollama",
-                                    "model": fallback_model,
-                                    "display_model": model,
-                                    "result": result,
-                                    "stream": False,
-                                    "fallback": True
-                                }
+                            result = await self._ollama_request(fallback_model, model, messages, temperature,
+                                                                max_tokens, stream, stream_mode, sampling)
+                            result["fallback"] = True
+                            return result
                             
                         elif alt_provider == "openrouter" and self.openrouter_client:
                             # Use a common fallback model
@@ -618,7 +947,10 @@ class Router:
                                         model=fallback_model,
                                         messages=messages,
                                         temperature=temperature,
-                                        max_tokens=max_tokens
+                                        max_tokens=max_tokens,
+                                        stream_mode=stream_mode,
+                                        display_model=model,
+                                        sampling=sampling
                                     )
                                 }
                             else:
@@ -627,7 +959,8 @@ class Router:
                                     messages=messages,
                                     temperature=temperature,
                                     max_tokens=max_tokens,
-                                    stream=False
+                                    stream=False,
+                                    sampling=sampling
                                 )
                                 
                                 return {
@@ -646,29 +979,72 @@ class Router:
         # All providers failed
         raise Exception(f"All providers failed. Primary error: {str(primary_error)}")
     
+    def _get_health_status(self, provider: str) -> Dict[str, Any]:
+        breaker = self.health.get_breaker(provider)
+        return {
+            "healthy": self.get_client(provider) is not None and self.health.is_available(provider),
+            "consecutive_failures": breaker.consecutive_failures if breaker else 0,
+            "circuit": breaker.state if breaker else None,
+            "last_error": breaker.last_error if breaker else None
+        }
+    
+    @staticmethod
+    def _get_cancellation_stats(client) -> Dict[str, int]:
+        handler = getattr(client, "response_handler", None)
+        if handler is None:
+            return {"streams": 0, "tokens": 0}
+        return {"streams": handler.cancelled_streams, "tokens": handler.cancelled_tokens}
+    
+    @staticmethod
+    def _get_context_window_stats(client) -> Dict[str, Any]:
+        handler = getattr(client, "request_handler", None)
+        if handler is None:
+            return {}
+        return handler.context_window.get_stats()
+    
     def get_provider_status(self) -> Dict[str, Any]:
         """Get status of all providers."""
+        snapshot = self.get_model_snapshot()
         return {
             "ollama": {
-                "enabled": True,
-                "healthy": self.provider_health["ollama"]["available"],
-                "models": len(self.ollama_client.available_models) if self.ollama_client else 0,
+                "enabled": bool(self.ollama_client),
+                "models": snapshot.counts.get("ollama", 0),
                 "endpoint": self.ollama_endpoint,
-                "consecutive_failures": self.provider_health["ollama"]["consecutive_failures"]
+                **self._get_health_status("ollama"),
+                "admission": self.admission.get_stats("ollama"),
+                "cancellations": self._get_cancellation_stats(self.ollama_client),
+                "context_window": self._get_context_window_stats(self.ollama_client),
+                "residency": self.ollama_client.residency.get_stats() if self.ollama_client else None,
+                "options": self.ollama_client.options.get_stats() if self.ollama_client else None
             },
             "openrouter": {
                 "enabled": bool(self.openrouter_client),
-                "healthy": self.provider_health["openrouter"]["available"],
-                "models": len(self.openrouter_client.available_models) if self.openrouter_client else 0,
+                "models": snapshot.counts.get("openrouter", 0),
                 "endpoint": self.openrouter_client.endpoint if self.openrouter_client else None,
-                "consecutive_failures": self.provider_health["openrouter"]["consecutive_failures"]
+                **self._get_health_status("openrouter"),
+                "admission": self.admission.get_stats("openrouter"),
+                "cancellations": self._get_cancellation_stats(self.openrouter_client),
+                "context_window": self._get_context_window_stats(self.openrouter_client)
             },
             "llamacpp": {
                 "enabled": bool(self.llamacpp_client),
-                "healthy": self.provider_health["llamacpp"]["available"],
-                "models": len(self.llamacpp_client.available_models) if self.llamacpp_client else 0,
+                "models": snapshot.counts.get("llamacpp", 0),
                 "endpoint": self.llamacpp_client.endpoint if self.llamacpp_client else None,
-                "consecutive_failures": self.provider_health["llamacpp"]["consecutive_failures"]
+                **self._get_health_status("llamacpp"),
+                "admission": self.admission.get_stats("llamacpp"),
+                "cancellations": self._get_cancellation_stats(self.llamacpp_client),
+                "context_window": self._get_context_window_stats(self.llamacpp_client),
+                "slots": self.llamacpp_client.slots.get_stats() if self.llamacpp_client else None
             },
-            "routing": self.routing_config
+            "routing": self.routing_config,
+            "connection_pools": self.pools.get_stats(),
+            "model_catalogue": self.catalogue.get_stats(),
+            "scheduler": self.scheduler.get_stats(),
+            "response_cache": self.response_cache.get_stats(),
+            "coalescing": self.coalescer.get_stats(),
+            "hedging": self.hedging.get_stats(),
+            "routing_policy": self.routing_policy.get_stats(),
+            "token_counts": token_counter.get_stats(),
+            "models_version": snapshot.version,
+            "models_total": len(snapshot)
         }
@@ -0,0 +1,475 @@
+import logging
+import json
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, AsyncGenerator
+
+from .hedging import CONTENT_RE
+
+# Output token count in the usage block of a final SSE event
+COMPLETION_TOKENS_RE = re.compile(rb'"completion_tokens"\s*:\s*(\d+)')
+
+logger = logging.getLogger(__name__)
+
+# Built-in routing policies
+POLICY_STATIC = "static"  # mapping tables and provider_priority only, as resolved by the router
+POLICY_LOWEST_LATENCY = "lowest_latency"  # smallest expected queue wait + TTFT + generation time
+POLICY_CHEAPEST = "cheapest"  # lowest expected price, latency breaks ties
+POLICY_LOCAL_FIRST = "local_first"  # local providers until they are saturated, then spill over
+POLICY_AUTO = "auto"  # local_first if routing.prefer_local, cheapest if routing.cost_optimization, else static
+
+DEFAULT_ROUTING_POLICY_SETTINGS = {
+    "policy": POLICY_AUTO,
+    "ewma_alpha": 0.2,
+    "default_ttft": 1.0,  # seconds, assumed for provider/model pairs without observations
+    "default_tokens_per_second": 30.0,
+    "expected_completion_tokens": 256,  # used for estimates when max_tokens is not set
+    "local_providers": ["ollama", "llamacpp"],
+    "spillover_load": 1.0,  # local_first: spill once in-flight + queued reaches this multiple of max_concurrency
+    "spillover_wait": 2.0,  # local_first: ... or once the expected wait for a slot exceeds this many seconds
+    "record_path": None  # JSONL file every routed request is appended to, for the simulator
+}
+
+
+class Candidate:
+    """A provider and model that could serve a request, with what is known about them right now."""
+
+    __slots__ = ("provider", "model", "priority", "local", "context_length", "prompt_price", "completion_price",
+                 "ttft", "tokens_per_second", "active", "queued", "max_concurrency", "max_queue", "expected_wait")
+
+    def __init__(self, provider: str, model: str, priority: int = 0, local: bool = False,
+                 context_length: Optional[int] = None, prompt_price: float = 0.0, completion_price: float = 0.0,
+                 ttft: float = 1.0, tokens_per_second: float = 30.0, active: int = 0, queued: int = 0,
+                 max_concurrency: int = 1, max_queue: int = 0, expected_wait: float = 0.0):
+        self.provider = provider
+        self.model = model
+        self.priority = priority
+        self.local = local
+        self.context_length = context_length
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.active = active
+        self.queued = queued
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.expected_wait = expected_wait
+
+    @property
+    def load(self) -> float:
+        """In-flight plus queued requests relative to the concurrency limit."""
+        return (self.active + self.queued) / self.max_concurrency
+
+    @property
+    def saturated(self) -> bool:
+        """Admission would reject another request right now."""
+        return self.active >= self.max_concurrency and self.queued >= self.max_queue
+
+    def fits(self, request: "RouteRequest") -> bool:
+        return self.context_length is None or request.prompt_tokens + request.completion_tokens <= self.context_length
+
+    def expected_latency(self, request: "RouteRequest") -> float:
+        return self.expected_wait + self.ttft + request.completion_tokens / max(self.tokens_per_second, 0.1)
+
+    def expected_cost(self, request: "RouteRequest") -> float:
+        return request.prompt_tokens * self.prompt_price + request.completion_tokens * self.completion_price
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The static part of a candidate, as recorded in traffic traces."""
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "priority": self.priority,
+            "local": self.local,
+            "context_length": self.context_length,
+            "prompt_price": self.prompt_price,
+            "completion_price": self.completion_price
+        }
+
+
+class RouteRequest:
+    """The parts of a request routing policies look at."""
+
+    __slots__ = ("model", "prompt_tokens", "completion_tokens", "stream")
+
+    def __init__(self, model: str, prompt_tokens: int, completion_tokens: int, stream: bool = False):
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.stream = stream
+
+
+class RoutingPolicy:
+    """
+    Base class of routing policies.
+
+    `choose` gets the candidates in static order (the provider the mapping
+    tables and provider_priority would pick comes first) and returns the one
+    to use. Candidates whose context window is too small or whose admission
+    queue is full are left out unless nothing else remains. Subclasses
+    usually only implement `score`; lower scores win.
+    """
+
+    name = "base"
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+
+    def score(self, candidate: Candidate, request: RouteRequest):
+        raise NotImplementedError
+
+    @staticmethod
+    def feasible(candidates: List[Candidate], request: RouteRequest) -> List[Candidate]:
+        usable = [candidate for candidate in candidates if candidate.fits(request) and not candidate.saturated]
+        return usable or [candidate for candidate in candidates if candidate.fits(request)] or candidates
+
+    def choose(self, candidates: List[Candidate], request: RouteRequest) -> Optional[Candidate]:
+        if not candidates:
+            return None
+        return min(self.feasible(candidates, request), key=lambda candidate: self.score(candidate, request))
+
+
+class StaticPolicy(RoutingPolicy):
+    """What the mapping tables and provider_priority resolve to, ignoring live state."""
+
+    name = POLICY_STATIC
+
+    def choose(self, candidates: List[Candidate], request: RouteRequest) -> Optional[Candidate]:
+        return candidates[0] if candidates else None
+
+
+class LowestLatencyPolicy(RoutingPolicy):
+    """Shortest expected completion: queue wait, time to first token and generation at the observed rate."""
+
+    name = POLICY_LOWEST_LATENCY
+
+    def score(self, candidate: Candidate, request: RouteRequest):
+        return candidate.expected_latency(request), candidate.priority
+
+
+class CheapestPolicy(RoutingPolicy):
+    """Lowest expected price from per-token pricing; local providers cost nothing."""
+
+    name = POLICY_CHEAPEST
+
+    def score(self, candidate: Candidate, request: RouteRequest):
+        return candidate.expected_cost(request), candidate.expected_latency(request), candidate.priority
+
+
+class LocalFirstPolicy(RoutingPolicy):
+    """
+    Local providers in priority order while they have headroom; once the
+    load or expected wait passes the spillover thresholds, the fastest
+    remaining candidate takes the request.
+    """
+
+    name = POLICY_LOCAL_FIRST
+
+    def spills(self, candidate: Candidate) -> bool:
+        return (candidate.load >= self.settings["spillover_load"]
+                or candidate.expected_wait > self.settings["spillover_wait"])
+
+    def score(self, candidate: Candidate, request: RouteRequest):
+        if candidate.local and not self.spills(candidate):
+            return 0, candidate.priority, 0.0
+        return 1, 0, candidate.expected_latency(request)
+
+
+ROUTING_POLICIES = {
+    POLICY_STATIC: StaticPolicy,
+    POLICY_LOWEST_LATENCY: LowestLatencyPolicy,
+    POLICY_CHEAPEST: CheapestPolicy,
+    POLICY_LOCAL_FIRST: LocalFirstPolicy
+}
+
+
+def register_policy(name: str, policy_class: type):
+    """Make a RoutingPolicy subclass selectable as routing_policy.policy in config.json."""
+    ROUTING_POLICIES[name] = policy_class
+
+
+def _price(value: Any) -> float:
+    """OpenRouter reports prices per token as strings; anything unparseable counts as free."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _Ewma:
+    __slots__ = ("value", "samples")
+
+    def __init__(self):
+        self.value: Optional[float] = None
+        self.samples = 0
+
+    def update(self, sample: float, alpha: float):
+        self.value = sample if self.value is None else alpha * sample + (1 - alpha) * self.value
+        self.samples += 1
+
+
+class ProviderMetrics:
+    """EWMA time-to-first-token and generation rate per provider and model, and per provider overall."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._ttft: Dict[Tuple[str, Optional[str]], _Ewma] = {}
+        self._rate: Dict[Tuple[str, Optional[str]], _Ewma] = {}
+        self.errors: Dict[str, int] = {}
+
+    def _update(self, table: Dict[Tuple[str, Optional[str]], _Ewma], provider: str, model: str, sample: float):
+        for key in ((provider, model), (provider, None)):
+            ewma = table.get(key)
+            if ewma is None:
+                ewma = table[key] = _Ewma()
+            ewma.update(sample, self.alpha)
+
+    def record(self, provider: str, model: str, ttft: Optional[float] = None,
+               tokens: int = 0, duration: Optional[float] = None):
+        if ttft is not None:
+            self._update(self._ttft, provider, model, ttft)
+        if tokens > 1 and duration:
+            # Generation rate after the first token; without a TTFT, the best guess of it is subtracted
+            first = ttft if ttft is not None else (self.ttft(provider, model) or 0.0)
+            generating = duration - first
+            if generating > 0:
+                self._update(self._rate, provider, model, tokens / generating)
+
+    def record_error(self, provider: str):
+        self.errors[provider] = self.errors.get(provider, 0) + 1
+
+    @staticmethod
+    def _lookup(table: Dict[Tuple[str, Optional[str]], _Ewma], provider: str, model: str) -> Optional[float]:
+        ewma = table.get((provider, model)) or table.get((provider, None))
+        return ewma.value if ewma is not None else None
+
+    def ttft(self, provider: str, model: str) -> Optional[float]:
+        """Observed TTFT of the model, else of the provider overall, else None."""
+        return self._lookup(self._ttft, provider, model)
+
+    def tokens_per_second(self, provider: str, model: str) -> Optional[float]:
+        return self._lookup(self._rate, provider, model)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {}
+        for name, table in (("ttft", self._ttft), ("tokens_per_second", self._rate)):
+            for (provider, model), ewma in table.items():
+                if model is not None:
+                    entry = stats.setdefault(f"{provider}/{model}", {})
+                    entry[name] = round(ewma.value, 3)
+                    entry[f"{name}_samples"] = ewma.samples
+        return {"models": stats, "errors": dict(self.errors)}
+
+
+class RoutingPolicyEngine:
+    """
+    Per-request provider selection by a pluggable routing policy.
+
+    The router hands over the candidates for a request (every healthy
+    provider that maps or lists the requested model, the statically resolved
+    one first). The engine fills in what it knows about each: EWMA TTFT and
+    tokens/sec observed on earlier responses, in-flight load and queue depth
+    from admission control, the model's context length and the per-token
+    price from the provider catalogue. The configured policy then picks one.
+
+    Every routed response is measured for the metrics, and with
+    `record_path` set each request is appended to a JSONL trace that the
+    simulator (`python -m core.routing_sim`) replays against the policies.
+    Under the static policy streams are only measured while recording, as
+    nothing else reads their metrics.
+
+    Configured by the "routing_policy" section of config.json.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, routing_config: Optional[Dict[str, Any]] = None):
+        settings = dict(DEFAULT_ROUTING_POLICY_SETTINGS)
+        settings.update(config or {})
+        self.settings = settings
+        self.policy_name = self._resolve_policy_name(settings["policy"], routing_config or {})
+        self.policy: RoutingPolicy = ROUTING_POLICIES[self.policy_name](settings)
+        self.local_providers = set(settings["local_providers"])
+        self.default_ttft = settings["default_ttft"]
+        self.default_tokens_per_second = settings["default_tokens_per_second"]
+        self.expected_completion_tokens = settings["expected_completion_tokens"]
+        self.metrics = ProviderMetrics(settings["ewma_alpha"])
+        self.record_path = settings["record_path"]
+        self._record_file = None
+        self.decisions: Dict[str, int] = {}
+        self.overrides = 0
+
+    @staticmethod
+    def _resolve_policy_name(name: str, routing_config: Dict[str, Any]) -> str:
+        if name == POLICY_AUTO:
+            if routing_config.get("prefer_local"):
+                return POLICY_LOCAL_FIRST
+            if routing_config.get("cost_optimization"):
+                return POLICY_CHEAPEST
+            return POLICY_STATIC
+        if name not in ROUTING_POLICIES:
+            logger.warning(f"Unknown routing policy '{name}', using {POLICY_STATIC}")
+            return POLICY_STATIC
+        return name
+
+    @property
+    def is_static(self) -> bool:
+        return self.policy_name == POLICY_STATIC
+
+    @property
+    def measures_streams(self) -> bool:
+        """Whether anything reads stream measurements: a dynamic policy's metrics or the traffic trace."""
+        return not self.is_static or bool(self.record_path)
+
+    def make_request(self, model: str, prompt_tokens: int, max_tokens: Optional[int], stream: bool) -> RouteRequest:
+        return RouteRequest(model, prompt_tokens, max_tokens or self.expected_completion_tokens, stream)
+
+    def make_candidate(self, provider: str, model: str, priority: int, load: Dict[str, Any],
+                       context_length: Optional[int] = None, pricing: Optional[Dict[str, Any]] = None) -> Candidate:
+        """A candidate with the current metrics and the admission state in `load`."""
+        pricing = pricing or {}
+        active = load.get("active", 0)
+        queued = load.get("queued", 0)
+        max_concurrency = max(1, load.get("max_concurrency", 1))
+        expected_wait = 0.0
+        if active >= max_concurrency or queued:
+            expected_wait = (queued + 1) * load.get("avg_service_time", 0.0) / max_concurrency
+        ttft = self.metrics.ttft(provider, model)
+        rate = self.metrics.tokens_per_second(provider, model)
+        return Candidate(
+            provider, model, priority,
+            local=provider in self.local_providers,
+            context_length=context_length,
+            prompt_price=_price(pricing.get("prompt")),
+            completion_price=_price(pricing.get("completion")),
+            ttft=ttft if ttft is not None else self.default_ttft,
+            tokens_per_second=rate if rate is not None else self.default_tokens_per_second,
+            active=active, queued=queued, max_concurrency=max_concurrency,
+            max_queue=load.get("max_queue", 0), expected_wait=expected_wait
+        )
+
+    def choose(self, candidates: List[Candidate], request: RouteRequest) -> Optional[Candidate]:
+        chosen = self.policy.choose(candidates, request)
+        if chosen is not None:
+            self.decisions[chosen.provider] = self.decisions.get(chosen.provider, 0) + 1
+            if candidates and chosen is not candidates[0]:
+                self.overrides += 1
+                logger.info(f"Routing policy {self.policy_name}: {request.model} → {chosen.provider}:{chosen.model} "
+                            f"instead of {candidates[0].provider}:{candidates[0].model}")
+        return chosen
+
+    def observe(self, result: Dict[str, Any], started: float, trace: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Measure a routed result: streams when they finish, other results right away."""
+        if not isinstance(result, dict) or not result.get("provider"):
+            return result
+        provider, model = result["provider"], result.get("model")
+        generator = result.get("stream_generator")
+        if generator is not None:
+            if self.measures_streams:
+                result["stream_generator"] = self._observe_stream(provider, model, generator, started, trace)
+            return result
+
+        payload = result.get("result")
+        duration = time.monotonic() - started
+        if "error" in result or (isinstance(payload, dict) and "error" in payload):
+            self.metrics.record_error(provider)
+            self._record(trace, provider, model, None, duration, 0, error=True)
+            return result
+        usage = payload.get("usage") if isinstance(payload, dict) else None
+        tokens = (usage or {}).get("completion_tokens", 0)
+        self.metrics.record(provider, model, tokens=tokens, duration=duration)
+        self._record(trace, provider, model, None, duration, tokens)
+        return result
+
+    async def _observe_stream(self, provider: str, model: str, generator: AsyncGenerator, started: float,
+                              trace: Optional[Dict[str, Any]]) -> AsyncGenerator:
+        ttft = None
+        events = 0  # events after the one carrying the first token
+        tail = deque(maxlen=3)  # last chunks, for the usage block and the closing events
+        error = False
+        completed = False
+        try:
+            async for chunk in generator:
+                data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                if not isinstance(data, bytes):
+                    pass
+                elif ttft is not None:
+                    # Past the first token only events are counted, the hot path stays a byte relay
+                    events += data.count(b"data: ")
+                    tail.append(data)
+                elif CONTENT_RE.search(data):
+                    ttft = time.monotonic() - started
+                    events = len(CONTENT_RE.findall(data)) - 1
+                elif b'"error"' in data:
+                    error = True
+                yield chunk
+            completed = True
+        finally:
+            await generator.aclose()
+            duration = time.monotonic() - started
+            tokens = self._stream_tokens(events, tail) if ttft is not None else 0
+            if error:
+                self.metrics.record_error(provider)
+            elif ttft is not None:
+                # Streams cut short by the client still tell the TTFT, but not the rate
+                self.metrics.record(provider, model, ttft=ttft, tokens=tokens if completed else 0, duration=duration)
+            if error or ttft is not None or completed:
+                # A stream abandoned before its first token (a lost hedge race) says nothing about the provider
+                self._record(trace, provider, model, ttft, duration, tokens, error=error)
+
+    @staticmethod
+    def _stream_tokens(events: int, tail: deque) -> int:
+        """Output tokens of a stream: its usage block if it sent one, else one per content event."""
+        for data in reversed(tail):
+            match = COMPLETION_TOKENS_RE.search(data)
+            if match:
+                return int(match.group(1))
+        # The finish, usage and [DONE] events at the end carry no text
+        closing = sum(data.count(b"data: ") - len(CONTENT_RE.findall(data)) for data in tail)
+        return max(1, 1 + events - closing)
+
+    def _record(self, trace: Optional[Dict[str, Any]], provider: str, model: Optional[str],
+                ttft: Optional[float], duration: float, tokens: int, error: bool = False):
+        if trace is None or not self.record_path:
+            return
+        entry = dict(trace, provider=provider, provider_model=model,
+                     ttft=round(ttft, 4) if ttft is not None else None,
+                     duration=round(duration, 4), output_tokens=tokens, error=error)
+        try:
+            if self._record_file is None:
+                path = Path(self.record_path).expanduser()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self._record_file = open(path, "a", encoding="utf-8")
+            self._record_file.write(json.dumps(entry) + "\n")
+            self._record_file.flush()
+        except Exception as e:
+            logger.warning(f"Could not record routed request to {self.record_path}: {str(e)}")
+            self.record_path = None
+
+    def trace(self, request: RouteRequest, candidates: List[Candidate]) -> Optional[Dict[str, Any]]:
+        """Start of a trace entry for a request, or None when traffic isn't recorded."""
+        if not self.record_path:
+            return None
+        return {
+            "time": round(time.time(), 4),
+            "model": request.model,
+            "prompt_tokens": request.prompt_tokens,
+            "completion_tokens": request.completion_tokens,
+            "stream": request.stream,
+            "candidates": [candidate.to_dict() for candidate in candidates]
+        }
+
+    def close(self):
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(
+            self.metrics.get_stats(),
+            policy=self.policy_name,
+            decisions=dict(self.decisions),
+            overrides=self.overrides,
+            recording=self.record_path
+        )
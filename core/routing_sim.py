@@ -0,0 +1,261 @@
+import logging
+import argparse
+import heapq
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from .admission import AdmissionController
+from .routing_policy import (
+    RoutingPolicyEngine, RouteRequest, ROUTING_POLICIES, DEFAULT_ROUTING_POLICY_SETTINGS, POLICY_AUTO
+)
+from .util import load_config
+
+logger = logging.getLogger(__name__)
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """Routed requests recorded with routing_policy.record_path, in arrival order."""
+    records = []
+    with open(Path(path).expanduser(), encoding="utf-8") as trace:
+        for number, line in enumerate(trace, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed trace line {number}")
+                continue
+            if record.get("candidates"):
+                records.append(record)
+    records.sort(key=lambda record: record.get("time", 0))
+    return records
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class ServiceModel:
+    """
+    How long each provider and model takes to answer, learned from the trace.
+
+    Mean TTFT and generation rate of the requests a provider/model actually
+    served; pairs that never served a request fall back to the provider's
+    averages, then to the configured defaults.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], default_ttft: float, default_tokens_per_second: float):
+        self.default_ttft = default_ttft
+        self.default_tokens_per_second = default_tokens_per_second
+        ttfts: Dict[Tuple[str, Optional[str]], List[float]] = {}
+        rates: Dict[Tuple[str, Optional[str]], List[float]] = {}
+        for record in records:
+            if record.get("error") or not record.get("provider"):
+                continue
+            provider, model = record["provider"], record.get("provider_model")
+            ttft = record.get("ttft")
+            duration = record.get("duration") or 0.0
+            tokens = record.get("output_tokens") or 0
+            for key in ((provider, model), (provider, None)):
+                if ttft is not None:
+                    ttfts.setdefault(key, []).append(ttft)
+                generating = duration - (ttft or 0.0)
+                if tokens > 1 and generating > 0:
+                    rates.setdefault(key, []).append(tokens / generating)
+        self.ttft = {key: sum(values) / len(values) for key, values in ttfts.items()}
+        self.rate = {key: sum(values) / len(values) for key, values in rates.items()}
+
+    def service(self, provider: str, model: str, output_tokens: int) -> Tuple[float, float]:
+        """(TTFT, total service time) of a request on a provider and model."""
+        ttft = self.ttft.get((provider, model), self.ttft.get((provider, None), self.default_ttft))
+        rate = self.rate.get((provider, model), self.rate.get((provider, None), self.default_tokens_per_second))
+        return ttft, ttft + output_tokens / max(rate, 0.1)
+
+
+class _SimulatedProvider:
+    """Admission slots and queue of one provider during a replay."""
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.slots = [0.0] * self.max_concurrency  # heap of times at which each slot becomes free
+        self.assigned: List[Tuple[float, float]] = []  # (start, end) of requests not finished yet
+        self.avg_service_time = 0.0
+
+    def load(self, now: float) -> Dict[str, Any]:
+        self.assigned = [(start, end) for start, end in self.assigned if end > now]
+        return {
+            "active": sum(1 for start, _ in self.assigned if start <= now),
+            "queued": sum(1 for start, _ in self.assigned if start > now),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "avg_service_time": self.avg_service_time
+        }
+
+    def assign(self, now: float, service_time: float) -> float:
+        """Queue a request FIFO for the next free slot; returns its start time."""
+        start = max(now, heapq.heappop(self.slots))
+        heapq.heappush(self.slots, start + service_time)
+        self.assigned.append((start, start + service_time))
+        self.avg_service_time = (service_time if not self.avg_service_time
+                                 else 0.2 * service_time + 0.8 * self.avg_service_time)
+        return start
+
+
+class RoutingSimulator:
+    """
+    Replays recorded traffic against a routing policy.
+
+    Requests arrive at their recorded times (scaled by `speed`) with their
+    recorded candidates, prompt sizes and output lengths. Each provider
+    serves them through its admission limits from config.json, taking as
+    long as the service model learned from the trace says. The policy sees
+    what it would see live: load and queue depth of the simulated
+    providers, and EWMA metrics of the simulated responses finished so far.
+
+    Reports time to first token (including queueing), total latency, cost,
+    rejections, context overflows and the share of requests per provider.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.config = config
+        self.routing_config = config.get("routing", {})
+        self.policy_settings = dict(DEFAULT_ROUTING_POLICY_SETTINGS)
+        self.policy_settings.update(config.get("routing_policy", {}))
+        self.policy_settings["record_path"] = None
+        self.admission = AdmissionController(config.get("admission", {}))
+
+    def simulate(self, records: List[Dict[str, Any]], policy: str, speed: float = 1.0) -> Dict[str, Any]:
+        settings = dict(self.policy_settings, policy=policy)
+        engine = RoutingPolicyEngine(settings, self.routing_config)
+        services = ServiceModel(records, settings["default_ttft"], settings["default_tokens_per_second"])
+        providers: Dict[str, _SimulatedProvider] = {}
+        completions: List[Tuple[float, int, str, str, float, float, int]] = []
+
+        ttfts: List[float] = []
+        latencies: List[float] = []
+        shares: Dict[str, int] = {}
+        cost = 0.0
+        rejected = 0
+        overflows = 0
+        origin = records[0].get("time", 0) if records else 0
+
+        for index, record in enumerate(records):
+            now = (record.get("time", 0) - origin) / max(speed, 1e-6)
+            # Responses that finished by now update the metrics the policy scores with
+            while completions and completions[0][0] <= now:
+                end, _, provider, model, ttft, service_time, tokens = heapq.heappop(completions)
+                engine.metrics.record(provider, model, ttft=ttft, tokens=tokens, duration=service_time)
+
+            output_tokens = record.get("output_tokens") or record.get("completion_tokens") or 0
+            request = RouteRequest(record.get("model", ""), record.get("prompt_tokens", 0),
+                                   record.get("completion_tokens") or output_tokens, record.get("stream", False))
+            candidates = []
+            for entry in record["candidates"]:
+                provider = entry["provider"]
+                simulated = providers.get(provider)
+                if simulated is None:
+                    limits = self.admission.get_settings(provider)
+                    simulated = providers[provider] = _SimulatedProvider(limits["max_concurrency"],
+                                                                         limits["max_queue"])
+                candidates.append(engine.make_candidate(
+                    provider, entry["model"], entry.get("priority", 0), simulated.load(now),
+                    entry.get("context_length"),
+                    {"prompt": entry.get("prompt_price", 0), "completion": entry.get("completion_price", 0)}))
+
+            chosen = engine.choose(candidates, request)
+            if chosen is None:
+                continue
+            if chosen.saturated:
+                rejected += 1
+                continue
+            if not chosen.fits(request):
+                overflows += 1
+                continue
+
+            ttft, service_time = services.service(chosen.provider, chosen.model, output_tokens)
+            start = providers[chosen.provider].assign(now, service_time)
+            heapq.heappush(completions, (start + service_time, index, chosen.provider, chosen.model,
+                                         ttft, service_time, output_tokens))
+            ttfts.append(start - now + ttft)
+            latencies.append(start - now + service_time)
+            shares[chosen.provider] = shares.get(chosen.provider, 0) + 1
+            cost += chosen.expected_cost(RouteRequest(request.model, request.prompt_tokens, output_tokens))
+
+        served = len(latencies)
+        return {
+            "policy": engine.policy_name,
+            "requests": len(records),
+            "served": served,
+            "rejected": rejected,
+            "context_overflows": overflows,
+            "ttft": self._summary(ttfts),
+            "latency": self._summary(latencies),
+            "cost": round(cost, 6),
+            "providers": {provider: round(count / served, 3) for provider, count in sorted(shares.items())} if served else {}
+        }
+
+    @staticmethod
+    def _summary(values: List[float]) -> Dict[str, Optional[float]]:
+        if not values:
+            return {"mean": None, "p50": None, "p95": None, "p99": None}
+        return {
+            "mean": round(sum(values) / len(values), 3),
+            "p50": round(_percentile(values, 0.5), 3),
+            "p95": round(_percentile(values, 0.95), 3),
+            "p99": round(_percentile(values, 0.99), 3)
+        }
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """Plain-text comparison table of simulation results."""
+    header = f"{'policy':<16}{'served':>8}{'rej':>6}{'ovf':>6}{'ttft p50':>10}{'ttft p99':>10}" \
+             f"{'lat p50':>10}{'lat p99':>10}{'cost':>12}  providers"
+    lines = [header, "-" * len(header)]
+    fmt = lambda value: f"{value:.3f}" if value is not None else "-"
+    for result in results:
+        shares = ", ".join(f"{provider} {share:.0%}" for provider, share in result["providers"].items())
+        lines.append(
+            f"{result['policy']:<16}{result['served']:>8}{result['rejected']:>6}{result['context_overflows']:>6}"
+            f"{fmt(result['ttft']['p50']):>10}{fmt(result['ttft']['p99']):>10}"
+            f"{fmt(result['latency']['p50']):>10}{fmt(result['latency']['p99']):>10}"
+            f"{result['cost']:>12.6f}  {shares}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    """Replay a recorded trace against the routing policies and compare them."""
+    parser = argparse.ArgumentParser(description='Replay recorded traffic against OllamaLink routing policies')
+    parser.add_argument('trace', help='JSONL trace written with routing_policy.record_path')
+    parser.add_argument('--policy', default='all',
+                        help=f"Policy to simulate, or 'all' (default): {', '.join(ROUTING_POLICIES)}")
+    parser.add_argument('--config', default='config.json', help='Config providing admission limits and policy settings')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed-up factor; >1 compresses arrivals')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    records = load_trace(args.trace)
+    if not records:
+        print(f"No routed requests in {args.trace}")
+        sys.exit(1)
+
+    simulator = RoutingSimulator(load_config(Path(args.config)))
+    policies = list(ROUTING_POLICIES) if args.policy == 'all' else [args.policy]
+    if any(policy not in ROUTING_POLICIES and policy != POLICY_AUTO for policy in policies):
+        parser.error(f"unknown policy {args.policy}")
+    results = [simulator.simulate(records, policy, args.speed) for policy in policies]
+    print(json.dumps(results, indent=2) if args.json else format_results(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import logging
+from typing import Dict, Any, List, Optional
+
+from .tokens import token_counter
+
+logger = logging.getLogger(__name__)
+
+# OpenAI request fields forwarded to providers besides temperature and max_tokens
+SAMPLING_PARAMETERS = ("top_p", "stop", "seed", "frequency_penalty", "presence_penalty")
+
+# OpenAI field -> Ollama option
+OLLAMA_OPTION_NAMES = {
+    "max_tokens": "num_predict",
+    "temperature": "temperature",
+    "top_p": "top_p",
+    "stop": "stop",
+    "seed": "seed",
+    "frequency_penalty": "frequency_penalty",
+    "presence_penalty": "presence_penalty"
+}
+
+DEFAULT_OPTIONS_SETTINGS = {
+    "num_ctx_buckets": [2048, 4096, 8192, 16384, 32768, 65536, 131072],
+    "max_num_ctx": 32768,  # upper bound regardless of what the model supports
+    "completion_reserve": 1024,  # room left for the answer when max_tokens is not set
+    "options": {}  # extra options sent with every request, e.g. {"num_gpu": 99}
+}
+
+
+def extract_sampling(body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The sampling parameters of an OpenAI request body, or None if it sets none."""
+    sampling = {name: body[name] for name in SAMPLING_PARAMETERS if body.get(name) is not None}
+    return sampling or None
+
+
+class OllamaOptionsTranslator:
+    """
+    Turns an OpenAI-style chat payload into an Ollama /api/chat payload.
+
+    Ollama ignores top-level sampling fields; they have to go in `options`,
+    with max_tokens renamed to num_predict. The payload also gets a `num_ctx`
+    big enough for the prompt plus the completion, rounded up to a bucket.
+    Ollama reloads a model whenever num_ctx changes, so while a model stays
+    loaded its num_ctx only grows: a shorter prompt reuses the larger window
+    instead of paying for a reload. Once the model is unloaded the next
+    request starts from the bucket it actually needs.
+
+    Configured by the "options" section of the "ollama" config.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, residency=None):
+        settings = dict(DEFAULT_OPTIONS_SETTINGS)
+        settings.update(config or {})
+        self.buckets: List[int] = sorted(settings["num_ctx_buckets"])
+        self.max_num_ctx = settings["max_num_ctx"]
+        self.completion_reserve = settings["completion_reserve"]
+        self.extra_options: Dict[str, Any] = settings["options"]
+        self.residency = residency
+        # num_ctx each model was last loaded with
+        self.num_ctx: Dict[str, int] = {}
+        self.resizes = 0
+
+    def bucket(self, tokens: int, limit: Optional[int] = None) -> int:
+        """Smallest bucket holding `tokens`, within the configured and model limits."""
+        limit = min(self.max_num_ctx, limit) if limit else self.max_num_ctx
+        size = next((bucket for bucket in self.buckets if bucket >= tokens), self.buckets[-1])
+        return max(min(size, limit), min(self.buckets[0], limit))
+
+    def translate(self, request_data: Dict[str, Any], context_length: Optional[int] = None) -> Dict[str, Any]:
+        """Return the Ollama payload for an OpenAI-style request."""
+        payload = {key: value for key, value in request_data.items() if key not in OLLAMA_OPTION_NAMES}
+        options = dict(self.extra_options)
+        for name, option in OLLAMA_OPTION_NAMES.items():
+            value = request_data.get(name)
+            if value is None:
+                continue
+            if name == "stop" and isinstance(value, str):
+                value = [value]
+            options[option] = value
+        options.update(request_data.get("options") or {})
+
+        model = request_data.get("model")
+        if "num_ctx" not in options and model:
+            options["num_ctx"] = self._num_ctx(model, request_data.get("messages", []),
+                                               options.get("num_predict"), context_length)
+        payload["options"] = options
+        return payload
+
+    def _num_ctx(self, model: str, messages: List[Dict[str, Any]], num_predict: Optional[int],
+                 context_length: Optional[int]) -> int:
+        reserve = num_predict if num_predict and num_predict > 0 else self.completion_reserve
+        needed = token_counter.count_messages(messages, model) + reserve
+        size = self.bucket(needed, context_length)
+
+        previous = self.num_ctx.get(model)
+        loaded = self.residency is None or self.residency.is_resident(model)
+        if previous is not None and loaded and previous >= size:
+            # Keep the window the model is loaded with; shrinking would force a reload
+            return previous
+        if previous is not None and previous != size and loaded:
+            self.resizes += 1
+            logger.info(f"Growing num_ctx of {model} from {previous} to {size} (~{needed} tokens needed)")
+        self.num_ctx[model] = size
+        return size
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"num_ctx": dict(self.num_ctx), "resizes": self.resizes}
@@ -0,0 +1,164 @@
+import logging
+import asyncio
+import hashlib
+import time
+from typing import Dict, Any, Optional, List
+
+from .tokens import token_counter
+
+logger = logging.getLogger(__name__)
+
+# Completion tokens assumed when a request doesn't set max_tokens
+DEFAULT_EXPECTED_COMPLETION_TOKENS = 512
+# Longest a request is delayed by its tenant's token budget before it is let through anyway
+DEFAULT_MAX_SHAPING_DELAY = 30.0
+# Idle tenants are forgotten once this many are tracked
+MAX_TRACKED_TENANTS = 10000
+
+
+class TokenBucket:
+    """
+    Token bucket used to shape, not reject, a tenant's token throughput.
+
+    `reserve` always succeeds: it takes the tokens immediately (the bucket may
+    go negative) and returns how long the caller should wait so that the
+    long-run rate stays within `rate` tokens per second.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens: float) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= tokens
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing of requests across tenants.
+
+    Every request is tagged with a virtual finish time per provider lane:
+    start = max(lane virtual time, tenant's previous finish) and
+    finish = start + cost / weight, where cost is the estimated prompt plus
+    completion tokens. The admission queue serves the lowest tag first, so
+    short interactive requests overtake long ones and a tenant that keeps
+    sending large requests only delays itself. Optional per-tenant token
+    budgets delay requests that exceed the configured rate instead of
+    failing them.
+
+    Configured by the "scheduler" section of config.json.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.enabled = config.get("enabled", True)
+        self.default_weight = float(config.get("default_weight", 1.0))
+        self.weights: Dict[str, float] = config.get("tenant_weights", {})
+        self.expected_completion_tokens = config.get("expected_completion_tokens", DEFAULT_EXPECTED_COMPLETION_TOKENS)
+        self.token_rate = config.get("token_rate")  # tokens per second per tenant, None disables shaping
+        self.token_burst = config.get("token_burst", (self.token_rate or 0) * 60)
+        self.max_shaping_delay = config.get("max_shaping_delay", DEFAULT_MAX_SHAPING_DELAY)
+        self._virtual_time: Dict[str, float] = {}
+        self._finish: Dict[str, Dict[str, float]] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.shaped = 0
+        self.shaping_delay_total = 0.0
+        self.tenant_tokens: Dict[str, int] = {}
+
+    @staticmethod
+    def tenant_from_headers(headers) -> str:
+        """
+        Identify the tenant of a request: explicit client id, then API key,
+        then User-Agent. The client id comes first because with api_key auth
+        enabled every client sends the same bridge key. API keys are hashed
+        so they never end up in stats.
+        """
+        client_id = headers.get("X-Client-ID")
+        if client_id:
+            return f"client:{client_id}"
+        auth = headers.get("Authorization", "")
+        if auth.lower().startswith("bearer ") and len(auth) > 7:
+            return "key:" + hashlib.sha256(auth[7:].strip().encode("utf-8")).hexdigest()[:12]
+        return f"agent:{headers.get('User-Agent', 'unknown')}"
+
+    def estimate_cost(self, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None,
+                      model: Optional[str] = None) -> int:
+        """Estimated tokens a request will consume (prompt plus completion)."""
+        completion = max_tokens if max_tokens else self.expected_completion_tokens
+        return token_counter.count_messages(messages, model) + completion
+
+    def get_weight(self, tenant: str) -> float:
+        weight = self.weights.get(tenant)
+        if weight is None and ":" in tenant:
+            weight = self.weights.get(tenant.split(":", 1)[1])
+        return float(weight) if weight else self.default_weight
+
+    def tag(self, lane: str, tenant: str, cost: int) -> float:
+        """Compute the virtual finish time of a request; lower is served first."""
+        finishes = self._finish.setdefault(lane, {})
+        virtual_time = self._virtual_time.get(lane, 0.0)
+        start = max(virtual_time, finishes.get(tenant, 0.0))
+        finish = start + cost / self.get_weight(tenant)
+        finishes[tenant] = finish
+        if len(finishes) > MAX_TRACKED_TENANTS:
+            # Tenants whose last finish is behind the lane clock are idle and start fresh anyway
+            self._finish[lane] = {t: f for t, f in finishes.items() if f > virtual_time}
+        return finish
+
+    def dispatched(self, lane: str, tag: float):
+        """Advance the lane's virtual time when a tagged request starts running."""
+        if tag > self._virtual_time.get(lane, 0.0):
+            self._virtual_time[lane] = tag
+
+    async def shape(self, tenant: str, cost: int) -> float:
+        """Delay a request until its tenant's token budget allows it; returns the delay."""
+        if tenant not in self.tenant_tokens and len(self.tenant_tokens) >= MAX_TRACKED_TENANTS:
+            self.tenant_tokens.clear()
+        self.tenant_tokens[tenant] = self.tenant_tokens.get(tenant, 0) + cost
+        if not self.token_rate:
+            return 0.0
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_TENANTS:
+                self._evict_buckets()
+            bucket = TokenBucket(self.token_rate * self.get_weight(tenant), max(self.token_burst, cost))
+            self._buckets[tenant] = bucket
+        delay = min(bucket.reserve(cost), self.max_shaping_delay)
+        if delay > 0:
+            self.shaped += 1
+            self.shaping_delay_total += delay
+            logger.info(f"Shaping {tenant}: delaying request by {delay:.2f}s")
+            await asyncio.sleep(delay)
+        return delay
+
+    def _evict_buckets(self):
+        """Forget buckets that have refilled completely; they are no different from new ones."""
+        now = time.monotonic()
+        for tenant, bucket in list(self._buckets.items()):
+            bucket._refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self._buckets[tenant]
+        if len(self._buckets) >= MAX_TRACKED_TENANTS:
+            self._buckets.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return scheduler state for status endpoints."""
+        return {
+            "enabled": self.enabled,
+            "tenants": len(self.tenant_tokens),
+            "token_rate": self.token_rate,
+            "shaped_requests": self.shaped,
+            "shaping_delay_total": round(self.shaping_delay_total, 3),
+            "virtual_time": {lane: round(value, 1) for lane, value in self._virtual_time.items()}
+        }
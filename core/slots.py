@@ -0,0 +1,283 @@
+import logging
+import asyncio
+import time
+from typing import Dict, Any, List, Optional, Callable
+
+import httpx
+
+from .context_window import prefix_digests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOT_SETTINGS = {
+    "enabled": True,
+    "refresh_interval": 5.0,  # seconds between /slots polls, done lazily on the request path
+    "poll_timeout": 2.0,
+    "max_pinned_wait": 5.0  # seconds a request waits for the busy slot holding its conversation
+}
+
+
+class _Slot:
+    """One llama.cpp slot and the prompt it is believed to hold in its KV cache."""
+
+    def __init__(self, instance: int, slot_id: int):
+        self.instance = instance
+        self.id = slot_id
+        self.n_ctx: Optional[int] = None
+        self.active = 0  # requests this router has in flight on the slot
+        self.busy = False  # processing according to the last /slots poll
+        self.last_used = 0.0
+        self.digests: List[bytes] = []
+
+    @property
+    def free(self) -> bool:
+        return self.active == 0 and not self.busy
+
+    def matched(self, digests: List[bytes]) -> int:
+        """Number of leading messages this slot already holds."""
+        count = 0
+        for held, wanted in zip(self.digests, digests):
+            if held != wanted:
+                break
+            count += 1
+        return count
+
+
+class _Instance:
+    def __init__(self, index: int, endpoint: str):
+        self.index = index
+        self.endpoint = endpoint
+        self.slots: Dict[int, _Slot] = {}
+        self.healthy = True
+        self.slots_endpoint = True  # False once /slots turned out to be disabled
+        self.refreshed = 0.0
+
+
+class SlotLease:
+    """A request's claim on a slot; released when its response is done."""
+
+    def __init__(self, instance: int, slot: Optional[_Slot], on_free: Optional[Callable[[], None]] = None):
+        self.instance = instance
+        self.slot = slot
+        self._on_free = on_free
+        self._released = False
+
+    @property
+    def slot_id(self) -> Optional[int]:
+        return self.slot.id if self.slot is not None else None
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        if self.slot is not None:
+            self.slot.active = max(0, self.slot.active - 1)
+            if self.slot.active == 0:
+                # Our last request on the slot is done; the next poll tells if someone else is using it
+                self.slot.busy = False
+                if self._on_free is not None:
+                    self._on_free()
+
+
+class LlamaCppSlotManager:
+    """
+    Pins conversations to the llama.cpp slot that holds their KV cache.
+
+    llama.cpp keeps the last prompt of every slot in its KV cache and, with
+    `cache_prompt`, only evaluates the part of a new prompt that differs. That
+    only helps if the next turn of a conversation lands on the same slot, and
+    the server's own slot choice knows nothing about conversations.
+
+    Each slot remembers the chained message digests of the prompt last sent
+    to it. A request goes to the slot holding the longest prefix of its
+    messages. If that slot is busy with the same conversation and no other
+    slot is free, the request waits for it, because it would queue behind
+    another conversation anyway and then re-prefill; with a free slot it
+    re-prefills there right away, so parallel requests sharing a prefix run
+    in parallel. After `max_pinned_wait` seconds, or when the slot was
+    handed to another conversation meanwhile, the request gives up and is
+    treated like a new conversation. Otherwise the least recently used free
+    slot is taken, which keeps the caches of recently active conversations. Slot counts and
+    external occupancy come from polling `/slots` (or `/props` when the
+    server runs with --no-slots) on every instance of the provider.
+
+    Configured by the "slots" section of the "llamacpp" config.
+    """
+
+    def __init__(self, endpoints: List[str], config: Optional[Dict[str, Any]] = None,
+                 get_http_client: Optional[Callable[[], httpx.AsyncClient]] = None):
+        settings = dict(DEFAULT_SLOT_SETTINGS)
+        settings.update(config or {})
+        self.enabled = settings["enabled"]
+        self.refresh_interval = settings["refresh_interval"]
+        self.poll_timeout = settings["poll_timeout"]
+        self.max_pinned_wait = settings["max_pinned_wait"]
+        self._get_http_client = get_http_client
+        self.instances = [_Instance(index, endpoint) for index, endpoint in enumerate(endpoints)]
+        self._refresh_lock = asyncio.Lock()
+        self._next_instance = 0
+        self._freed = asyncio.Event()
+        self.stats = {
+            "requests": 0,
+            "prefix_hits": 0,
+            "reused_messages": 0,
+            "pinned_waits": 0,
+            "pinned_wait_timeouts": 0,
+            "unpinned": 0
+        }
+
+    async def refresh(self, force: bool = False):
+        """Poll slot state of every instance whose information is older than `refresh_interval`."""
+        now = time.monotonic()
+        stale = [instance for instance in self.instances
+                 if force or now - instance.refreshed >= self.refresh_interval]
+        if not stale:
+            return
+        async with self._refresh_lock:
+            now = time.monotonic()
+            stale = [instance for instance in stale if force or now - instance.refreshed >= self.refresh_interval]
+            await asyncio.gather(*(self._poll(instance) for instance in stale))
+
+    async def _poll(self, instance: _Instance):
+        instance.refreshed = time.monotonic()
+        client = self._get_http_client()
+        try:
+            if instance.slots_endpoint:
+                response = await client.get(f"{instance.endpoint}/slots", timeout=self.poll_timeout)
+                if response.status_code == 200:
+                    self._update_slots(instance, response.json())
+                    instance.healthy = True
+                    return
+                # 501 when the server runs with --no-slots
+                instance.slots_endpoint = False
+
+            response = await client.get(f"{instance.endpoint}/props", timeout=self.poll_timeout)
+            if response.status_code == 200:
+                total = response.json().get("total_slots") or 1
+                self._update_slots(instance, [{"id": slot_id} for slot_id in range(total)])
+                instance.healthy = True
+            else:
+                instance.healthy = False
+        except Exception as e:
+            if instance.healthy:
+                logger.warning(f"Could not poll llama.cpp slots at {instance.endpoint}: {str(e)}")
+            instance.healthy = False
+
+    @staticmethod
+    def _update_slots(instance: _Instance, data: List[Dict[str, Any]]):
+        seen = set()
+        for entry in data:
+            slot_id = entry.get("id")
+            if slot_id is None:
+                continue
+            seen.add(slot_id)
+            slot = instance.slots.get(slot_id)
+            if slot is None:
+                slot = instance.slots[slot_id] = _Slot(instance.index, slot_id)
+            slot.n_ctx = entry.get("n_ctx", slot.n_ctx)
+            # Newer servers report is_processing, older ones a numeric state (0 = idle)
+            processing = entry.get("is_processing")
+            if processing is None:
+                processing = entry.get("state", 0) != 0
+            slot.busy = bool(processing) and slot.active == 0
+        for slot_id in list(instance.slots):
+            if slot_id not in seen:
+                del instance.slots[slot_id]
+
+    async def acquire(self, messages: List[Dict[str, Any]]) -> SlotLease:
+        """Choose the instance and slot for a request and mark it in use."""
+        self.stats["requests"] += 1
+        if not self.enabled:
+            return self._unpinned()
+        await self.refresh()
+
+        slots = [slot for instance in self.instances if instance.healthy for slot in instance.slots.values()]
+        if not slots:
+            return self._unpinned()
+
+        digests = prefix_digests(messages)
+        system_count = 0
+        while system_count < len(messages) and messages[system_count].get("role") == "system":
+            system_count += 1
+
+        best = max(slots, key=lambda slot: (slot.matched(digests), slot.free))
+        matched = best.matched(digests)
+        chosen = None
+        if matched > system_count and matched > 0:
+            # The slot holds this conversation, not just a shared system prompt
+            if best.free:
+                chosen = best
+            elif not any(slot.free for slot in slots):
+                # Only worth waiting for when the alternative is queueing behind another conversation:
+                # parallel requests sharing a prefix would otherwise be serialized behind each other
+                self.stats["pinned_waits"] += 1
+                if await self._wait_until_free(best, digests, system_count):
+                    chosen = best
+                else:
+                    self.stats["pinned_wait_timeouts"] += 1
+                    slots = [slot for instance in self.instances if instance.healthy
+                             for slot in instance.slots.values()] or [best]
+        if chosen is None:
+            free = [slot for slot in slots if slot.free]
+            if free:
+                # Evict the least recently used conversation; empty slots come first
+                chosen = min(free, key=lambda slot: (slot.last_used, -slot.matched(digests)))
+            else:
+                chosen = min(slots, key=lambda slot: (slot.active, slot.last_used))
+        matched = chosen.matched(digests)
+
+        if matched > system_count:
+            self.stats["prefix_hits"] += 1
+        self.stats["reused_messages"] += matched
+        chosen.digests = digests
+        chosen.active += 1
+        chosen.last_used = time.monotonic()
+        return SlotLease(chosen.instance, chosen, self._slot_freed)
+
+    def _slot_freed(self):
+        self._freed.set()
+        self._freed = asyncio.Event()
+
+    async def _wait_until_free(self, slot: _Slot, digests: List[bytes], system_count: int) -> bool:
+        """Wait for a slot to become free while it still holds the conversation; False on timeout."""
+        deadline = time.monotonic() + self.max_pinned_wait
+        while not slot.free:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            freed = self._freed
+            try:
+                # Busy with another client's request: only a later poll can tell it is done
+                await asyncio.wait_for(freed.wait(), min(remaining, self.refresh_interval))
+            except asyncio.TimeoutError:
+                await self.refresh()
+            if slot.matched(digests) <= system_count:
+                # Another conversation got the slot first; its cache is gone
+                return False
+        return True
+
+    def _unpinned(self) -> SlotLease:
+        """Leave slot selection to the server, spreading requests over the healthy instances."""
+        self.stats["unpinned"] += 1
+        healthy = [instance for instance in self.instances if instance.healthy] or self.instances
+        instance = healthy[self._next_instance % len(healthy)]
+        self._next_instance += 1
+        return SlotLease(instance.index, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        requests = self.stats["requests"]
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            prefix_hit_rate=round(self.stats["prefix_hits"] / requests, 3) if requests else 0.0,
+            instances=[
+                {
+                    "endpoint": instance.endpoint,
+                    "healthy": instance.healthy,
+                    "slots": len(instance.slots),
+                    "active": sum(slot.active for slot in instance.slots.values()),
+                    "busy": sum(1 for slot in instance.slots.values() if slot.busy)
+                }
+                for instance in self.instances
+            ]
+        )
@@ -0,0 +1,316 @@
+import logging
+import asyncio
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import tiktoken
+
+from .lazy import LazyResource
+
+logger = logging.getLogger(__name__)
+
+# Built-in tiktoken encodings
+ENCODING_CL100K = "cl100k_base"
+ENCODING_O200K = "o200k_base"
+DEFAULT_ENCODING = ENCODING_CL100K
+
+# Model name patterns and the encoding they use; vocab_files from config.json take precedence
+MODEL_ENCODING_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"gpt-4o|gpt-4\.1|gpt-4\.5|gpt-5|(^|/)o[134](-|$)|chatgpt-4o"), ENCODING_O200K),
+    (re.compile(r"gpt-4|gpt-3\.5|text-embedding-3|text-embedding-ada"), ENCODING_CL100K),
+]
+
+# Pre-tokenization pattern of Llama 3 style tiktoken vocabularies (tokenizer.model)
+LLAMA3_PATTERN = (
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*"
+    r"|\s*[\r\n]+|\s+(?!\S)|\s+"
+)
+
+# Tokens the chat format adds around every message, and what an image part costs
+MESSAGE_OVERHEAD_TOKENS = 4
+IMAGE_TOKENS = 85
+# Characters per token when no tokenizer can be loaded
+FALLBACK_CHARS_PER_TOKEN = 3.5
+DEFAULT_MAX_CACHED_COUNTS = 100000
+
+
+class _FallbackTokenizer:
+    """Character-ratio estimate used when no real tokenizer is available."""
+
+    name = "estimate"
+
+    def count(self, text: str) -> int:
+        return max(1, int(len(text) / FALLBACK_CHARS_PER_TOKEN))
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        step = max(1, int(max_tokens * FALLBACK_CHARS_PER_TOKEN))
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+class _TiktokenTokenizer:
+    def __init__(self, name: str, encoding):
+        self.name = name
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return [self.encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+class _HuggingFaceTokenizer:
+    def __init__(self, name: str, tokenizer):
+        self.name = name
+        self.tokenizer = tokenizer
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        ids = self.tokenizer.encode(text, add_special_tokens=False).ids
+        return [self.tokenizer.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+
+
+class TokenCounter:
+    """
+    Token accounting shared by every component that sizes requests.
+
+    The tokenizer is chosen per model: OpenAI models map to cl100k_base or
+    o200k_base, and local model families (llama, qwen, ...) can point to a
+    vocabulary file in the "tokenizers" section of config.json, either a
+    Hugging Face tokenizer.json (needs the optional `tokenizers` package) or
+    a tiktoken BPE file such as Llama 3's tokenizer.model. Everything else
+    uses the default encoding, and a character estimate is used if no
+    tokenizer can be loaded.
+
+    Building an encoding takes a while and may download its vocabulary, so
+    it never happens on the event loop: `warm_up()` loads the tokenizers of
+    the configured and mapped models in a worker thread at startup, and a
+    tokenizer first needed by a request on the loop is loaded in the
+    background while that request uses the default encoding (or the
+    estimate) instead.
+
+    Per-message counts are memoized by a hash of the tokenizer and content,
+    so a growing conversation only tokenizes its new messages.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self._lock = threading.Lock()
+        self._tokenizers: Dict[str, Any] = {}
+        self._model_tokenizers: Dict[str, str] = {}
+        self._counts: "OrderedDict[bytes, int]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.configure(config)
+
+    def configure(self, config: Optional[Dict[str, Any]] = None):
+        """Apply the "tokenizers" section of config.json."""
+        config = config or {}
+        self.default_encoding = config.get("default", DEFAULT_ENCODING)
+        self.model_encodings: Dict[str, str] = config.get("models", {})
+        self.vocab_files: Dict[str, str] = config.get("vocab_files", {})
+        self.max_cached_counts = config.get("max_cached_counts", DEFAULT_MAX_CACHED_COUNTS)
+        with self._lock:
+            self._model_tokenizers.clear()
+
+    def tokenizer_name(self, model: Optional[str] = None) -> str:
+        """Name of the tokenizer used for a model."""
+        if not model:
+            return self.default_encoding
+        name = self._model_tokenizers.get(model)
+        if name is not None:
+            return name
+
+        lowered = model.lower()
+        name = self.model_encodings.get(model)
+        if name is None:
+            for family in self.vocab_files:
+                if family.lower() in lowered:
+                    name = f"vocab:{family}"
+                    break
+        if name is None:
+            for pattern, encoding in MODEL_ENCODING_PATTERNS:
+                if pattern.search(lowered):
+                    name = encoding
+                    break
+        name = name or self.default_encoding
+        self._model_tokenizers[model] = name
+        return name
+
+    def _get_tokenizer(self, name: str):
+        tokenizer = self._tokenizers.get(name)
+        if tokenizer is not None:
+            return tokenizer
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self._load_blocking(name)
+        # On the event loop: load in a worker thread and make do with what is loaded meanwhile
+        self._load_in_background(name)
+        return self._tokenizers.get(self.default_encoding) or _FallbackTokenizer()
+
+    def _load_blocking(self, name: str):
+        tokenizer = self._tokenizers.get(name)
+        if tokenizer is not None:
+            return tokenizer
+        with self._lock:
+            tokenizer = self._tokenizers.get(name)
+            if tokenizer is None:
+                tokenizer = self._load_tokenizer(name)
+                self._tokenizers[name] = tokenizer
+        return tokenizer
+
+    def _load_tokenizer(self, name: str):
+        try:
+            if name.startswith("vocab:"):
+                return self._load_vocab_file(name, self.vocab_files[name[len("vocab:"):]])
+            return _TiktokenTokenizer(name, tiktoken.get_encoding(name))
+        except Exception as e:
+            logger.warning(f"Failed to load tokenizer {name}: {str(e)}")
+            if name != self.default_encoding:
+                # A missing vocab file still gets the default encoding rather than the estimate
+                default = self._tokenizers.get(self.default_encoding) or self._load_default()
+                if default is not None:
+                    return default
+            logger.warning("Falling back to character-based token estimation")
+            return _FallbackTokenizer()
+
+    def _load_in_background(self, name: str) -> asyncio.Future:
+        future = self._loading.get(name)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, self._load_blocking, name)
+            self._loading[name] = future
+            future.add_done_callback(lambda _: self._loading.pop(name, None))
+        return future
+
+    async def warm_up(self, models: List[Optional[str]]):
+        """Load the tokenizers of `models` in a worker thread so no request has to."""
+        names = []
+        for model in [None] + list(self.model_encodings) + list(models):
+            name = self.tokenizer_name(model)
+            if name not in names and name not in self._tokenizers:
+                names.append(name)
+        for name in names:
+            try:
+                await asyncio.shield(self._load_in_background(name))
+                logger.info(f"Loaded tokenizer {name}")
+            except Exception as e:
+                logger.warning(f"Warm-up of tokenizer {name} failed: {str(e)}")
+
+    def _load_default(self):
+        try:
+            tokenizer = _TiktokenTokenizer(self.default_encoding, tiktoken.get_encoding(self.default_encoding))
+        except Exception:
+            return None
+        self._tokenizers[self.default_encoding] = tokenizer
+        return tokenizer
+
+    @staticmethod
+    def _load_vocab_file(name: str, path: str):
+        vocab_path = Path(path).expanduser()
+        if vocab_path.suffix == ".json":
+            from tokenizers import Tokenizer
+            return _HuggingFaceTokenizer(name, Tokenizer.from_file(str(vocab_path)))
+
+        from tiktoken.load import load_tiktoken_bpe
+        ranks = load_tiktoken_bpe(str(vocab_path))
+        encoding = tiktoken.Encoding(name=name, pat_str=LLAMA3_PATTERN, mergeable_ranks=ranks, special_tokens={})
+        return _TiktokenTokenizer(name, encoding)
+
+    def load(self, model: Optional[str] = None):
+        """Load (if needed) and return the tokenizer of a model."""
+        return self._get_tokenizer(self.tokenizer_name(model))
+
+    def count_text(self, text: str, model: Optional[str] = None) -> int:
+        """Tokens in a piece of text."""
+        if not text:
+            return 0
+        return self._get_tokenizer(self.tokenizer_name(model)).count(text)
+
+    def split_text(self, text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+        """Split text into pieces of at most `max_tokens` tokens."""
+        return self._get_tokenizer(self.tokenizer_name(model)).split(text, max(1, max_tokens))
+
+    def count_message(self, message: Dict[str, Any], model: Optional[str] = None) -> int:
+        """Tokens a message occupies in the prompt, memoized by content."""
+        return self._count_message(message, self.tokenizer_name(model))
+
+    def count_each(self, messages: List[Dict[str, Any]], model: Optional[str] = None) -> List[int]:
+        """Per-message token counts of a conversation."""
+        name = self.tokenizer_name(model)
+        return [self._count_message(message, name) for message in messages]
+
+    def count_messages(self, messages: List[Dict[str, Any]], model: Optional[str] = None) -> int:
+        """Total tokens of a conversation."""
+        return sum(self.count_each(messages, model))
+
+    def count_batch(self, conversations: List[List[Dict[str, Any]]], model: Optional[str] = None) -> List[int]:
+        """Total tokens of several conversations for the same model."""
+        name = self.tokenizer_name(model)
+        return [sum(self._count_message(message, name) for message in messages) for messages in conversations]
+
+    def _count_message(self, message: Dict[str, Any], name: str) -> int:
+        if not message:
+            return 0
+        text, images = _message_content(message)
+        key = hashlib.blake2b(f"{name}\0{message.get('role', '')}\0{text}".encode("utf-8", "surrogatepass"),
+                              digest_size=16).digest()
+        count = self._counts.get(key)
+        if count is not None:
+            self.hits += 1
+            self._counts.move_to_end(key)
+            return count + images * IMAGE_TOKENS
+
+        self.misses += 1
+        count = (self._get_tokenizer(name).count(text) if text else 0) + MESSAGE_OVERHEAD_TOKENS
+        if name not in self._tokenizers:
+            # Counted by a stand-in while the real tokenizer loads; don't memoize the estimate
+            return count + images * IMAGE_TOKENS
+        with self._lock:
+            self._counts[key] = count
+            if len(self._counts) > self.max_cached_counts:
+                self._counts.popitem(last=False)
+        return count + images * IMAGE_TOKENS
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "tokenizers": {name: tokenizer.name for name, tokenizer in self._tokenizers.items()},
+            "cached_counts": len(self._counts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+def _message_content(message: Dict[str, Any]) -> Tuple[str, int]:
+    """Text of a message and the number of images it carries."""
+    content = message.get("content")
+    if isinstance(content, str):
+        return content, 0
+    if not isinstance(content, list):
+        return "", 0
+    parts = []
+    images = 0
+    for item in content:
+        if isinstance(item, dict):
+            if item.get("type") == "text" and "text" in item:
+                parts.append(item["text"])
+            elif item.get("type") == "image_url":
+                images += 1
+        elif isinstance(item, str):
+            parts.append(item)
+    return " ".join(parts), images
+
+
+# Shared instance, configured by the router from config.json
+token_counter = TokenCounter()
+# The default tokenizer is warmed in the background after startup instead of loading at import
+default_tokenizer = LazyResource("tokenizer", lambda: token_counter.load())
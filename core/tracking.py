@@ -0,0 +1,243 @@
+import logging
+import json
+import queue
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Paths whose traffic is reported to the request callback
+DEFAULT_TRACKED_PREFIX = "/v1/chat/completions"
+# Events waiting for the callback before new ones are dropped
+DEFAULT_EVENT_QUEUE_SIZE = 1024
+# Bytes of a non-streaming response kept for the "response" event
+DEFAULT_MAX_CAPTURE_BYTES = 256 * 1024
+# A "stream_chunk" progress event is emitted every N chunks
+STREAM_CHUNK_EVENT_INTERVAL = 10
+
+
+class RequestEventQueue:
+    """
+    Bounded, non-blocking hand-off of tracking events to a user callback.
+
+    Events are queued with put_nowait and delivered by a dedicated daemon
+    thread, so a slow consumer (like the GUI) can never stall the event loop
+    or the response being streamed. When the queue is full new events are
+    dropped and counted instead of applying backpressure.
+    """
+
+    def __init__(self, callback: Callable[[Dict[str, Any]], Any], maxsize: int = DEFAULT_EVENT_QUEUE_SIZE):
+        self.callback = callback
+        self.dropped = 0
+        self.delivered = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the delivery thread if it isn't running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="request-events", daemon=True)
+                self._thread.start()
+
+    def emit(self, event: Dict[str, Any]):
+        """Queue an event for delivery; never blocks."""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning(f"Request event queue full, dropped {self.dropped} events")
+
+    def close(self, timeout: float = 1.0):
+        """Stop the delivery thread after draining what is already queued."""
+        thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            try:
+                self.callback(self._materialize(event))
+                self.delivered += 1
+            except Exception as e:
+                logger.error(f"Request callback failed: {str(e)}")
+
+    @staticmethod
+    def _materialize(event: Dict[str, Any]) -> Dict[str, Any]:
+        # Response bodies are captured as raw chunks and only decoded here, off the event loop
+        chunks = event.pop("response_chunks", None)
+        if chunks is None:
+            return event
+
+        truncated = event.pop("truncated", False)
+        body = b"".join(chunks).strip()
+        if body.startswith(b"data:"):
+            event["response"] = {"message": "SSE streaming response"}
+        elif not body:
+            event["type"] = "error"
+            event["error"] = "Empty response received"
+        elif truncated:
+            event["response"] = {"message": "Response too large to capture", "truncated": True}
+        else:
+            try:
+                event["response"] = json.loads(body)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                logger.error(f"Error parsing JSON response: {e} - Response body: '{body[:100]!r}...'")
+                event["type"] = "error"
+                event["error"] = f"Invalid JSON in response: {str(e)}"
+        return event
+
+
+class RequestTrackingMiddleware:
+    """
+    Pure ASGI middleware reporting chat completion traffic to a RequestEventQueue.
+
+    The request body is read and parsed once; the parsed JSON is shared with
+    the endpoint as `request.state.request_data` and the raw bytes are replayed
+    downstream unchanged. Response chunks pass through untouched: streaming
+    responses are only counted, and non-streaming ones are teed into a
+    bounded list of chunk references that is decoded on the delivery thread.
+    """
+
+    def __init__(self, app, events: RequestEventQueue, path_prefix: str = DEFAULT_TRACKED_PREFIX,
+                 max_capture_bytes: int = DEFAULT_MAX_CAPTURE_BYTES):
+        self.app = app
+        self.events = events
+        self.path_prefix = path_prefix
+        self.max_capture_bytes = max_capture_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        body_parts: List[bytes] = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                # Client went away before sending the whole body
+                await self.app(scope, _replay(message, receive), send)
+                return
+            body_parts.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = body_parts[0] if len(body_parts) == 1 else b"".join(body_parts)
+
+        request_data = None
+        if body:
+            try:
+                request_data = json.loads(body)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                request_data = None
+        state = scope.setdefault("state", {})
+        state["request_data"] = request_data
+
+        events = self.events if isinstance(request_data, dict) else None
+        if events is not None:
+            events.emit({"type": "request", "request": request_data})
+
+        tracker = _ResponseTracker(events, request_data, self.max_capture_bytes)
+
+        async def tracking_send(message):
+            await send(message)
+            if events is not None:
+                tracker.observe(message)
+
+        try:
+            await self.app(scope, _replay({"type": "http.request", "body": body, "more_body": False}, receive), tracking_send)
+        except Exception as e:
+            logger.error(f"Error in request processing: {str(e)}")
+            if events is not None:
+                events.emit({"type": "error", "request": request_data, "error": str(e)})
+            raise
+
+
+class _ResponseTracker:
+    """Turns the ASGI messages of one response into tracking events."""
+
+    __slots__ = ("events", "request_data", "max_capture_bytes", "is_streaming",
+                 "chunk_count", "start_time", "chunks", "captured", "truncated")
+
+    def __init__(self, events: Optional[RequestEventQueue], request_data, max_capture_bytes: int):
+        self.events = events
+        self.request_data = request_data
+        self.max_capture_bytes = max_capture_bytes
+        self.is_streaming = False
+        self.chunk_count = 0
+        self.start_time = time.time()
+        self.chunks: List[bytes] = []
+        self.captured = 0
+        self.truncated = False
+
+    def observe(self, message: Dict[str, Any]):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            for name, value in message.get("headers", []):
+                if name.lower() == b"content-type" and value.startswith(b"text/event-stream"):
+                    self.is_streaming = True
+                    break
+            if self.is_streaming:
+                self.events.emit({"type": "stream_start", "request": self.request_data})
+            return
+        if message_type != "http.response.body":
+            return
+
+        chunk = message.get("body", b"")
+        if self.is_streaming:
+            if chunk:
+                self.chunk_count += 1
+                if self.chunk_count % STREAM_CHUNK_EVENT_INTERVAL == 0:
+                    self.events.emit({
+                        "type": "stream_chunk",
+                        "request": self.request_data,
+                        "chunk_count": self.chunk_count,
+                        "elapsed": time.time() - self.start_time
+                    })
+        elif chunk and not self.truncated:
+            if self.captured + len(chunk) <= self.max_capture_bytes:
+                self.chunks.append(chunk)
+                self.captured += len(chunk)
+            else:
+                self.truncated = True
+
+        if not message.get("more_body", False):
+            if self.is_streaming:
+                self.events.emit({
+                    "type": "stream_end",
+                    "request": self.request_data,
+                    "chunk_count": self.chunk_count,
+                    "elapsed": time.time() - self.start_time
+                })
+            else:
+                self.events.emit({
+                    "type": "response",
+                    "request": self.request_data,
+                    "response_chunks": self.chunks,
+                    "truncated": self.truncated
+                })
+
+
+def _replay(first_message: Dict[str, Any], receive):
+    """Build a receive callable that returns `first_message` once, then defers to `receive`."""
+    pending = [first_message]
+
+    async def replay_receive():
+        if pending:
+            return pending.pop()
+        return await receive()
+
+    return replay_receive
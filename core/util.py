@@ -3,19 +3,14 @@ import json
 import asyncio
 import logging
 import subprocess
-import tiktoken
 from pathlib import Path
 from urllib.parse import urlparse
 import platform
 from typing import Dict, Any, Optional, Tuple, List
+from .tokens import token_counter
 
 logger = logging.getLogger("ollamalink")
 
-try:
-    cl100k_encoder = tiktoken.get_encoding("cl100k_base") 
-except Exception as e:
-    logger.warning(f"Failed to load tiktoken encoder: {str(e)}. Falling back to character-based estimation.")
-    cl100k_encoder = None
 
 def is_valid_url(url: str) -> bool:
     """Check if a URL is valid."""
@@ -346,64 +341,28 @@ async def start_localhost_run_tunnel(port: int, callback=None) -> Optional[Tuple
         logger.error(f"Error starting localhost.run tunnel: {str(e)}")
         return None
 
-def estimate_tokens(text: str) -> int:
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
     """
-    Estimate token count using tiktoken if available, or character-based approximation.
+    Count the tokens in a piece of text with the tokenizer of `model`.
     
     Args:
-        text: The text to estimate token count for
+        text: The text to count tokens for
+        model: Model the text is sent to, None for the default encoding
         
     Returns:
-        Estimated token count
+        Token count
     """
-    if not text:
-        return 0
-        
-    if cl100k_encoder:
-        try:
-            return len(cl100k_encoder.encode(text))
-        except Exception as e:
-            logger.debug(f"Error estimating tokens with tiktoken: {str(e)}")
-    
-    return max(1, int(len(text) / 3.5))
+    return token_counter.count_text(text, model)
 
-def estimate_message_tokens(message: Dict[str, Any]) -> int:
+def estimate_message_tokens(message: Dict[str, Any], model: Optional[str] = None) -> int:
     """
-    Roughly estimate the number of tokens in a message.
-    This is a basic approximation, not a precise count.
+    Count the tokens a message occupies in the prompt, including the chat
+    format overhead. Counts are memoized by message content.
     """
-    if not message or "content" not in message:
-        return 0
-    
-    content = message["content"]
-    role = message.get("role", "user")
-    
-    if not content:
-        return 0
-    
-    if isinstance(content, str):
-        char_count = len(content)
-        token_estimate = char_count / 4
-    
-        return int(token_estimate) + 5
-
-    elif isinstance(content, list):
-        total = 0
-        for item in content:
-            if isinstance(item, dict):
-                if item.get("type") == "text" and "text" in item:
-                    total += len(item["text"]) / 4
-                elif item.get("type") == "image_url" and "image_url" in item:
-                    total += 50
-            elif isinstance(item, str):
-                total += len(item) / 4
-        return int(total) + 5
-    
-    return 5
+    return token_counter.count_message(message, model)
 
-def count_tokens_in_messages(messages: List[Dict[str, Any]]) -> int:
+def count_tokens_in_messages(messages: List[Dict[str, Any]], model: Optional[str] = None) -> int:
     """
-    Count the approximate number of tokens in a list of messages.
-    This is a rough estimation for practical purposes.
+    Count the tokens of a list of messages.
     """
-    return sum(estimate_message_tokens(message) for message in messages)
+    return token_counter.count_messages(messages, model)
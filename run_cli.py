@@ -1,15 +1,19 @@
-import asyncio
+import sys
+
+# Installed before anything heavy is imported so --profile-startup can time the imports
+from core.lazy import startup_profiler
+if "--profile-startup" in sys.argv:
+    startup_profiler.install()
+
 import argparse
 import logging
 from pathlib import Path
 import json
-import requests
 import time
 import threading
 
 import uvicorn
 import termcolor
-from pyfiglet import Figlet
 
 from core.api import create_api
 from core.router import Router
@@ -30,8 +34,16 @@ CODE_COLOR = 'cyan'
 DIVIDER = "─" * 60
 
 
+def render_banner():
+    """Render the figlet banner; pyfiglet is only imported when it is shown."""
+    from pyfiglet import Figlet
+    return Figlet(font='slant').renderText('OllamaLink')
+
+
 def auto_start_tunnel(port, host="127.0.0.1"):
     """Auto-start tunnel via API call with status feedback"""
+    import requests
+    
     api_base_url = f"http://{host}:{port}"
     
     print(termcolor.colored("Waiting for server to be ready...", INFO_COLOR))
@@ -159,9 +171,65 @@ def display_model_error(error_message, error_type):
     
     print(f"\n{DIVIDER}\n")
 
+def print_model_summary(router):
+    """Print the models and provider status found by the initial background fetch."""
+    # Check Ollama client connection
+    if router.ollama_client and router.ollama_client.connection_error:
+        display_model_error(router.ollama_client.connection_error, "connection_error")
+        print(termcolor.colored("Warning: OllamaLink will still start, but it won't be able to use models from Ollama", INFO_COLOR))
+        print(termcolor.colored("OllamaLink will use fallback settings until Ollama is available", INFO_COLOR))
+    elif router.ollama_client and router.ollama_client.available_models:
+        print(termcolor.colored(f"Success: Found {len(router.ollama_client.available_models)} Ollama models:", SUCCESS_COLOR, attrs=['bold']))
+        for model in router.ollama_client.available_models:
+            model_name = model.get('name', model.get('id', 'Unknown'))
+            print(f"• {model_name}")
+        
+        default_model = router.ollama_mappings.get('default', 'llama3')
+        print(termcolor.colored(f"\nDefault Ollama model: {default_model}", SUCCESS_COLOR, attrs=['bold']))
+    else:
+        print(termcolor.colored("Error: No Ollama models found. Is Ollama running?", ERROR_COLOR))
+        print(termcolor.colored("Please make sure Ollama is running with: ollama serve", INFO_COLOR))
+    
+    # Show multi-provider information
+    print()
+    print(termcolor.colored("Provider Status:", INFO_COLOR, attrs=['bold']))
+    
+    # Show Ollama status
+    if router.ollama_client:
+        if router.ollama_client.connection_error:
+            print("• Ollama: Disconnected")
+        else:
+            print(f"• Ollama: Connected ({len(router.ollama_client.available_models)} models)")
+    
+    # Show OpenRouter status
+    if router.openrouter_client:
+        print("• OpenRouter: Available")
+    else:
+        print("• OpenRouter: Disabled (configure in config.json)")
+    
+    # Show Llama.cpp status
+    if router.llamacpp_client:
+        print("• Llama.cpp: Available")
+    else:
+        print("• Llama.cpp: Disabled (configure in config.json)")
+    
+    print()
+    print(termcolor.colored("Model Mappings (Ollama):", INFO_COLOR, attrs=['bold']))
+    
+    for api_model, local_model in router.ollama_mappings.items():
+        if api_model != "default":
+            if router.ollama_client:
+                resolved_model = router.ollama_client.get_model_name(api_model, router.ollama_mappings)
+            else:
+                resolved_model = local_model
+            print(f"• {api_model} → {resolved_model}")
+    print()
+
+
 def main():
     """Run the OllamaLink server."""
-    config = load_config(Path("config.json"))
+    with startup_profiler.phase("load config"):
+        config = load_config(Path("config.json"))
     
     parser = argparse.ArgumentParser(description="OllamaLink - Connect Cursor AI to Ollama models")
     
@@ -205,13 +273,16 @@ def main():
                         default=config["ollama"].get("max_streaming_tokens", 32000),
                         help="Maximum token limit for streaming requests (default: 32000)")
     
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print import and initialization times per module once the server is up")
+    
     args = parser.parse_args()
     
     if args.direct:
         args.tunnel = False
     
-    f = Figlet(font='slant')
-    print(termcolor.colored(f.renderText('OllamaLink'), HEADER_COLOR))
+    with startup_profiler.phase("banner"):
+        print(termcolor.colored(render_banner(), HEADER_COLOR))
     print(termcolor.colored("Connect Cursor with Ollama models\n", SUBHEADER_COLOR))
     
     print(termcolor.colored("Configuration:", INFO_COLOR, attrs=['bold']))
@@ -224,59 +295,10 @@ def main():
     print(f"• Max streaming tokens: {args.max_tokens}")
     print()
     
-    router = Router(ollama_endpoint=args.ollama)
+    with startup_profiler.phase("router init"):
+        router = Router(ollama_endpoint=args.ollama)
     router.thinking_mode = args.thinking_mode
-    
-    # Check Ollama client connection
-    if router.ollama_client and router.ollama_client.connection_error:
-        display_model_error(router.ollama_client.connection_error, "connection_error")
-        print(termcolor.colored("Warning: OllamaLink will still start, but it won't be able to use models from Ollama", INFO_COLOR))
-        print(termcolor.colored("OllamaLink will use fallback settings until Ollama is available", INFO_COLOR))
-    elif router.ollama_client and router.ollama_client.available_models:
-        print(termcolor.colored(f"Success: Found {len(router.ollama_client.available_models)} Ollama models:", SUCCESS_COLOR, attrs=['bold']))
-        for model in router.ollama_client.available_models:
-            model_name = model.get('name', model.get('id', 'Unknown'))
-            print(f"• {model_name}")
-        
-        default_model = router.ollama_mappings.get('default', 'llama3')
-        print(termcolor.colored(f"\nDefault Ollama model: {default_model}", SUCCESS_COLOR, attrs=['bold']))
-    else:
-        print(termcolor.colored("Error: No Ollama models found. Is Ollama running?", ERROR_COLOR))
-        print(termcolor.colored("Please make sure Ollama is running with: ollama serve", INFO_COLOR))
-    
-    # Show multi-provider information
-    print()
-    print(termcolor.colored("Provider Status:", INFO_COLOR, attrs=['bold']))
-    
-    # Show Ollama status
-    if router.ollama_client:
-        if router.ollama_client.connection_error:
-            print("• Ollama: Disconnected")
-        else:
-            print(f"• Ollama: Connected ({len(router.ollama_client.available_models)} models)")
-    
-    # Show OpenRouter status
-    if router.openrouter_client:
-        print("• OpenRouter: Available")
-    else:
-        print("• OpenRouter: Disabled (configure in config.json)")
-    
-    # Show Llama.cpp status
-    if router.llamacpp_client:
-        print("• Llama.cpp: Available")
-    else:
-        print("• Llama.cpp: Disabled (configure in config.json)")
-    
-    print()
-    print(termcolor.colored("Model Mappings (Ollama):", INFO_COLOR, attrs=['bold']))
-    
-    for api_model, local_model in router.ollama_mappings.items():
-        if api_model != "default":
-            if router.ollama_client:
-                resolved_model = router.ollama_client.get_model_name(api_model, router.ollama_mappings)
-            else:
-                resolved_model = local_model
-            print(f"• {api_model} → {resolved_model}")
+    print(termcolor.colored("Fetching models in the background, the summary follows once the server is up\n", INFO_COLOR))
     
     if args.max_tokens != config["ollama"].get("max_streaming_tokens", 32000):
         config["ollama"]["max_streaming_tokens"] = args.max_tokens
@@ -287,7 +309,14 @@ def main():
         except Exception as e:
             print(termcolor.colored(f"Warning: Could not update config.json: {str(e)}", ERROR_COLOR))
     
-    app = create_api()
+    async def on_ready(router):
+        print_model_summary(router)
+        if args.profile_startup:
+            startup_profiler.uninstall()
+            print(startup_profiler.report())
+    
+    with startup_profiler.phase("create api"):
+        app = create_api(router=router, on_ready=on_ready)
     
     # Determine host setting based on tunnel mode
     if args.tunnel:
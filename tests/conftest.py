@@ -0,0 +1,127 @@
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+from core.clients import OllamaClient
+from core.router import Router
+
+CONFIG = Path(__file__).resolve().parent.parent / "config.json"
+
+
+class OllamaStub:
+    """
+    Minimal Ollama server for httpx.MockTransport.
+
+    Serves /api/tags, /api/show, /api/ps, /api/version, /api/generate and
+    /api/chat, and records every /api/chat payload it receives in `chats`
+    and every model loaded through /api/generate in `loaded`.
+    """
+
+    def __init__(self, models=("qwen3:latest",), context_length: int = 40960, reply: str = "Hello there friend"):
+        self.models = list(models)
+        self.context_length = context_length
+        self.reply = reply
+        self.load_duration = 2_000_000_000  # first request loads the model
+        self.chat_error = None  # (status, message) returned by /api/chat instead of an answer
+        self.chats = []
+        self.loaded = []
+
+    def _final(self, model: str, content: str):
+        final = {
+            "model": model, "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": content},
+            "done": True, "done_reason": "stop",
+            "prompt_eval_count": 12, "eval_count": len(self.reply.split()),
+            "load_duration": self.load_duration
+        }
+        self.load_duration = 1_000_000
+        return final
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path == "/api/tags":
+            return httpx.Response(200, json={"models": [{"name": name, "model": name} for name in self.models]})
+        if path == "/api/show":
+            return httpx.Response(200, json={"model_info": {"qwen3.context_length": self.context_length}})
+        if path == "/api/ps":
+            return httpx.Response(200, json={"models": []})
+        if path == "/api/version":
+            return httpx.Response(200, json={"version": "0.6.0"})
+        if path == "/api/generate":
+            model = json.loads(request.content).get("model")
+            if model not in self.models:
+                return httpx.Response(404, json={"error": f"model \"{model}\" not found, try pulling it first"})
+            self.loaded.append(model)
+            return httpx.Response(200, json={"model": model, "response": "", "done": True})
+        if path == "/api/chat":
+            payload = json.loads(request.content)
+            self.chats.append(payload)
+            model = payload.get("model")
+            if model not in self.models:
+                return httpx.Response(404, json={"error": f"model \"{model}\" not found, try pulling it first"})
+            if self.chat_error is not None:
+                status, message = self.chat_error
+                return httpx.Response(status, json={"error": message})
+            if not payload.get("stream"):
+                return httpx.Response(200, json=self._final(model, self.reply))
+            words = self.reply.split(" ")
+            lines = [
+                {"model": model, "message": {"role": "assistant", "content": word if i == 0 else " " + word},
+                 "done": False}
+                for i, word in enumerate(words)
+            ]
+            lines.append(self._final(model, ""))
+            return httpx.Response(200, content=b"".join(json.dumps(line).encode() + b"\n" for line in lines))
+        return httpx.Response(404, json={"error": "not found"})
+
+
+@pytest.fixture
+def ollama_stub():
+    return OllamaStub()
+
+
+@pytest.fixture
+async def ollama_client(ollama_stub):
+    client = OllamaClient("http://ollama.test", residency_config={"preload": []})
+    http = httpx.AsyncClient(transport=httpx.MockTransport(ollama_stub))
+    client.pools.get_client = lambda name: http
+    yield client
+    await http.aclose()
+
+
+@pytest.fixture
+async def make_router(ollama_stub, tmp_path):
+    """Build Routers on the shipped config with only Ollama enabled, served by `ollama_stub`."""
+    http = httpx.AsyncClient(transport=httpx.MockTransport(ollama_stub))
+    routers = []
+
+    def make(mappings=None, preload=()):
+        config = json.loads(CONFIG.read_text(encoding="utf-8"))
+        config["openrouter"]["enabled"] = False
+        config["llamacpp"]["enabled"] = False
+        config["ollama"]["endpoint"] = "http://ollama.test"
+        config["ollama"]["model_mappings"] = mappings or {"default": "qwen3:latest"}
+        config["ollama"]["residency"]["preload"] = list(preload)
+        config_path = tmp_path / f"config-{len(routers)}.json"
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+
+        router = Router(config_path=str(config_path))
+        router.pools.get_client = lambda name: http
+        routers.append(router)
+        return router
+
+    yield make
+    for router in routers:
+        await router.aclose()
+    await http.aclose()
+
+
+@pytest.fixture
+async def router(make_router):
+    """A started Router from `make_router` with the model list fetched."""
+    router = make_router()
+    await router.startup()
+    await router.wait_for_models()
+    return router
@@ -0,0 +1,68 @@
+import asyncio
+
+from core.coalescing import RequestCoalescer
+
+
+class Upstream:
+    """A fake generation: counts how often it is started and emits numbered chunks."""
+
+    def __init__(self, chunks: int = 50):
+        self.chunks = chunks
+        self.started = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started += 1
+        return {"stream": True, "stream_generator": self._generate()}
+
+    async def _generate(self):
+        await self.release.wait()
+        for i in range(self.chunks):
+            yield f"data: {i}\n\n".encode()
+            await asyncio.sleep(0)
+
+
+async def _read(result, flight=None, peak=None):
+    chunks = []
+    async for chunk in result["stream_generator"]:
+        chunks.append(chunk)
+        if flight is not None:
+            peak.append(len(flight.chunks))
+    return chunks
+
+
+async def test_single_subscriber_does_not_keep_the_stream():
+    coalescer = RequestCoalescer()
+    upstream = Upstream()
+    result = await coalescer.run("key", upstream)
+    flight = coalescer._flights["key"]
+    upstream.release.set()
+    peak = []
+    chunks = await _read(result, flight, peak)
+    assert len(chunks) == 50
+    assert max(peak) <= 2
+    assert "key" not in coalescer._flights
+
+
+async def test_subscribers_joining_before_the_first_chunk_share_the_generation():
+    coalescer = RequestCoalescer()
+    upstream = Upstream()
+    first, second = await asyncio.gather(coalescer.run("key", upstream), coalescer.run("key", upstream))
+    upstream.release.set()
+    a, b = await asyncio.gather(_read(first), _read(second))
+    assert upstream.started == 1
+    assert a == b and len(a) == 50
+    assert coalescer.stats["coalesced"] == 1
+
+
+async def test_request_after_consumption_started_runs_its_own_generation():
+    coalescer = RequestCoalescer()
+    upstream = Upstream()
+    result = await coalescer.run("key", upstream)
+    upstream.release.set()
+    generator = result["stream_generator"]
+    await generator.__anext__()
+    late = await coalescer.run("key", upstream)
+    assert upstream.started == 2
+    assert len(await _read(late)) == 50
+    assert len(await _read({"stream_generator": generator})) == 49
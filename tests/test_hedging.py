@@ -0,0 +1,65 @@
+import asyncio
+
+from core.hedging import HedgingPolicy
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def event(content: str) -> bytes:
+    return b'data: {"choices":[{"index":0,"delta":{"content":"' + content.encode("utf-8") + b'"}}]}\n\n'
+
+
+async def test_lost_race_frees_the_primary_admission_slot(router):
+    router.hedging = HedgingPolicy({"enabled": True, "initial_delay": 0.05})
+    primary_closed = asyncio.Event()
+    backup_more = asyncio.Event()
+
+    async def stalled():
+        try:
+            await asyncio.sleep(30)
+            yield event("late")
+        finally:
+            primary_closed.set()
+
+    async def route_request(model, messages, *args):
+        return {"provider": "ollama", "model": "qwen3:latest", "display_model": model,
+                "stream": True, "stream_generator": stalled()}
+
+    async def backup_stream():
+        yield event("fast")
+        await backup_more.wait()
+        yield event(" answer")
+
+    async def start_hedge(primary, model, *args):
+        return "openrouter", "qwen/qwen3", backup_stream()
+
+    router._route_request = route_request
+    router._start_hedge = start_hedge
+
+    result = await router.make_request("default", MESSAGES, stream=True)
+    assert router.admission.get_stats("ollama")["active"] == 1
+    stream = result["stream_generator"]
+    assert await stream.__anext__() == event("fast")
+
+    # The backup is still streaming, but the cancelled primary no longer holds its slot
+    assert primary_closed.is_set()
+    assert router.admission.get_stats("ollama")["active"] == 0
+    assert router.hedging.stats["backup_wins"] == 1
+
+    backup_more.set()
+    assert [chunk async for chunk in stream] == [event(" answer")]
+    assert router.admission.get_stats("ollama")["active"] == 0
+
+
+def test_hedging_is_opt_in():
+    assert not HedgingPolicy().applies_to("default")
+    policy = HedgingPolicy({"enabled": True, "models": ["gpt-4o-mini"]})
+    assert policy.applies_to("gpt-4o-mini") and not policy.applies_to("default")
+
+
+async def test_unhedged_stream_frees_its_slot_when_it_ends(router):
+    assert not router.hedging.applies_to("default")
+    result = await router.make_request("default", MESSAGES, stream=True)
+    chunks = [chunk async for chunk in result["stream_generator"]]
+    assert chunks[-1] == b"data: [DONE]\n\n"
+    assert router.admission.get_stats("ollama")["active"] == 0
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import re
+import time
+
+import httpx
+import pytest
+
+from core.handlers import LlamaCppRequestHandler
+
+FACT_RE = re.compile(r"fact-\d+")
+FACTS = [f"fact-{i}" for i in range(24)]
+CALL_LATENCY = 0.05
+
+
+class Upstream:
+    """Mock chat endpoint that answers with every fact visible in the prompt."""
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        seen = sorted(set(FACT_RE.findall(json.dumps(body["messages"]))), key=lambda f: int(f[5:]))
+        self.calls.append(body)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(CALL_LATENCY)
+        finally:
+            self.in_flight -= 1
+        return httpx.Response(200, json={
+            "id": "x", "object": "chat.completion", "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(seen)}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        })
+
+
+def conversation():
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for index, fact in enumerate(FACTS):
+        role = "user" if index % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": f"Remember {fact}. " + "filler text " * 60})
+    messages.append({"role": "user", "content": "Which facts did I mention?"})
+    return messages
+
+
+def make_handler(strategy: str):
+    upstream = Upstream()
+    handler = LlamaCppRequestHandler(endpoint="http://upstream")
+    handler.configure_long_context({"strategy": strategy, "max_tokens_per_chunk": 1500, "summary_tokens": 256})
+    handler._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    return handler, upstream
+
+
+def request():
+    return {"model": "llama", "messages": conversation(), "stream": False}
+
+
+async def legacy_chunked_request(handler, original_request):
+    """The sequential path process_chunked_request used before the strategies: no context carried over."""
+    chunks = handler.chunk_messages(original_request["messages"])
+    for index, chunk in enumerate(chunks):
+        response = await handler.make_request(dict(original_request, messages=chunk, stream=False))
+        if index == len(chunks) - 1:
+            return response
+
+
+def answer(response):
+    return FACT_RE.findall(response.json()["choices"][0]["message"]["content"])
+
+
+async def test_legacy_path_loses_earlier_history():
+    handler, upstream = make_handler("sliding_window")
+    response = await legacy_chunked_request(handler, request())
+    assert len(upstream.calls) > 1
+    assert upstream.max_in_flight == 1
+    assert set(answer(response)) < set(FACTS)
+
+
+async def test_sliding_window_carries_notes_sequentially():
+    handler, upstream = make_handler("sliding_window")
+    response = await handler.process_chunked_request(request())
+    assert answer(response) == FACTS
+    assert len(upstream.calls) > 2
+    assert upstream.max_in_flight == 1
+    # Intermediate calls are capped summaries, the final call answers the last question
+    assert all(call["max_tokens"] == 256 for call in upstream.calls[:-1])
+    assert upstream.calls[-1]["messages"][-1]["content"] == "Which facts did I mention?"
+    assert any("Notes on the earlier part" in m["content"] for m in upstream.calls[-1]["messages"])
+
+
+async def test_map_reduce_summarizes_in_parallel():
+    handler, upstream = make_handler("map_reduce")
+    started = time.monotonic()
+    response = await handler.process_chunked_request(request())
+    elapsed = time.monotonic() - started
+    assert answer(response) == FACTS
+    assert upstream.max_in_flight > 1
+    # Parallel map calls plus the final call take less time than calling them one after another
+    assert elapsed < len(upstream.calls) * CALL_LATENCY
+    assert upstream.calls[-1]["messages"][-1]["content"] == "Which facts did I mention?"
+
+
+async def test_refuse_rejects_without_calling_upstream():
+    handler, upstream = make_handler("refuse")
+    response = await handler.process_chunked_request(request())
+    assert response["error"]["code"] == 413
+    assert upstream.calls == []
+
+
+@pytest.mark.parametrize("strategy", ["sliding_window", "map_reduce", "refuse"])
+async def test_request_within_budget_is_sent_as_is(strategy):
+    handler, upstream = make_handler(strategy)
+    short = {"model": "llama", "messages": [{"role": "user", "content": "Remember fact-1."}], "stream": False}
+    response = await handler.process_chunked_request(short)
+    assert answer(response) == ["fact-1"]
+    assert len(upstream.calls) == 1
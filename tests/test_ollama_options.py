@@ -0,0 +1,79 @@
+from core.sampling import OllamaOptionsTranslator, extract_sampling
+
+MODEL = "qwen3:latest"
+SHORT = [{"role": "user", "content": "hi"}]
+LONG = [{"role": "user", "content": "hello world " * 2000}]
+
+
+def test_translate_moves_sampling_into_options():
+    translator = OllamaOptionsTranslator()
+    payload = translator.translate({
+        "model": MODEL, "messages": SHORT, "stream": False,
+        "max_tokens": 64, "temperature": 0.2, "top_p": 0.9, "stop": "###", "seed": 7,
+        "frequency_penalty": 0.5, "presence_penalty": 0.1
+    })
+    assert payload["options"] == {
+        "num_predict": 64, "temperature": 0.2, "top_p": 0.9, "stop": ["###"], "seed": 7,
+        "frequency_penalty": 0.5, "presence_penalty": 0.1, "num_ctx": 2048
+    }
+    for field in ("max_tokens", "temperature", "top_p", "stop", "seed"):
+        assert field not in payload
+    assert payload["model"] == MODEL and payload["messages"] == SHORT
+
+
+def test_explicit_options_win():
+    translator = OllamaOptionsTranslator({"options": {"num_gpu": 99}})
+    payload = translator.translate({"model": MODEL, "messages": SHORT, "temperature": 0.2,
+                                    "options": {"num_ctx": 3000, "temperature": 1.0}})
+    assert payload["options"] == {"num_gpu": 99, "temperature": 1.0, "num_ctx": 3000}
+
+
+def test_bucket_respects_model_and_configured_limits():
+    translator = OllamaOptionsTranslator({"max_num_ctx": 16384})
+    assert translator.bucket(100) == 2048
+    assert translator.bucket(5000) == 8192
+    assert translator.bucket(100000) == 16384
+    assert translator.bucket(5000, limit=4096) == 4096
+
+
+def test_extract_sampling_ignores_unset_fields():
+    assert extract_sampling({"top_p": 0.5, "seed": None, "messages": []}) == {"top_p": 0.5}
+    assert extract_sampling({"messages": []}) is None
+
+
+async def test_payload_received_by_ollama(ollama_client, ollama_stub):
+    result = await ollama_client.chat_completion(
+        MODEL, SHORT, temperature=0.3, max_tokens=128,
+        sampling={"top_p": 0.8, "stop": ["\n\n"], "seed": 42}
+    )
+    assert "error" not in result
+    payload = ollama_stub.chats[-1]
+    assert payload["options"] == {
+        "num_predict": 128, "temperature": 0.3, "top_p": 0.8, "stop": ["\n\n"], "seed": 42, "num_ctx": 2048
+    }
+    assert payload["stream"] is False
+    assert payload["keep_alive"] == "30m"
+    assert "temperature" not in payload and "max_tokens" not in payload and "timeout" not in payload
+
+
+async def test_num_ctx_only_grows_while_the_model_is_resident(ollama_client, ollama_stub):
+    async def num_ctx(messages):
+        await ollama_client.chat_completion(MODEL, messages, max_tokens=100)
+        return ollama_stub.chats[-1]["options"]["num_ctx"]
+
+    assert await num_ctx(SHORT) == 2048
+    assert ollama_client.residency.is_resident(MODEL)
+    assert await num_ctx(LONG) == 8192
+    # Shrinking would make Ollama reload the model
+    assert await num_ctx(SHORT) == 8192
+    assert ollama_client.options.resizes == 1
+
+    # Once unloaded, the next load starts from the bucket it needs
+    ollama_client.residency._set_resident({})
+    assert await num_ctx(SHORT) == 2048
+
+
+async def test_num_ctx_capped_by_model_context_length(ollama_client, ollama_stub):
+    ollama_stub.context_length = 4096
+    await ollama_client.chat_completion(MODEL, LONG, max_tokens=100)
+    assert ollama_stub.chats[-1]["options"]["num_ctx"] == 4096
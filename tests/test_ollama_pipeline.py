@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from core.handlers.sse import is_completion
+
+MODEL = "qwen3:latest"
+MESSAGES = [{"role": "user", "content": "hi"}]
+MISSING = 'model "qwen3:latest" not found, try pulling it first'
+
+
+def request(router, via):
+    """Call one of the two public entry points with the same arguments."""
+    if via == "mapping":
+        return lambda **kwargs: router.make_request("default", MESSAGES, **kwargs)
+    return lambda **kwargs: router.make_request_with_provider("ollama", MODEL, MESSAGES, **kwargs)
+
+
+async def collect(result):
+    chunks = [chunk async for chunk in result["stream_generator"]]
+    return [chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk for chunk in chunks], chunks
+
+
+def parse_events(events):
+    assert all(event.startswith("data: ") and event.endswith("\n\n") for event in events)
+    return [event[len("data: "):-2] for event in events]
+
+
+@pytest.mark.parametrize("via", ["mapping", "provider"])
+async def test_completion_is_openai_shaped_with_usage(router, via):
+    result = await request(router, via)(max_tokens=5)
+
+    assert result["provider"] == "ollama" and result["model"] == MODEL and not result["stream"]
+    body = result["result"]
+    assert body["object"] == "chat.completion"
+    assert body["choices"][0]["message"] == {"role": "assistant", "content": "Hello there friend"}
+    assert body["choices"][0]["finish_reason"] == "stop"
+    assert body["usage"] == {"prompt_tokens": 12, "completion_tokens": 3, "total_tokens": 15}
+
+
+@pytest.mark.parametrize("via", ["mapping", "provider"])
+async def test_stream_is_openai_sse_ending_with_done(router, via):
+    result = await request(router, via)(stream=True)
+    display_model = result["display_model"]
+    events, raw = await collect(result)
+    payloads = parse_events(events)
+
+    assert payloads[-1] == "[DONE]"
+    assert is_completion(raw[-1])
+    chunks = [json.loads(payload) for payload in payloads[:-1]]
+    assert len({chunk["id"] for chunk in chunks}) == 1
+    for chunk in chunks:
+        assert chunk["object"] == "chat.completion.chunk"
+        assert chunk["model"] == display_model
+        assert len(chunk["choices"]) == 1 and chunk["choices"][0]["index"] == 0
+
+    deltas = [chunk["choices"][0]["delta"] for chunk in chunks]
+    assert deltas[0].get("role") == "assistant"
+    assert "".join(delta.get("content") or "" for delta in deltas) == "Hello there friend"
+    assert chunks[-1]["choices"][0] == {"index": 0, "delta": {}, "finish_reason": "stop"}
+    assert all(chunk["choices"][0]["finish_reason"] is None for chunk in chunks[:-1])
+
+
+@pytest.mark.parametrize("via", ["mapping", "provider"])
+@pytest.mark.parametrize("status, message, code", [
+    (404, MISSING, 404),
+    (400, "prompt too long; exceeded max context length", 413),
+    (500, "boom", 500),
+])
+async def test_upstream_errors_are_mapped(router, ollama_stub, via, status, message, code):
+    ollama_stub.chat_error = (status, message)
+    expected = {"message": message if code != 413 else "Context length exceeded", "code": code}
+
+    result = await request(router, via)()
+    assert result["result"] == {"error": expected}
+
+    result = await request(router, via)(stream=True)
+    events, raw = await collect(result)
+    payloads = parse_events(events)
+    assert [json.loads(payload) for payload in payloads[:-1]] == [{"error": expected}]
+    assert payloads[-1] == "[DONE]"
+    assert not is_completion(raw[-1])
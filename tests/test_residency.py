@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            pytest.fail("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+async def test_startup_preload_resolves_against_fetched_models(make_router, ollama_stub):
+    ollama_stub.models = ["qwen3:latest", "llama3:latest"]
+    router = make_router(mappings={"default": "llama3:latest"}, preload=["qwen3"])
+    await router.startup()
+
+    await wait_for(lambda: ollama_stub.loaded)
+    assert ollama_stub.loaded == ["qwen3:latest"]
+
+
+async def test_failed_preload_is_retried(make_router, ollama_stub):
+    ollama_stub.models = []
+    router = make_router(mappings={"default": "qwen3:latest"}, preload=["qwen3:latest"])
+    router.ollama_client.residency.poll_interval = 0.01
+    await router.startup()
+    await router.wait_for_models()
+    await asyncio.sleep(0.05)
+    assert ollama_stub.loaded == []
+
+    # Pulled after startup: the next poll loads it, once
+    ollama_stub.models = ["qwen3:latest"]
+    await wait_for(lambda: ollama_stub.loaded)
+    await asyncio.sleep(0.05)
+    assert ollama_stub.loaded == ["qwen3:latest"]
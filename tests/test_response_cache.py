@@ -0,0 +1,61 @@
+import json
+
+import httpx
+
+from core.handlers import OllamaResponseHandler, OpenRouterResponseHandler
+from core.handlers.sse import COMPLETED_EVENT, DONE_EVENT, is_completion
+from core.response_cache import ResponseCache, KIND_SSE
+
+
+async def _events(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _drain(result):
+    return [chunk async for chunk in result["stream_generator"]]
+
+
+def _cache():
+    return ResponseCache({"enabled": True})
+
+
+def _ollama_lines(done: bool) -> bytes:
+    lines = [{"model": "m", "message": {"role": "assistant", "content": "Hello"}, "done": False}]
+    if done:
+        lines.append({"model": "m", "message": {"role": "assistant", "content": ""}, "done": True})
+    return b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+
+
+async def test_stream_finished_by_upstream_is_cached():
+    cache = _cache()
+    body = b'data: {"choices":[{"delta":{"content":"Hi"}}]}\n\n'
+    await _drain(cache.record("key", {"stream": True, "stream_generator": _events(body, COMPLETED_EVENT)}))
+    entry = await cache.get("key")
+    assert entry is not None and entry.kind == KIND_SSE
+    assert entry.body == body + DONE_EVENT
+
+
+async def test_stream_ended_without_upstream_completion_is_not_cached():
+    cache = _cache()
+    lost = b'data: {"choices":[{"delta":{"content":"\\n\\n[Connection lost - no data received]"}}]}\n\n'
+    await _drain(cache.record("key", {"stream": True, "stream_generator": _events(lost, DONE_EVENT)}))
+    assert await cache.get("key") is None
+    assert cache.stats["stores"] == 0
+
+
+async def test_handler_marks_only_upstream_completion():
+    handler = OllamaResponseHandler()
+    finished = [chunk async for chunk in handler.stream_response(httpx.Response(200, content=_ollama_lines(True)), "m")]
+    truncated = [chunk async for chunk in handler.stream_response(httpx.Response(200, content=_ollama_lines(False)), "m")]
+    assert is_completion(finished[-1])
+    assert truncated[-1] == DONE_EVENT and not is_completion(truncated[-1])
+
+
+async def test_relay_marks_upstream_done():
+    handler = OpenRouterResponseHandler()
+    upstream = b'data: {"model":"m","choices":[{"delta":{"content":"Hi"}}]}\n\ndata: [DONE]\n\n'
+    finished = [chunk async for chunk in handler.relay_response(httpx.Response(200, content=upstream), "m")]
+    cut = [chunk async for chunk in handler.relay_response(httpx.Response(200, content=upstream[:-14]), "m")]
+    assert is_completion(finished[-1])
+    assert not is_completion(cut[-1])
@@ -0,0 +1,49 @@
+import json
+import time
+
+from core.routing_policy import RoutingPolicyEngine
+
+
+def event(payload: dict) -> bytes:
+    return b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n"
+
+
+def content(text: str) -> bytes:
+    return event({"choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]})
+
+
+FINISH = event({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+DONE = b"data: [DONE]\n\n"
+
+
+async def upstream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def observed_tokens(tmp_path, *chunks) -> int:
+    path = tmp_path / "trace.jsonl"
+    engine = RoutingPolicyEngine({"policy": "static", "record_path": str(path)})
+    result = engine.observe({"provider": "ollama", "model": "qwen3:latest", "stream": True,
+                             "stream_generator": upstream(*chunks)}, time.monotonic(), {"model": "default"})
+    assert [chunk async for chunk in result["stream_generator"]] == list(chunks)
+    engine.close()
+    return json.loads(path.read_text(encoding="utf-8"))["output_tokens"]
+
+
+def test_static_policy_leaves_streams_unwrapped():
+    generator = upstream(content("hi"), DONE)
+    result = RoutingPolicyEngine({"policy": "static"}).observe(
+        {"provider": "openrouter", "model": "m", "stream": True, "stream_generator": generator}, time.monotonic())
+    assert result["stream_generator"] is generator
+
+
+async def test_stream_tokens_are_counted_from_events(tmp_path):
+    tokens = await observed_tokens(tmp_path, content("a"), content("b") + content("c"), content("d"), FINISH, DONE)
+    assert tokens == 4
+
+
+async def test_stream_tokens_prefer_the_usage_block(tmp_path):
+    usage = event({"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 42, "total_tokens": 47}})
+    tokens = await observed_tokens(tmp_path, content("a"), content("b"), FINISH, usage, DONE)
+    assert tokens == 42
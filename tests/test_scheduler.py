@@ -0,0 +1,28 @@
+from core import scheduler
+from core.scheduler import FairScheduler
+
+
+def test_client_id_wins_over_shared_bridge_key():
+    shared = {"Authorization": "Bearer bridge-key"}
+    first = FairScheduler.tenant_from_headers(dict(shared, **{"X-Client-ID": "alice"}))
+    second = FairScheduler.tenant_from_headers(dict(shared, **{"X-Client-ID": "bob"}))
+    assert first == "client:alice"
+    assert second == "client:bob"
+
+
+def test_api_key_is_hashed_when_no_client_id():
+    tenant = FairScheduler.tenant_from_headers({"Authorization": "Bearer secret"})
+    assert tenant.startswith("key:")
+    assert "secret" not in tenant
+
+
+def test_user_agent_fallback():
+    assert FairScheduler.tenant_from_headers({"User-Agent": "Cursor/1.0"}) == "agent:Cursor/1.0"
+
+
+async def test_token_buckets_stay_bounded(monkeypatch):
+    monkeypatch.setattr(scheduler, "MAX_TRACKED_TENANTS", 10)
+    fair = FairScheduler({"token_rate": 1000, "token_burst": 1000})
+    for i in range(25):
+        await fair.shape(f"agent:{i}", 10)
+    assert len(fair._buckets) <= 10
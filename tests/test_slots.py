@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+
+from core.slots import LlamaCppSlotManager
+
+
+def make_manager(slots: int = 2, **settings):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=[{"id": i, "n_ctx": 4096, "is_processing": False} for i in range(slots)])
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return LlamaCppSlotManager(["http://llama"], dict({"refresh_interval": 60}, **settings), lambda: client)
+
+
+def conversation(turns: int, topic: str = "a"):
+    messages = [{"role": "system", "content": "You are helpful."}]
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"{topic} question {turn}"})
+        messages.append({"role": "assistant", "content": f"{topic} answer {turn}"})
+    messages.append({"role": "user", "content": f"{topic} question {turns}"})
+    return messages
+
+
+async def test_next_turn_waits_for_its_busy_slot_when_no_slot_is_free():
+    manager = make_manager()
+    first = await manager.acquire(conversation(1))
+    other = await manager.acquire(conversation(1, "b"))
+    waiting = asyncio.ensure_future(manager.acquire(conversation(2)))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+    first.release()
+    second = await asyncio.wait_for(waiting, 1)
+    assert second.slot_id == first.slot_id != other.slot_id
+    assert manager.stats["pinned_waits"] == 1
+    assert manager.stats["prefix_hits"] == 1
+
+
+async def test_parallel_request_takes_a_free_slot_instead_of_waiting():
+    manager = make_manager()
+    first = await manager.acquire(conversation(1))
+    # Same conversation prefix while the first request is still running
+    second = await asyncio.wait_for(manager.acquire(conversation(2)), 0.5)
+    assert second.slot_id != first.slot_id
+    assert manager.stats["pinned_waits"] == 0
+
+
+async def test_wait_gives_up_after_max_pinned_wait():
+    manager = make_manager(max_pinned_wait=0.05)
+    await manager.acquire(conversation(1))
+    await manager.acquire(conversation(1, "b"))
+    await asyncio.wait_for(manager.acquire(conversation(2)), 1)
+    assert manager.stats["pinned_waits"] == 1
+    assert manager.stats["pinned_wait_timeouts"] == 1
+
+
+async def test_slot_stays_in_use_until_its_last_lease_is_released():
+    manager = make_manager(slots=1)
+    first = await manager.acquire(conversation(1, "a"))
+    # No free slot and no cached prefix: shares the busy slot
+    second = await manager.acquire(conversation(1, "b"))
+    assert second.slot is first.slot
+    first.release()
+    assert not first.slot.free
+    second.release()
+    assert first.slot.free
+
+
+async def test_new_conversations_take_free_slots():
+    manager = make_manager()
+    a = await manager.acquire(conversation(1, "a"))
+    b = await manager.acquire(conversation(1, "b"))
+    assert a.slot_id != b.slot_id
+    assert manager.stats["pinned_waits"] == 0
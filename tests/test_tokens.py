@@ -0,0 +1,50 @@
+import time
+
+from core.tokens import TokenCounter, ENCODING_O200K
+
+
+class WordTokenizer:
+    def __init__(self, name):
+        self.name = name
+
+    def count(self, text):
+        return len(text.split())
+
+
+def slow_counter(delay=0.2):
+    counter = TokenCounter()
+    loads = []
+
+    def load(name):
+        loads.append(name)
+        time.sleep(delay)
+        return WordTokenizer(name)
+
+    counter._load_tokenizer = load
+    return counter, loads
+
+
+async def test_tokenizer_is_not_built_on_the_event_loop():
+    counter, loads = slow_counter()
+    message = {"role": "user", "content": "one two three four five six"}
+    started = time.perf_counter()
+    counter.count_message(message, "gpt-4o")
+    assert time.perf_counter() - started < 0.1
+    # The stand-in count is not memoized under the real tokenizer
+    assert counter.get_stats()["cached_counts"] == 0
+    await counter._loading[ENCODING_O200K]
+    assert counter.count_message(message, "gpt-4o") == 6 + 4
+    assert loads.count(ENCODING_O200K) == 1
+
+
+async def test_warm_up_loads_mapped_models():
+    counter, loads = slow_counter(0.01)
+    await counter.warm_up(["gpt-4o", "qwen3", "openai/gpt-4-turbo"])
+    assert set(loads) == {"cl100k_base", ENCODING_O200K}
+    assert counter.get_stats()["tokenizers"].keys() == {"cl100k_base", ENCODING_O200K}
+
+
+def test_loads_synchronously_off_the_event_loop():
+    counter, loads = slow_counter(0.0)
+    assert counter.count_text("a b c", "gpt-4o") == 3
+    assert loads == [ENCODING_O200K]